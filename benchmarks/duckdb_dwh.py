@@ -0,0 +1,205 @@
+# benchmarks/duckdb_dwh.py
+
+"""
+DWH embebido (DuckDB) para correr los benchmarks sin un Postgres.
+
+install_duckdb_dwh() reemplaza core.common_db.get_connection por
+conexiones a una base DuckDB (archivo temporal o :memory:) que imitan
+la parte de psycopg2 que usa el repo: cursor() como context manager,
+execute con %s / %(nombre)s, fetchone / fetchall / rowcount /
+description, mogrify (para execute_values), copy_expert (COPY ... TO
+STDOUT) y commit / rollback.
+
+Lo que en Postgres es DDL propio (índices, particiones, chequeo de la
+clave natural en catálogos) se reemplaza: la migración del esquema
+(migrate_scorecard_schema) solo crea la vista <tabla>_latest, igual que
+en Postgres una vista común sobre la tabla, y los chequeos de runtime
+no hacen nada.
+
+Tipos: FLOAT en Postgres es float8 y en DuckDB float4; los casts a
+FLOAT se ejecutan como DOUBLE para que los valores sean los de Postgres
+(la réplica local hace su propia traducción, y --check-engines compara).
+
+Los tiempos NO son los de Postgres: sirven para comparar versiones del
+framework entre sí (overhead de Python, round trips, llamadas a Sheets),
+no para estimar la duración en producción. Para eso, --backend postgres.
+"""
+
+import re
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+from core import common_db, scorecard_schema
+from core.common_db import to_numbered_placeholders
+
+
+# DuckDB type -> OID de Postgres (para core.common_db._arrow_schema)
+_PG_OIDS = {
+    "BOOLEAN": 16, "BIGINT": 20, "SMALLINT": 21, "INTEGER": 23, "VARCHAR": 25,
+    "FLOAT": 700, "DOUBLE": 701, "DATE": 1082, "TIMESTAMP": 1114,
+    "TIMESTAMP WITH TIME ZONE": 1184,
+}
+
+# Misma forma que las columnas de cursor.description de psycopg2
+Column = namedtuple("Column", ["name", "type_code"])
+
+_COPY_RE = re.compile(r"^\s*COPY\s*\((?P<query>.*)\)\s*TO\s+STDOUT", re.IGNORECASE | re.DOTALL)
+
+# FLOAT / FLOAT8 de Postgres (double) -> DOUBLE de DuckDB
+_FLOAT_CAST_RE = re.compile(r"(::\s*|\bAS\s+)FLOAT8?\b(?!\s*\()", re.IGNORECASE)
+
+
+def sql_literal(value) -> str:
+    """Valor Python -> literal SQL (lo que hace mogrify en psycopg2)."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return f"'{value.isoformat()}'"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(sql_literal(v) for v in value) + "]"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class DuckDBCursor:
+    def __init__(self, connection: "DuckDBConnection"):
+        self.connection = connection
+        self._cur = connection.database.cursor()
+        self.description = None
+        self.rowcount = -1
+        self._rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._cur.close()
+
+    def execute(self, query, params=None):
+        if isinstance(query, bytes):
+            query = query.decode()
+        if re.match(r"^\s*SET\s+TIME\s+ZONE", query, re.IGNORECASE):
+            query = "SET TimeZone = 'UTC'"
+        query = _FLOAT_CAST_RE.sub(r"\1DOUBLE", query)
+        sql, args = to_numbered_placeholders(query, params) if params else (query.replace("%%", "%"), [])
+
+        self._cur.execute(sql, args)
+        self.description = None
+        self._rows = None
+        if self._cur.description:
+            self.description = [Column(d[0], _PG_OIDS.get(str(d[1]), 25)) for d in self._cur.description]
+            self._rows = self._cur.fetchall()
+            self.rowcount = len(self._rows)
+        else:
+            self.rowcount = -1
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows or [], []
+        return rows
+
+    def mogrify(self, query, params=None) -> bytes:
+        if isinstance(query, bytes):
+            query = query.decode()
+        if not params:
+            return query.encode()
+        sql, args = to_numbered_placeholders(query, params)
+        for n in range(len(args), 0, -1):
+            sql = sql.replace(f"${n}", sql_literal(args[n - 1]))
+        return sql.encode()
+
+    def copy_expert(self, sql: str, file):
+        import pyarrow.csv as pa_csv
+
+        match = _COPY_RE.match(sql)
+        if match is None:
+            raise ValueError("El DWH embebido solo soporta COPY (...) TO STDOUT")
+        table = self._cur.execute(_FLOAT_CAST_RE.sub(r"\1DOUBLE", match.group("query"))).arrow()
+        if hasattr(table, "read_all"):
+            table = table.read_all()
+        pa_csv.write_csv(table, file)
+
+
+class DuckDBConnection:
+    """Conexión 'psycopg2' sobre una base DuckDB compartida."""
+
+    encoding = "UTF8"  # lo lee psycopg2.extras.execute_values
+
+    def __init__(self, database):
+        self.database = database
+        self.closed = False
+        self.autocommit = False
+
+    def cursor(self):
+        return DuckDBCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def cancel(self):
+        self.database.interrupt()
+
+
+def _create_latest_view(database, table_name: str):
+    database.execute(
+        f"""
+        CREATE OR REPLACE VIEW {scorecard_schema.latest_view_name(table_name)} AS
+        SELECT * FROM {table_name}
+        """
+    )
+
+
+def install_duckdb_dwh(path: str = ":memory:"):
+    """
+    Abre la base DuckDB y la instala como DWH del proceso. Devuelve la
+    conexión DuckDB (para cargar los datos sintéticos).
+    """
+    import duckdb
+
+    database = duckdb.connect(path)
+    database.execute("SET TimeZone = 'UTC'")
+    lock = threading.Lock()
+
+    @contextmanager
+    def get_connection():
+        yield DuckDBConnection(database)
+
+    def migrate_scorecard_schema(table_name: str, years: list[int] | None = None):
+        with lock:
+            _create_latest_view(database.cursor(), table_name)
+
+    def check_scorecard_schema(table_name: str):
+        pass
+
+    common_db.get_connection = get_connection
+    scorecard_schema.get_connection = get_connection
+    scorecard_schema.migrate_natural_key = lambda table_name: None
+    scorecard_schema.migrate_scorecard_schema = migrate_scorecard_schema
+    scorecard_schema.check_scorecard_schema = check_scorecard_schema
+    scorecard_schema.ensure_scorecard_schema = check_scorecard_schema
+    scorecard_schema.ensure_natural_key = check_scorecard_schema
+    scorecard_schema.check_year_partitions = lambda table_name, years: None
+
+    # Módulos que importaron get_connection / check_scorecard_schema por nombre
+    import core.watermarks
+    import success_scorecard.run_to_sheet_success as publisher
+
+    core.watermarks.get_connection = get_connection
+    publisher.get_connection = get_connection
+    publisher.check_scorecard_schema = check_scorecard_schema
+
+    return database
@@ -0,0 +1,163 @@
+# benchmarks/fake_sheets.py
+
+"""
+Fake en memoria del cliente de gspread, para medir sin llamar a Google.
+
+Implementa solo lo que usan core.common_sheets, core.watermarks y los
+publishers (open / open_by_key, worksheet, get, get_all_records,
+batch_update, values_batch_get, values_batch_update, add_cols,
+get_lastUpdateTime). Cada método que en gspread es una llamada al API
+suma 1 en client.calls[<método>] y los bytes de la respuesta (JSON) en
+client.bytes, y también cuenta en las métricas del KPI en curso
+(sheets_calls / sheets_bytes de core.common_logging), igual que el hook
+de la sesión HTTP real.
+"""
+
+import json
+import re
+from collections import Counter
+from datetime import datetime, timezone
+
+from core.common_logging import record_metric
+
+
+_A1_RE = re.compile(r"^(?:'?(?P<tab>[^'!]+)'?!)?(?P<col>[A-Z]+)(?P<row>\d+)(?::[A-Z]+\d+)?$")
+
+
+def col_letter_to_index(letters: str) -> int:
+    """'A' -> 1, 'AA' -> 27."""
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - 64)
+    return index
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet: "FakeSpreadsheet", title: str, grid: list[list]):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.grid = [list(row) for row in grid]
+        self.col_count = max([len(row) for row in self.grid] + [26])
+
+    def _call(self, method: str, payload=None):
+        self.spreadsheet.client.count(method, payload)
+
+    def get(self, *args, **kwargs) -> list[list]:
+        values = [list(row) for row in self.grid]
+        self._call("values_get", values)
+        return values
+
+    def get_all_records(self, *args, **kwargs) -> list[dict]:
+        header, *rows = self.grid or [[]]
+        records = [dict(zip(header, row)) for row in rows]
+        self._call("values_get", self.grid)
+        return records
+
+    def add_cols(self, cols: int):
+        self.col_count += cols
+        self._call("batch_update")
+
+    def batch_update(self, data: list[dict], **kwargs):
+        for value_range in data:
+            self.write_range(value_range["range"], value_range["values"])
+        self._call("values_batch_update")
+        self.spreadsheet.touch()
+
+    def write_range(self, a1: str, values: list[list]):
+        match = _A1_RE.match(a1)
+        if match is None:
+            raise ValueError(f"Rango no soportado por el fake: {a1}")
+        col = col_letter_to_index(match.group("col"))
+        row = int(match.group("row"))
+        for r, row_values in enumerate(values, start=row):
+            while len(self.grid) < r:
+                self.grid.append([])
+            cells = self.grid[r - 1]
+            for c, value in enumerate(row_values, start=col):
+                if len(cells) < c:
+                    cells.extend([""] * (c - len(cells)))
+                cells[c - 1] = value
+
+
+class FakeSpreadsheet:
+    def __init__(self, client: "FakeSheetsClient", key: str, title: str):
+        self.client = client
+        self.id = key
+        self.title = title
+        self._worksheets: dict[str, FakeWorksheet] = {}
+        self.touch()
+
+    def touch(self):
+        self.modified_time = datetime.now(timezone.utc).isoformat()
+
+    def add_worksheet_grid(self, title: str, grid: list[list]) -> FakeWorksheet:
+        self._worksheets[title] = FakeWorksheet(self, title, grid)
+        self.touch()
+        return self._worksheets[title]
+
+    def get_lastUpdateTime(self) -> str:
+        self.client.count("drive_files_get", self.modified_time)
+        return self.modified_time
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.client.count("fetch_sheet_metadata")
+        return self._worksheets[title]
+
+    def worksheets(self) -> list[FakeWorksheet]:
+        self.client.count("fetch_sheet_metadata")
+        return list(self._worksheets.values())
+
+    def values_batch_get(self, ranges: list[str], params: dict | None = None) -> dict:
+        value_ranges = [
+            {"range": r, "values": [list(row) for row in self._worksheets[r.strip("'")].grid]}
+            for r in ranges
+        ]
+        self.client.count("values_batch_get", value_ranges)
+        return {"valueRanges": value_ranges}
+
+    def values_batch_update(self, body: dict) -> dict:
+        for value_range in body["data"]:
+            tab = _A1_RE.match(value_range["range"]).group("tab")
+            self._worksheets[tab].write_range(value_range["range"], value_range["values"])
+        self.client.count("values_batch_update")
+        self.touch()
+        return {}
+
+
+class FakeSheetsClient:
+    """Reemplazo de get_gspread_client(): spreadsheets en memoria, por nombre o key."""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self.bytes = 0
+        self._spreadsheets: dict[str, FakeSpreadsheet] = {}
+
+    def count(self, method: str, payload=None):
+        size = len(json.dumps(payload, default=str)) if payload is not None else 0
+        self.calls[method] += 1
+        self.bytes += size
+        record_metric("sheets_calls")
+        record_metric("sheets_bytes", size)
+
+    def add_spreadsheet(self, key: str, title: str | None = None) -> FakeSpreadsheet:
+        spreadsheet = FakeSpreadsheet(self, key, title or key)
+        self._spreadsheets[key] = spreadsheet
+        if title:
+            self._spreadsheets[title] = spreadsheet
+        return spreadsheet
+
+    def open(self, title: str) -> FakeSpreadsheet:
+        self.count("drive_files_list")
+        return self._spreadsheets[title]
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        self.count("fetch_sheet_metadata")
+        return self._spreadsheets[key]
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.bytes = 0
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
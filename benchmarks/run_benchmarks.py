@@ -0,0 +1,369 @@
+# benchmarks/run_benchmarks.py
+
+"""
+Benchmarks del framework: KPI 5, KPI 16, KPI 32, runner completo y
+publisher, sobre datos sintéticos y sin tocar producción.
+
+    python -m benchmarks.run_benchmarks                          # DuckDB embebido, 10k y 100k
+    python -m benchmarks.run_benchmarks --sizes 10k,1m,50m --repeat 5
+    python -m benchmarks.run_benchmarks --backend postgres \\
+        --dsn "host=localhost dbname=kpi_bench user=postgres"
+
+Backends:
+- duckdb (default): DWH embebido (benchmarks/duckdb_dwh.py). Sirve para
+  comparar versiones del framework (overhead, round trips, Sheets).
+- postgres: un Postgres LOCAL (solo localhost; las tablas de los KPIs se
+  borran y se regeneran).
+
+Google Sheets siempre es el fake en memoria (benchmarks/fake_sheets.py),
+que cuenta las llamadas al API.
+
+Por escenario se reporta la primera corrida (fría: caches vacíos) y la
+mediana de las siguientes, junto a las métricas de core.common_logging
+(tiempo en DWH, round trips, filas, llamadas a Sheets, cache hits).
+Con --json se guardan los resultados; con --baseline se comparan contra
+una corrida anterior y el script sale con código 1 si algún escenario es
+más lento que --factor × el baseline.
+
+Con --check-engines, para cada tamaño se calcula el KPI 32 en el DWH y
+en la réplica local (core.local_replica) y el script sale con código 1
+si los valores no son idénticos (ej. diferencias de dialecto SQL).
+"""
+
+import os
+
+# Antes de importar core: sin historial en el DWH ni JSON por KPI, sin
+# saltos por watermarks y con un cache de Sheets propio del benchmark
+os.environ.setdefault("KPI_RUN_HISTORY", "0")
+os.environ.setdefault("KPI_METRICS_LOG", "0")
+os.environ.setdefault("KPI_FORCE_RECOMPUTE", "1")
+os.environ.setdefault("KPI_QUERY_CACHE", "0")
+
+import argparse
+import importlib
+import json
+import statistics
+import sys
+import tempfile
+import time
+
+from core.common_dates import get_last_sunday
+from core.common_logging import METRIC_FIELDS, kpi_metrics, metrics_listener
+from benchmarks import synthetic_data
+from benchmarks.fake_sheets import FakeSheetsClient
+
+
+SCENARIOS = ("kpi5", "kpi16", "kpi32", "runner", "pipeline", "publisher")
+
+DEFAULT_SIZES = "10k,100k"
+
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1", "")
+
+
+def kpi_module(number: str):
+    from core.kpi_registry import discover_kpi_modules
+
+    return importlib.import_module(discover_kpi_modules(["success"])[("success", number)])
+
+
+# -------------------------------------------------------------------
+# 1) Backends
+# -------------------------------------------------------------------
+
+def setup_backend(backend: str, dsn: str | None, workdir: str):
+    """Instala el DWH del benchmark y devuelve execute(sql) para cargar datos."""
+    if backend == "duckdb":
+        from benchmarks.duckdb_dwh import install_duckdb_dwh
+
+        database = install_duckdb_dwh(os.path.join(workdir, "dwh.duckdb"))
+        return lambda sql: database.execute(sql)
+
+    from psycopg2.extensions import parse_dsn
+
+    from core import common_db, scorecard_schema
+
+    config = parse_dsn(dsn or "")
+    if config.get("host", "") not in LOCAL_HOSTS:
+        raise SystemExit("--backend postgres solo corre contra un Postgres local (host=localhost).")
+    common_db.close_pool()
+    common_db.DB_CONFIG.update(config)
+
+    def execute(sql: str):
+        with common_db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+            conn.commit()
+        # Las tablas se regeneraron: se vuelven a verificar
+        scorecard_schema._ready_tables.clear()
+
+    return execute
+
+
+def load_data(execute, sheets: FakeSheetsClient, rows: int) -> float:
+    """Genera todos los datos sintéticos para un tamaño. Devuelve segundos."""
+    from core import scorecard_schema
+
+    import success_scorecard.run_to_sheet_success as publisher
+
+    k5, k16, k32 = kpi_module("5"), kpi_module("16"), kpi_module("32")
+    last_sunday = get_last_sunday()
+    start = time.perf_counter()
+
+    scorecard_tables = sorted({k5.SCORECARD_TABLE, k32.TABLE_NAME, k16.TABLE_NAME, publisher.SCORECARD_TABLE})
+    statements = synthetic_data.agreements_statements(k32, rows, last_sunday)
+    for table in scorecard_tables:
+        # Histórico hasta la semana actual: los KPIs la reescriben (upsert), como en un re-run
+        statements += synthetic_data.scorecard_statements(table, rows, last_sunday)
+    for sql in statements:
+        execute(sql)
+    for table in scorecard_tables:
+        # Migración del esquema, como en un deploy: clave natural, índices y vista <tabla>_latest
+        scorecard_schema.migrate_natural_key(table)
+        scorecard_schema.migrate_scorecard_schema(table)
+
+    cs_weekly = sheets.add_spreadsheet(f"key-{k16.SHEET_NAME}", k16.SHEET_NAME)
+    cs_weekly.add_worksheet_grid(k16.WORKSHEET_NAME, synthetic_data.cs_weekly_grid(k16, rows, last_sunday))
+    reset_publisher_sheet(sheets)
+
+    return time.perf_counter() - start
+
+
+def reset_publisher_sheet(sheets: FakeSheetsClient):
+    """Pestañas del publisher sin la semana actual (para que siempre publique)."""
+    import success_scorecard.run_to_sheet_success as publisher
+
+    spreadsheet = sheets.add_spreadsheet(publisher.SPREADSHEET_ID)
+    year = get_last_sunday().year
+    for tab in (publisher.worksheet_name_for_year(year - 1), publisher.worksheet_name_for_year(year)):
+        spreadsheet.add_worksheet_grid(tab, synthetic_data.scorecard_sheet_grid())
+
+
+def install_fake_sheets(sheets: FakeSheetsClient):
+    from core import common_sheets
+
+    import success_scorecard.run_to_sheet_success as publisher
+
+    common_sheets.get_gspread_client = lambda write=False: sheets
+    publisher.get_gspread_client = lambda write=False: sheets
+
+
+# -------------------------------------------------------------------
+# 2) Escenarios
+# -------------------------------------------------------------------
+
+def scenario_functions(workers: int, sheets: FakeSheetsClient) -> dict:
+    from core.duckdb_session import duckdb_session
+    from core.kpi_registry import load_kpis
+
+    import success_scorecard.run_to_sheet_success as publisher
+    from success_scorecard.run_success_scorecard import run_success_scorecard
+
+    kpis = {e["kpi_number"].lstrip("0"): e["function"] for e in load_kpis(["success"])}
+
+    def single(number):
+        def run():
+            with duckdb_session():
+                kpis[number]()
+        return run
+
+    def pipeline():
+        reset_publisher_sheet(sheets)
+        run_success_scorecard(max_workers=workers, publish=True)
+
+    def publish():
+        reset_publisher_sheet(sheets)
+        publisher.run_to_sheet_success()
+
+    return {
+        "kpi5": single("5"),
+        "kpi16": single("16"),
+        "kpi32": single("32"),
+        "runner": lambda: run_success_scorecard(max_workers=workers),
+        "pipeline": pipeline,
+        "publisher": publish,
+    }
+
+
+def measure(name: str, run, repeat: int, sheets: FakeSheetsClient, quiet: bool = True) -> dict:
+    """
+    Corre un escenario `repeat` veces. Devuelve tiempos (cold = primera
+    corrida, warm = mediana del resto) y las métricas de la corrida fría.
+    """
+    timings, cold_metrics, cold_calls = [], None, None
+    for attempt in range(repeat):
+        sheets.reset_counters()
+
+        # Métricas del escenario + las de KPIs que corren en otros threads
+        # (por el listener: el runner guarda y vacía el historial al terminar)
+        entries = []
+        start = time.perf_counter()
+        with _silenced(quiet), metrics_listener(entries.append), kpi_metrics(f"bench:{name}"):
+            run()
+        timings.append((time.perf_counter() - start) * 1000)
+
+        if attempt == 0:
+            cold_metrics = {f: round(sum(e[f] for e in entries), 1) for f in METRIC_FIELDS if f != "wall_ms"}
+            cold_metrics["errors"] = sum(e["status"] != "ok" for e in entries)
+            cold_calls = dict(sheets.calls)
+
+    warm = timings[1:] or timings
+    return {
+        "scenario": name,
+        "cold_ms": round(timings[0], 1),
+        "warm_ms": round(statistics.median(warm), 1),
+        "min_ms": round(min(timings), 1),
+        "runs": len(timings),
+        "metrics": cold_metrics,
+        "sheets_api": cold_calls,
+    }
+
+
+class _silenced:
+    """Oculta los prints de los KPIs durante la medición (--verbose los muestra)."""
+
+    def __init__(self, quiet: bool):
+        self.quiet = quiet
+
+    def __enter__(self):
+        if self.quiet:
+            self.stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+
+    def __exit__(self, *exc):
+        if self.quiet:
+            sys.stdout.close()
+            sys.stdout = self.stdout
+
+
+def check_engines() -> list[str]:
+    """
+    KPI 32 (semana actual y backfill de 8 semanas) con engine="dwh" y
+    engine="local". Devuelve las diferencias (vacía si coinciden).
+    """
+    from datetime import timedelta
+
+    from core.kpi_template import fetch_kpi_value
+    from core.local_replica import sync_sources
+
+    k32 = kpi_module("32")
+    last_sunday = get_last_sunday()
+    mismatches = []
+    with _silenced(True):
+        # Las tablas se regeneran por tamaño: la réplica se copia de nuevo
+        sync_sources(k32.SOURCES, full=True)
+    for weeks_back in range(8):
+        sunday_str = (last_sunday - timedelta(weeks=weeks_back)).strftime("%Y-%m-%d")
+        query, params = k32.build_query(sunday_str)
+        with _silenced(True):
+            dwh = fetch_kpi_value(query, params, k32.SOURCES, engine="dwh", use_cache=False)
+            local = fetch_kpi_value(query, params, k32.SOURCES, engine="local", use_cache=False)
+        if dwh is None or local is None or float(dwh) != float(local):
+            mismatches.append(f"KPI 32 {sunday_str}: dwh={dwh!r} local={local!r}")
+    return mismatches
+
+
+# -------------------------------------------------------------------
+# 3) Reporte y comparación
+# -------------------------------------------------------------------
+
+def print_results(size: str, load_s: float, results: list[dict]):
+    print("---------------------------------------------")
+    print(f"Tamaño {size} ({synthetic_data.describe(synthetic_data.parse_size(size))})")
+    print(f"Generación de datos: {load_s:.1f} s")
+    print(f"{'escenario':<10} {'frío ms':>10} {'tibio ms':>10} {'DWH ms':>10} {'trips':>6} "
+          f"{'filas':>8} {'sheets':>7} {'hits':>5} {'err':>4}")
+    for r in results:
+        m = r["metrics"]
+        print(f"{r['scenario']:<10} {r['cold_ms']:>10.1f} {r['warm_ms']:>10.1f} {m['db_ms']:>10.1f} "
+              f"{m['db_round_trips']:>6.0f} {m['rows']:>8.0f} {m['sheets_calls']:>7.0f} "
+              f"{m['cache_hits']:>5.0f} {m['errors']:>4}")
+
+
+def compare(results: dict, baseline: dict, factor: float) -> list[str]:
+    """Escenarios cuyo tiempo tibio supera factor × el del baseline."""
+    regressions = []
+    for size, scenarios in results.items():
+        base = {r["scenario"]: r for r in baseline.get(size, [])}
+        for r in scenarios:
+            previous = base.get(r["scenario"])
+            if previous and previous["warm_ms"] > 0 and r["warm_ms"] > factor * previous["warm_ms"]:
+                regressions.append(
+                    f"{size} {r['scenario']}: {r['warm_ms']:.1f} ms vs {previous['warm_ms']:.1f} ms "
+                    f"(x{r['warm_ms'] / previous['warm_ms']:.2f})"
+                )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de KPIs, runner y publisher con datos sintéticos.")
+    parser.add_argument("--backend", choices=("duckdb", "postgres"), default="duckdb")
+    parser.add_argument("--dsn", help="DSN del Postgres local (--backend postgres)")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="filas por tabla, ej. 10k,1m,50m")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"de: {', '.join(SCENARIOS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="corridas por escenario (la primera es fría)")
+    parser.add_argument("--workers", type=int, default=1, help="KPIs en paralelo en runner/pipeline")
+    parser.add_argument("--json", help="guardar resultados en este archivo")
+    parser.add_argument("--baseline", help="resultados (--json) de una corrida anterior para comparar")
+    parser.add_argument("--factor", type=float, default=1.5, help="regresión si tibio > factor × baseline")
+    parser.add_argument("--verbose", action="store_true", help="mostrar la salida de los KPIs")
+    parser.add_argument(
+        "--check-engines", action="store_true",
+        help="verificar que el DWH y la réplica local den el mismo valor (KPI 32)",
+    )
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="kpi-bench-")
+    os.environ.setdefault("SHEETS_CACHE_DIR", os.path.join(workdir, "sheets"))
+    os.environ.setdefault("KPI_REPLICA_PATH", os.path.join(workdir, "replica.duckdb"))
+
+    execute = setup_backend(args.backend, args.dsn, workdir)
+    sheets = FakeSheetsClient()
+    install_fake_sheets(sheets)
+    functions = scenario_functions(args.workers, sheets)
+
+    print(f"Backend: {args.backend}  |  workers: {args.workers}  |  repeat: {args.repeat}")
+    results = {}
+    engine_mismatches = []
+    for size in args.sizes.split(","):
+        load_s = load_data(execute, sheets, synthetic_data.parse_size(size))
+        results[size] = [
+            measure(name, functions[name], max(args.repeat, 1), sheets, quiet=not args.verbose)
+            for name in scenarios
+        ]
+        print_results(size, load_s, results[size])
+        if args.check_engines:
+            mismatches = check_engines()
+            print(f"Motores dwh/local: {'OK' if not mismatches else f'{len(mismatches)} diferencias'}")
+            engine_mismatches += [f"{size} {m}" for m in mismatches]
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"backend": args.backend, "results": results}, f, indent=2)
+        print(f"Resultados guardados en {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.factor)
+        print("---------------------------------------------")
+        if regressions:
+            print("REGRESIONES:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print("Sin regresiones contra el baseline.")
+
+    if engine_mismatches:
+        print("---------------------------------------------")
+        print("DIFERENCIAS ENTRE MOTORES:")
+        for mismatch in engine_mismatches:
+            print(f"  - {mismatch}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
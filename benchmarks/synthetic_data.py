@@ -0,0 +1,186 @@
+# benchmarks/synthetic_data.py
+
+"""
+Generador de datos sintéticos para los benchmarks.
+
+Arma, con el mismo esquema que leen los KPIs de ejemplo:
+- la tabla de acuerdos del KPI 32 (AGREEMENTS_TABLE y sus columnas)
+- la tabla de scorecard (histórico semanal de N KPIs, para el KPI 5 y
+  los publishers)
+- la pestaña CS Weekly del KPI 16 (filas para el fake de Sheets)
+
+Las tablas se generan con SQL (generate_series) que corre igual en
+Postgres y en DuckDB: 50M filas no pasan por Python. Los nombres de
+tablas y columnas salen de los módulos de los KPIs, así el benchmark
+sigue al esquema aunque se customicen.
+
+Los datos son deterministas (función de la fila), así dos corridas con
+el mismo tamaño son comparables.
+"""
+
+import math
+from datetime import date, timedelta
+
+from core.common_dates import get_year_week
+
+
+# KPIs y semanas del histórico sintético del scorecard
+SCORECARD_KPIS = 50
+SCORECARD_MAX_WEEKS = 520
+
+# Google Sheets admite ~10M celdas por archivo: la pestaña sintética se
+# limita a este número de filas aunque el tamaño pedido sea mayor
+SHEET_MAX_ROWS = 500_000
+SHEET_WEEKS = 260
+
+
+def parse_size(size: str) -> int:
+    """'10k' -> 10000, '1.5m' -> 1500000, '50M' -> 50000000."""
+    size = size.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(size[-1:], 1)
+    number = size[:-1] if factor > 1 else size
+    return int(float(number) * factor)
+
+
+def _literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _schema_statement(table: str) -> list[str]:
+    return [f"CREATE SCHEMA IF NOT EXISTS {table.split('.')[0]}"] if "." in table else []
+
+
+# -------------------------------------------------------------------
+# 1) Acuerdos (KPI 32)
+# -------------------------------------------------------------------
+
+def agreements_statements(kpi_32, rows: int, anchor: date) -> list[str]:
+    """
+    SQL para (re)crear la tabla de acuerdos con `rows` filas.
+    kpi_32: el módulo del KPI 32 (nombres de tabla, columnas y valores).
+
+    Distribución: ~4% clientes internos/test, ~22% terminados (por el
+    cliente u otros motivos), inicios repartidos en 5 años antes de
+    anchor y updated_at en los últimos ~70 días.
+    """
+    m = kpi_32
+    terminated = "(i % 7 = 0 OR i % 11 = 0)"
+    start = f"(DATE {_literal(anchor.isoformat())} - (i % 1825)::INT)"
+    return _schema_statement(m.AGREEMENTS_TABLE) + [
+        f"DROP TABLE IF EXISTS {m.AGREEMENTS_TABLE}",
+        f"""
+        CREATE TABLE {m.AGREEMENTS_TABLE} AS
+        SELECT
+            i::BIGINT AS {m.COL_AGREEMENT_ID},
+            CASE
+                WHEN i % 50 = 0 THEN {_literal(m.INTERNAL_CLIENT_VALUE)}
+                WHEN i % 50 = 1 THEN {_literal(m.TEST_CLIENT_VALUE)}
+                ELSE 'CLIENT'
+            END::VARCHAR AS {m.COL_CLIENT_TYPE},
+            CASE
+                WHEN i % 7 = 0 THEN {_literal(m.STATUS_TERMINATED_BY_CLIENT)}
+                WHEN i % 11 = 0 THEN {_literal(m.STATUS_TERMINATED_OTHER)}
+                ELSE {_literal(m.STATUS_ACTIVE)}
+            END::VARCHAR AS {m.COL_STATUS},
+            {start} AS {m.COL_START_DATE},
+            CASE WHEN {terminated} THEN {start} + (30 + i % 700)::INT END AS {m.COL_END_DATE},
+            TIMESTAMP {_literal(anchor.isoformat())} - ((i % 100000)::INT * INTERVAL '1 minute') AS {m.COL_UPDATED_AT}
+        FROM generate_series(0, {rows - 1}) AS g(i)
+        """,
+    ]
+
+
+# -------------------------------------------------------------------
+# 2) Scorecard (KPI 5, publishers)
+# -------------------------------------------------------------------
+
+def scorecard_shape(rows: int) -> tuple[int, int]:
+    """(semanas, KPIs) por scorecard para llegar a `rows` filas."""
+    weeks = min(SCORECARD_MAX_WEEKS, max(8, rows // SCORECARD_KPIS))
+    return weeks, SCORECARD_KPIS
+
+
+def scorecard_statements(table: str, rows: int, last_sunday: date, sc_name: str = "Success") -> list[str]:
+    """
+    SQL para (re)crear una tabla de scorecard con `rows` filas: KPIs
+    '01'..'50' por semana hacia atrás desde last_sunday. Si hacen falta
+    más filas que semanas × KPIs, se agregan scorecards 'Bench <n>'.
+    """
+    weeks, kpis = scorecard_shape(rows)
+    sunday = f"DATE {_literal(last_sunday.isoformat())}"
+    return _schema_statement(table) + [
+        f"DROP TABLE IF EXISTS {table} CASCADE",
+        f"""
+        CREATE TABLE {table} (
+            "year"        INTEGER,
+            print_date    VARCHAR,
+            sc_name       VARCHAR,
+            last_sunday   DATE,
+            kpi_number    VARCHAR,
+            range_type    VARCHAR,
+            week_month    VARCHAR,
+            field_name    VARCHAR,
+            field_details VARCHAR,
+            field_value   DOUBLE PRECISION,
+            UNIQUE (sc_name, kpi_number, last_sunday)
+        )
+        """,
+        f"""
+        INSERT INTO {table}
+        SELECT
+            CAST(EXTRACT(YEAR FROM day) AS INTEGER),
+            '2025-01-01 00:00',
+            CASE WHEN sc = 0 THEN {_literal(sc_name)} ELSE 'Bench ' || CAST(sc AS VARCHAR) END,
+            day,
+            LPAD(CAST(kpi AS VARCHAR), 2, '0'),
+            'weekly',
+            LPAD(CAST(EXTRACT(WEEK FROM day) AS VARCHAR), 2, '0'),
+            'KPI ' || CAST(kpi AS VARCHAR),
+            NULL,
+            (i % 1000) / 10.0 + kpi
+        FROM (
+            SELECT
+                i,
+                {sunday} - (7 * (i % {weeks}))::INT AS day,
+                CAST(FLOOR(i / {weeks}.0) AS INTEGER) % {kpis} + 1 AS kpi,
+                CAST(FLOOR(i / {weeks * kpis}.0) AS INTEGER) AS sc
+            FROM generate_series(0, {rows - 1}) AS g(i)
+        ) AS s
+        """,
+    ]
+
+
+# -------------------------------------------------------------------
+# 3) Pestaña CS Weekly (KPI 16) y pestaña del publisher
+# -------------------------------------------------------------------
+
+def cs_weekly_grid(kpi_16, rows: int, last_sunday: date) -> list[list]:
+    """
+    Grid (header + filas) de la pestaña CS Weekly: una fila por reporte,
+    repartidas en las últimas SHEET_WEEKS semanas (como máximo
+    SHEET_MAX_ROWS filas).
+    """
+    rows = min(rows, SHEET_MAX_ROWS)
+    weeks = [get_year_week(last_sunday - timedelta(weeks=w)) for w in range(SHEET_WEEKS)]
+    header = ["client", kpi_16.COLUMN_WEEK, kpi_16.COLUMN_REPLACEMENTS]
+    return [header] + [[f"client_{i % 997}", weeks[i % SHEET_WEEKS], i % 5] for i in range(rows)]
+
+
+def scorecard_sheet_grid(kpis: int = SCORECARD_KPIS) -> list[list]:
+    """
+    Pestaña sc<year> sin semanas publicadas: fila 1 de encabezados y
+    columna A con los KPIs desde la fila 2 (layout de run_to_sheet_*).
+    """
+    return [["KPI", "Name"]] + [[str(k), f"KPI {k}"] for k in range(1, kpis + 1)]
+
+
+def describe(rows: int) -> dict:
+    """Resumen de lo que se genera para un tamaño dado (para el reporte)."""
+    weeks, kpis = scorecard_shape(rows)
+    return {
+        "agreements_rows": rows,
+        "scorecard_rows": rows,
+        "scorecard_weeks": weeks,
+        "scorecard_names": math.ceil(rows / (weeks * kpis)),
+        "sheet_rows": min(rows, SHEET_MAX_ROWS),
+    }
@@ -20,3 +20,17 @@ def get_year_week(fecha: date) -> str:
     """
     iso = fecha.isocalendar()
     return f"{iso.year}-{iso.week:02d}"
+
+
+def get_sundays_between(start_date: date, end_date: date) -> list[date]:
+    """
+    Devuelve todos los domingos entre start_date y end_date (incluidos).
+    Útil para backfills semanales.
+    """
+    first = start_date + timedelta(days=(6 - start_date.weekday()) % 7)
+    sundays = []
+    current = first
+    while current <= end_date:
+        sundays.append(current)
+        current += timedelta(weeks=1)
+    return sundays
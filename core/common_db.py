@@ -1,8 +1,18 @@
 # core/common_db.py
 
+import atexit
+import hashlib
 import os
+import re
+import threading
 import psycopg2
+from psycopg2 import extensions, pool
+from psycopg2.extras import execute_values
 from contextlib import contextmanager
+from typing import Callable
+
+from core import query_cache, query_plans
+from core.common_logging import flush_run_history, record_metric, timed_metric
 
 
 DB_CONFIG = {
@@ -13,34 +23,609 @@ DB_CONFIG = {
     "password": os.getenv("DB_PASS"),
 }
 
+# Tamaño del pool de conexiones (por proceso)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "8"))
+
+# Si está activo, se hace un "SELECT 1" antes de entregar cada conexión
+DB_POOL_PING = os.getenv("DB_POOL_PING", "1") == "1"
+
+# Queries con parámetros -> PREPARE/EXECUTE por conexión (plan reutilizado).
+# Poner en 0 detrás de un pgbouncer en modo transaction.
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "1") == "1"
+
+# Columnas de la tabla de scorecard, en el orden en que se insertan
+SCORECARD_COLUMNS = (
+    "year", "print_date", "sc_name", "last_sunday",
+    "kpi_number", "range_type", "week_month",
+    "field_name", "field_details", "field_value",
+)
+
+# Tamaño de bloque (MB) al leer un COPY: memoria máxima por batch de Arrow
+DB_COPY_BLOCK_MB = int(os.getenv("DB_COPY_BLOCK_MB", "16"))
+
+# Cantidad de registros acumulados que dispara un flush del buffer
+SCORECARD_FLUSH_SIZE = int(os.getenv("SCORECARD_FLUSH_SIZE", "500"))
+
+# Buffer de escritura: None = desactivado (un INSERT por registro)
+# Cada entrada: (table_name, row, on_commit)
+_buffer: list[tuple[str, tuple, Callable[[], None] | None]] | None = None
+_buffer_flush_size = SCORECARD_FLUSH_SIZE
+_buffer_lock = threading.RLock()
+# Serializa los flush: se escriben en el mismo orden en que se tomaron
+# del buffer (un valor más viejo nunca pisa a uno más nuevo)
+_flush_lock = threading.Lock()
+
+# Funciones (table_name, row) que reciben cada registro de KPI apenas se
+# confirma en el DWH (ver scorecard_listener)
+_listeners: list = []
+_listeners_lock = threading.Lock()
+
+
+# -------------------------------------------------------------------
+# Pool de conexiones (compartido por todo el proceso)
+# -------------------------------------------------------------------
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# ThreadedConnectionPool lanza error si se agota; con el semáforo los
+# threads esperan su turno en lugar de fallar.
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+
+class PooledConnection(extensions.connection):
+    """Conexión del pool que recuerda qué statements ya preparó."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: set[str] = set()
+
+
+def get_pool() -> pool.ThreadedConnectionPool:
+    """
+    Devuelve el pool de conexiones del proceso, creándolo la primera vez.
+    Es thread-safe, así que los KPIs pueden correr en paralelo.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pool.ThreadedConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX, connection_factory=PooledConnection, **DB_CONFIG
+                )
+    return _pool
+
+
+def close_pool():
+    """Cierra todas las conexiones del pool (se llama al salir del proceso)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+atexit.register(close_pool)
+
+
+def _is_healthy(conn) -> bool:
+    """Health check: la conexión sigue abierta y responde."""
+    if conn.closed:
+        return False
+    if conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if not DB_POOL_PING:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _reset_session(conn):
+    """
+    Deja la conexión limpia antes de devolverla al pool:
+    descarta transacciones abiertas y vuelve los parámetros de sesión
+    (SET search_path, timezone, etc.) a sus valores por defecto.
+    Los prepared statements se conservan (RESET ALL no los toca).
+    """
+    conn.rollback()
+    if conn.autocommit:
+        conn.autocommit = False
+    with conn.cursor() as cur:
+        cur.execute("RESET ALL")
+    conn.commit()
+
+
+def _borrow_connection():
+    """
+    Toma una conexión sana del pool, descartando las que estén rotas.
+    Devuelve (pool, conexión) para regresarla al mismo pool.
+    """
+    db_pool = get_pool()
+    # Como mucho revisamos DB_POOL_MAX conexiones antes de rendirnos
+    for _ in range(DB_POOL_MAX + 1):
+        conn = db_pool.getconn()
+        if _is_healthy(conn):
+            return db_pool, conn
+        db_pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError("No se pudo obtener una conexión sana del pool.")
+
 
 @contextmanager
 def get_connection():
-    """Context manager para conexión a la DB."""
-    conn = None
+    """
+    Context manager para conexión a la DB.
+    La conexión se toma prestada del pool y se devuelve al terminar.
+    """
+    _pool_slots.acquire()
+    try:
+        db_pool, conn = _borrow_connection()
+    except Exception:
+        _pool_slots.release()
+        raise
+    broken = False
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
         yield conn
     finally:
-        if conn is not None:
-            conn.close()
+        try:
+            if not conn.closed:
+                _reset_session(conn)
+        except psycopg2.Error:
+            broken = True
+        db_pool.putconn(conn, close=broken or bool(conn.closed))
+        _pool_slots.release()
+
+
+# -------------------------------------------------------------------
+# Prepared statements
+# -------------------------------------------------------------------
+
+_PLACEHOLDER_RE = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+def to_numbered_placeholders(query: str, params) -> tuple[str, list]:
+    """
+    Pasa un query con placeholders de psycopg2 (%s o %(nombre)s) a la
+    forma de PREPARE ($1, $2, ...). Devuelve (query, argumentos en orden).
+    Un mismo %(nombre)s repetido usa el mismo $n. (DuckDB acepta la
+    misma forma, ver core.local_replica.)
+    """
+    args = []
+    positions = {}
+    positional = iter(params) if not isinstance(params, dict) else None
+
+    def replace(match):
+        if match.group(0) == "%%":
+            return "%"
+        if match.group(1) is None:
+            args.append(next(positional))
+            return f"${len(args)}"
+        name = match.group(1)
+        if name not in positions:
+            args.append(params[name])
+            positions[name] = len(args)
+        return f"${positions[name]}"
+
+    return _PLACEHOLDER_RE.sub(replace, query), args
+
+
+def prepared_statement_name(query: str) -> str:
+    """Nombre estable del statement: mismo query (normalizado) -> mismo nombre."""
+    digest = hashlib.sha1(query_cache.normalize_query(query).encode()).hexdigest()[:16]
+    return f"kpi_{digest}"
+
 
+def _execute(conn, cur, query: str, params=None):
+    """
+    Ejecuta un query en el cursor. Si tiene parámetros (y
+    DB_PREPARED_STATEMENTS está activo) se ejecuta como prepared
+    statement con nombre: se prepara una vez por conexión del pool y las
+    siguientes llamadas (otras semanas, otros scorecards) reutilizan el
+    plan con EXECUTE.
 
-def fetch_single_value(query: str, params: tuple | None = None):
+    El tiempo y los round trips se suman a las métricas del KPI en curso
+    (core.common_logging).
+    """
+    prepared = getattr(conn, "prepared_statements", None)
+    if not params or not DB_PREPARED_STATEMENTS or prepared is None:
+        with timed_metric("db_ms"):
+            cur.execute(query, params or ())
+        record_metric("db_round_trips")
+        return
+
+    sql, args = to_numbered_placeholders(query, params)
+    name = prepared_statement_name(sql)
+    try:
+        with timed_metric("db_ms"):
+            if name not in prepared:
+                cur.execute(f"PREPARE {name} AS {sql}")
+                prepared.add(name)
+                record_metric("db_round_trips")
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(args))})", args)
+        record_metric("db_round_trips")
+    except psycopg2.Error:
+        # Estado incierto: se descartan los statements de esta conexión.
+        # Si la limpieza también falla (conexión rota), la conexión se
+        # cierra y get_connection la saca del pool; el error que se
+        # propaga es siempre el del query.
+        prepared.clear()
+        try:
+            conn.rollback()
+            with conn.cursor() as reset_cur:
+                reset_cur.execute("DEALLOCATE ALL")
+            conn.commit()
+        except psycopg2.Error as cleanup_error:
+            print(f"[_execute] No se pudo limpiar la conexión, se descarta: {cleanup_error}")
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+        raise
+
+
+def _explain(conn, cur, query: str, params=None):
+    """
+    EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) del query, tal como lo corrió
+    _execute: si quedó como prepared statement en esta conexión se
+    explica el EXECUTE (mismo plan genérico/custom que usó el KPI).
+    Devuelve el plan (lista JSON) o None si falla.
+    """
+    explain = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)"
+    prepared = getattr(conn, "prepared_statements", None)
+    try:
+        if params and DB_PREPARED_STATEMENTS and prepared is not None:
+            sql, args = to_numbered_placeholders(query, params)
+            name = prepared_statement_name(sql)
+            if name in prepared:
+                cur.execute(f"{explain} EXECUTE {name} ({', '.join(['%s'] * len(args))})", args)
+                return cur.fetchone()[0]
+        cur.execute(f"{explain} {query}", params or ())
+        return cur.fetchone()[0]
+    except Exception as e:
+        print(f"[_explain] No se pudo obtener el plan: {e}")
+        conn.rollback()
+        return None
+
+
+def fetch_single_value(
+    query: str,
+    params: tuple | dict | None = None,
+    use_cache: bool | None = None,
+    explain: bool | None = None,
+):
     """
     Ejecuta un query que devuelve un solo valor (ej. SELECT ...).
     Devuelve el primer valor o 0 si no hay resultados.
+
+    params: parámetros del query (%s o %(nombre)s). Con parámetros, el
+    query corre como prepared statement (ver _execute).
+
+    use_cache: None = según el cache global (ver core.query_cache),
+    False = ir siempre al DWH, True = usar el cache aunque esté desactivado.
+
+    explain: None = según KPI_EXPLAIN (ver core.query_plans), True =
+    después del query se captura su EXPLAIN (ANALYZE, BUFFERS) y se
+    guarda con la corrida. En ese modo el query va al DWH aunque el cache
+    esté activo (salvo use_cache=True explícito: un hit no se explica).
     """
+    if explain is None:
+        explain = query_plans.is_query_profiling_enabled()
+    if explain and use_cache is None:
+        use_cache = False
+    if use_cache is None:
+        use_cache = query_cache.is_query_cache_enabled()
+
+    # El cache es opcional: un error (SQLite bloqueado, ~/.cache de solo
+    # lectura, pickle) cuenta como miss y el valor sale del DWH
+    cache_key = None
+    if use_cache:
+        try:
+            cache_key = query_cache.make_cache_key(
+                query, params, namespace=f"{DB_CONFIG['host']}/{DB_CONFIG['dbname']}"
+            )
+            cached = query_cache.cache_get(cache_key)
+        except Exception as e:
+            print(f"[fetch_single_value] Cache no disponible, se consulta el DWH: {e}")
+            cache_key, cached = None, query_cache.MISS
+        if cached is not query_cache.MISS:
+            record_metric("cache_hits")
+            return cached
+
+    plan = None
     try:
         with get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(query, params or ())
+                _execute(conn, cur, query, params)
                 result = cur.fetchone()
-                return result[0] if result else 0
+                record_metric("rows", max(cur.rowcount, 0))
+                value = result[0] if result else 0
+                if explain:
+                    plan = _explain(conn, cur, query, params)
     except Exception as e:
         print(f"[fetch_single_value] Error: {e}")
         return None
 
+    # Fuera del bloque: record_plan pide otra conexión al pool
+    if plan is not None:
+        query_plans.record_plan(query, plan)
+
+    # Solo se cachean resultados exitosos
+    if cache_key is not None:
+        try:
+            query_cache.cache_set(cache_key, value)
+        except Exception as e:
+            print(f"[fetch_single_value] No se pudo guardar en el cache: {e}")
+    return value
+
+
+def fetch_all_rows(query: str, params: tuple | dict | None = None) -> list[tuple]:
+    """
+    Ejecuta un query y devuelve todas las filas (lista de tuplas).
+    Con parámetros corre como prepared statement (igual que fetch_single_value).
+    Devuelve [] si hay error.
+    """
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                _execute(conn, cur, query, params)
+                rows = cur.fetchall()
+                record_metric("rows", len(rows))
+                return rows
+    except Exception as e:
+        print(f"[fetch_all_rows] Error: {e}")
+        return []
+
+
+# -------------------------------------------------------------------
+# Extracción masiva (COPY -> Arrow / DuckDB)
+# -------------------------------------------------------------------
+
+def _projected_query(query: str, columns: list[str] | None) -> str:
+    """Envuelve el query para traer solo las columnas pedidas."""
+    query = query.strip().rstrip(";")
+    if not columns:
+        return query
+    projection = ", ".join(f'"{c}"' for c in columns)
+    return f"SELECT {projection} FROM ({query}) AS q"
+
+
+def _arrow_schema(description):
+    """cursor.description de Postgres -> schema de Arrow (tipos no mapeados = texto)."""
+    import pyarrow as pa
+
+    types_by_oid = {
+        16: pa.bool_(),
+        20: pa.int64(),
+        21: pa.int16(),
+        23: pa.int32(),
+        700: pa.float32(),
+        701: pa.float64(),
+        1700: pa.float64(),          # numeric
+        1082: pa.date32(),
+        1114: pa.timestamp("us"),
+        1184: pa.timestamp("us", tz="UTC"),  # la sesión del COPY corre en UTC
+    }
+    return pa.schema([(col.name, types_by_oid.get(col.type_code, pa.string())) for col in description])
+
+
+def copy_query_to_arrow_batches(
+    query: str,
+    params: tuple | dict | None = None,
+    columns: list[str] | None = None,
+    block_mb: int | None = None,
+    on_schema=None,
+):
+    """
+    Generador de pyarrow.RecordBatch con el resultado de un query, leído
+    con COPY (...) TO STDOUT en lugar de fetchall() de tuplas.
+
+    - columns: proyección (solo esas columnas viajan desde el DWH)
+    - block_mb: tamaño de cada batch (por defecto DB_COPY_BLOCK_MB)
+
+    La memoria queda acotada: el COPY escribe en un pipe desde otro
+    thread y el lector CSV de Arrow lo consume de a un bloque; si el
+    consumidor va lento, el COPY espera. Los tipos salen del query
+    (cursor.description), no de inferir el CSV; on_schema(schema) se
+    llama con ese schema antes del primer batch.
+    """
+    import pyarrow.csv as pa_csv
+
+    query = _projected_query(query, columns)
+    block_size = (block_mb or DB_COPY_BLOCK_MB) * 1024 * 1024
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            sql = cur.mogrify(query, params).decode() if params else query
+            with timed_metric("db_ms"):
+                cur.execute("SET TIME ZONE 'UTC'")
+                cur.execute(f"SELECT * FROM ({sql}) AS q LIMIT 0")
+            record_metric("db_round_trips", 3)  # SET + schema + COPY
+            schema = _arrow_schema(cur.description)
+            if on_schema is not None:
+                on_schema(schema)
+
+            read_fd, write_fd = os.pipe()
+            errors = []
+
+            def produce():
+                try:
+                    with os.fdopen(write_fd, "wb") as writer:
+                        cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", writer)
+                except Exception as e:
+                    errors.append(e)
+
+            producer = threading.Thread(target=produce, name="copy-extract", daemon=True)
+            producer.start()
+
+            reader = os.fdopen(read_fd, "rb")
+            finished = False
+            try:
+                batches = pa_csv.open_csv(
+                    reader,
+                    read_options=pa_csv.ReadOptions(block_size=block_size),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types=schema,
+                        include_columns=schema.names,
+                        true_values=["t"],
+                        false_values=["f"],
+                        null_values=[""],
+                        strings_can_be_null=True,
+                        quoted_strings_can_be_null=False,
+                    ),
+                )
+                batch_iter = iter(batches)
+                while True:
+                    # Métricas: db_ms = espera del COPY (sin contar al consumidor)
+                    with timed_metric("db_ms"):
+                        batch = next(batch_iter, None)
+                    if batch is None:
+                        break
+                    record_metric("rows", batch.num_rows)
+                    yield batch
+                finished = True
+            finally:
+                failed_first = bool(errors) and not producer.is_alive()
+                if producer.is_alive() and not finished:
+                    # El consumidor cortó antes de tiempo: se cancela el COPY
+                    conn.cancel()
+                reader.close()
+                producer.join()
+                if failed_first and not finished:
+                    raise errors[0]
+
+            if errors:
+                raise errors[0]
+
+
+def copy_query_to_arrow(
+    query: str,
+    params: tuple | dict | None = None,
+    columns: list[str] | None = None,
+):
+    """Igual que copy_query_to_arrow_batches, pero devuelve un solo pyarrow.Table."""
+    import pyarrow as pa
+
+    schemas = []
+    batches = list(copy_query_to_arrow_batches(query, params, columns, on_schema=schemas.append))
+    return pa.Table.from_batches(batches, schema=schemas[0])
+
+
+def copy_query_to_duckdb(
+    duckdb_con,
+    table_name: str,
+    query: str,
+    params: tuple | dict | None = None,
+    columns: list[str] | None = None,
+) -> int:
+    """
+    Carga el resultado de un query del DWH en una tabla DuckDB, batch a
+    batch (nunca está todo el resultado en memoria de Python).
+    Reemplaza la tabla si ya existe. Devuelve la cantidad de filas.
+    """
+    cur = duckdb_con.cursor()  # cursor propio: no bloquea a otros usuarios de la conexión
+    rows = 0
+
+    def create_table(schema):
+        cur.register("_copy_batch", schema.empty_table())
+        cur.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM _copy_batch")
+        cur.unregister("_copy_batch")
+
+    try:
+        for batch in copy_query_to_arrow_batches(query, params, columns, on_schema=create_table):
+            cur.register("_copy_batch", batch)
+            cur.execute(f"INSERT INTO {table_name} SELECT * FROM _copy_batch")
+            cur.unregister("_copy_batch")
+            rows += batch.num_rows
+    finally:
+        cur.close()
+    return rows
+
+
+def _execute_scorecard_upsert(cur, table_name: str, rows: list[tuple]):
+    """
+    Upsert multi-row (VALUES (...), (...), ...) sobre un cursor abierto,
+    usando la clave natural (sc_name, kpi_number, last_sunday):
+    si la semana ya tiene valor para ese KPI, se reemplaza.
+    """
+    key_idx = [SCORECARD_COLUMNS.index(c) for c in ("sc_name", "kpi_number", "last_sunday")]
+
+    # Un mismo INSERT ... ON CONFLICT no puede tocar dos veces la misma fila:
+    # si el lote trae la misma clave repetida, gana la última.
+    unique_rows = {tuple(row[i] for i in key_idx): row for row in rows}
+
+    columns = ", ".join(f'"{c}"' for c in SCORECARD_COLUMNS)
+    updates = ", ".join(
+        f'"{c}" = EXCLUDED."{c}"'
+        for c in SCORECARD_COLUMNS
+        if c not in ("sc_name", "kpi_number", "last_sunday")
+    )
+    sql = f"""
+        INSERT INTO {table_name} ({columns}) VALUES %s
+        ON CONFLICT ("sc_name", "kpi_number", "last_sunday")
+        DO UPDATE SET {updates}
+    """
+    execute_values(cur, sql, list(unique_rows.values()), page_size=SCORECARD_FLUSH_SIZE)
+
+
+def insert_scorecard_records(
+    rows_by_table: dict[str, list[tuple]],
+    on_commit: list[Callable[[], None]] | None = None,
+) -> bool:
+    """
+    Escribe (upsert) varios registros en una o más tablas de scorecard
+    en una sola transacción. Queda un solo valor por KPI por semana.
+
+    rows_by_table: {table_name: [tupla en el orden de SCORECARD_COLUMNS, ...]}
+    on_commit: funciones a llamar solo si la transacción se confirmó
+    (ej. guardar los watermarks del KPI).
+
+    Devuelve True si la transacción se confirmó (o no había nada que
+    escribir) y False si falló (el error se imprime).
+    """
+    from core.scorecard_schema import check_scorecard_schema, check_year_partitions
+
+    rows_by_table = {t: rows for t, rows in rows_by_table.items() if rows}
+    if not rows_by_table:
+        return True
+
+    # Sin la clave natural el upsert no puede correr: check_scorecard_schema
+    # levanta RuntimeError (fuera del try, para que no pase desapercibido)
+    for table_name in rows_by_table:
+        check_scorecard_schema(table_name)
+
+    # Las particiones van por last_sunday ('YYYY-MM-DD' o date)
+    sunday_idx = SCORECARD_COLUMNS.index("last_sunday")
+    try:
+        for table_name, rows in rows_by_table.items():
+            check_year_partitions(table_name, {int(str(row[sunday_idx])[:4]) for row in rows})
+
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                for table_name, rows in rows_by_table.items():
+                    _execute_scorecard_upsert(cur, table_name, rows)
+            conn.commit()
+    except Exception as e:
+        total = sum(len(rows) for rows in rows_by_table.values())
+        print(f"[insert_scorecard_records] Error ({total} registros): {e}")
+        return False
+
+    for callback in on_commit or []:
+        try:
+            callback()
+        except Exception as e:
+            print(f"[insert_scorecard_records] Error en on_commit: {e}")
+
+    # Solo lo que quedó confirmado llega a los listeners (ej. Sheets)
+    for table_name, rows in rows_by_table.items():
+        for row in rows:
+            _notify_listeners(table_name, row)
+    return True
+
 
 def insert_scorecard_record(
     table_name: str,
@@ -54,38 +639,140 @@ def insert_scorecard_record(
     field_name: str,
     field_details: str | None,
     field_value: float | int | None,
+    on_commit: Callable[[], None] | None = None,
 ):
     """
-    Inserta un registro en la tabla de scorecard.
+    Inserta un registro en la tabla de scorecard. Si ya existe un valor
+    para (sc_name, kpi_number, last_sunday), se reemplaza (upsert).
 
     table_name: normalmente 'vl_analytics.scorecard_vl02' o similar.
+
+    Si hay un buffer activo (ver buffered_scorecard_writes), el registro
+    se acumula y se escribe en bloque al hacer flush.
+
+    on_commit se llama cuando el registro quedó confirmado (con el buffer,
+    en el flush); si el write falla, no se llama.
     """
-    sql = f"""
-        INSERT INTO {table_name}
-        ("year", "print_date", "sc_name", "last_sunday",
-         "kpi_number", "range_type", "week_month",
-         "field_name", "field_details", "field_value")
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    row = (
+        year,
+        print_date,
+        sc_name,
+        last_sunday,
+        kpi_number,
+        range_type,
+        week_month,
+        field_name,
+        field_details,
+        field_value,
+    )
+
+    with _buffer_lock:
+        buffered = _buffer is not None
+        if buffered:
+            _buffer.append((table_name, row, on_commit))
+            full = len(_buffer) >= _buffer_flush_size
+
+    if not buffered:
+        insert_scorecard_records({table_name: [row]}, [on_commit] if on_commit else None)
+    elif full:
+        flush_scorecard_buffer()
+
+
+def _notify_listeners(table_name: str, row: tuple):
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(table_name, row)
+        except Exception as e:
+            # Un listener roto (ej. publicación en Sheets) no frena al KPI
+            print(f"[insert_scorecard_records] Error en listener: {e}")
+
+
+@contextmanager
+def scorecard_listener(listener):
+    """
+    Mientras dura el bloque, listener(table_name, row) recibe cada
+    registro escrito en la tabla de scorecard (row en el orden de
+    SCORECARD_COLUMNS) después del commit: con el buffer activo, en el
+    flush. Un registro cuyo write falla no se notifica. Lo usa la
+    publicación en streaming (core.streaming_publish).
+    """
+    with _listeners_lock:
+        _listeners.append(listener)
+    try:
+        yield
+    finally:
+        with _listeners_lock:
+            _listeners.remove(listener)
+
+
+# -------------------------------------------------------------------
+# Buffer de escritura del scorecard
+# -------------------------------------------------------------------
+
+def _write_pending(pending: list[tuple[str, tuple, Callable[[], None] | None]]) -> bool:
+    by_table: dict[str, list[tuple]] = {}
+    callbacks = []
+    for table_name, row, on_commit in pending:
+        by_table.setdefault(table_name, []).append(row)
+        if on_commit is not None:
+            callbacks.append(on_commit)
+    return insert_scorecard_records(by_table, callbacks)
+
+
+def flush_scorecard_buffer():
+    """
+    Escribe todo lo acumulado en el buffer en una sola transacción.
+    No hace nada si el buffer está vacío o desactivado.
+
+    El buffer se vacía bajo _buffer_lock y se escribe fuera de él: los
+    KPIs que siguen corriendo pueden acumular registros mientras tanto.
+    """
+    with _flush_lock:
+        with _buffer_lock:
+            if not _buffer:
+                return
+            pending = list(_buffer)
+            _buffer.clear()
+        _write_pending(pending)
+
+
+@contextmanager
+def buffered_scorecard_writes(flush_size: int | None = None):
+    """
+    Activa el buffer de escritura mientras dura el bloque:
+
+        with buffered_scorecard_writes():
+            run_kpi_5()
+            run_kpi_16()
+
+    Los insert_scorecard_record() de los KPIs se acumulan y se escriben
+    en bloque cada `flush_size` registros y al salir del bloque.
+    Si ya hay un buffer activo, se reutiliza (el flush final lo hace
+    el bloque más externo).
     """
+    global _buffer, _buffer_flush_size
+
+    with _buffer_lock:
+        outermost = _buffer is None
+        if outermost:
+            _buffer = []
+            _buffer_flush_size = flush_size or SCORECARD_FLUSH_SIZE
 
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    sql,
-                    (
-                        year,
-                        print_date,
-                        sc_name,
-                        last_sunday,
-                        kpi_number,
-                        range_type,
-                        week_month,
-                        field_name,
-                        field_details,
-                        field_value,
-                    ),
-                )
-            conn.commit()
-    except Exception as e:
-        print(f"[insert_scorecard_record] Error: {e}")
+        yield
+    finally:
+        if outermost:
+            with _flush_lock:
+                with _buffer_lock:
+                    pending = _buffer or []
+                    _buffer = None
+                    _buffer_flush_size = SCORECARD_FLUSH_SIZE
+                _write_pending(pending)
+
+
+# Al salir del proceso (atexit corre en orden inverso):
+# historial de métricas -> flush del buffer -> close_pool
+atexit.register(flush_scorecard_buffer)
+atexit.register(flush_run_history)
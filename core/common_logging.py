@@ -0,0 +1,352 @@
+# core/common_logging.py
+
+"""
+Métricas estructuradas por KPI y tabla de historial de corridas.
+
+Cada KPI que corre por core.kpi_runner se mide dentro de kpi_metrics():
+
+    {"event": "kpi_metrics", "run_id": "3f9c0a1b2d4e", "domain": "success",
+     "kpi_number": "32", "status": "ok", "wall_ms": 8412.3, "db_ms": 8120.9,
+     "db_round_trips": 4, "rows": 1, "sheets_calls": 0, "sheets_bytes": 0,
+     "cache_hits": 0, ...}
+
+- wall_ms: duración total del KPI
+- db_ms / db_round_trips / rows: tiempo en el DWH, queries enviados y
+  filas recibidas (instrumentado en core.common_db)
+- sheets_calls / sheets_bytes: requests al API de Google y bytes
+  recibidos (hook de la sesión HTTP en core.common_sheets)
+- cache_hits: resultados servidos por core.query_cache o por el cache de
+  snapshots de Sheets
+
+Las métricas se imprimen como una línea JSON (KPI_METRICS_LOG, y
+opcionalmente se agregan a KPI_METRICS_FILE) y se guardan en
+KPI_RUN_HISTORY_TABLE al terminar la corrida. Con ese historial se ven
+regresiones semana a semana:
+
+    python -m core.common_logging --kpi 32
+    python -m core.common_logging --domain success --weeks 12 --factor 1.5
+
+Las métricas se acumulan por contexto (contextvars): cada KPI tiene las
+suyas aunque corran en paralelo. Las llamadas fuera de un KPI no se miden.
+Para leerlas desde el mismo proceso (ej. benchmarks) está
+metrics_listener(), que no depende del historial.
+"""
+
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+
+# JSON por KPI a stdout (KPI_METRICS_LOG=0 lo apaga) y a un archivo opcional (JSONL)
+KPI_METRICS_LOG = os.getenv("KPI_METRICS_LOG", "1") == "1"
+KPI_METRICS_FILE = os.getenv("KPI_METRICS_FILE")
+
+# Historial de corridas en el DWH (KPI_RUN_HISTORY=0 lo apaga)
+KPI_RUN_HISTORY = os.getenv("KPI_RUN_HISTORY", "1") == "1"
+KPI_RUN_HISTORY_TABLE = os.getenv("KPI_RUN_HISTORY_TABLE", "vl_analytics.kpi_run_history")
+
+# Identificador de la corrida (todas las métricas del proceso lo comparten)
+RUN_ID = os.getenv("KPI_RUN_ID") or uuid.uuid4().hex[:12]
+
+# Contadores por KPI (en este orden van a la tabla de historial)
+METRIC_FIELDS = (
+    "wall_ms", "db_ms", "db_round_trips", "rows",
+    "sheets_calls", "sheets_bytes", "cache_hits",
+)
+
+_current: ContextVar[dict | None] = ContextVar("kpi_metrics", default=None)
+
+# Filas para el historial (solo con KPI_RUN_HISTORY)
+_pending: list[dict] = []
+_pending_lock = threading.Lock()
+_file_lock = threading.Lock()
+
+_listeners: list = []
+_listeners_lock = threading.Lock()
+
+_table_ready = False
+_table_lock = threading.Lock()
+
+
+# -------------------------------------------------------------------
+# 1) Medición
+# -------------------------------------------------------------------
+
+def record_metric(name: str, amount: float = 1):
+    """Suma amount al contador name del KPI en curso (no hace nada fuera de un KPI)."""
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics["_lock"]:
+            metrics[name] += amount
+
+
+@contextmanager
+def timed_metric(name: str):
+    """Suma al contador name (ms) lo que dure el bloque."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_metric(name, (time.perf_counter() - start) * 1000)
+
+
+def current_kpi() -> dict | None:
+    """Métricas del KPI en curso (run_id, domain, kpi_number, label...), o None."""
+    return _current.get()
+
+
+@contextmanager
+def kpi_metrics(label: str, kpi_number: str | None = None, domain: str | None = None):
+    """
+    Mide un KPI: activa sus contadores mientras dura el bloque y, al
+    salir, emite la línea JSON y deja la fila para el historial.
+    Si ya hay un KPI en curso (ej. run_kpi dentro de run_kpi_XX), el
+    bloque se suma a ese.
+    """
+    if _current.get() is not None:
+        yield _current.get()
+        return
+
+    from core.common_dates import get_last_sunday
+
+    metrics = {field: 0 for field in METRIC_FIELDS}
+    metrics.update({
+        "_lock": threading.Lock(),
+        "run_id": RUN_ID,
+        "domain": domain,
+        "kpi_number": kpi_number,
+        "label": label,
+        "last_sunday": get_last_sunday().strftime("%Y-%m-%d"),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "status": "ok",
+        "error": None,
+    })
+    token = _current.set(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    except BaseException as e:
+        metrics["status"], metrics["error"] = "error", str(e)[:500]
+        raise
+    finally:
+        _current.reset(token)
+        metrics["wall_ms"] = (time.perf_counter() - start) * 1000
+        del metrics["_lock"]
+        for field in ("wall_ms", "db_ms"):
+            metrics[field] = round(metrics[field], 1)
+        log_json("kpi_metrics", **metrics)
+        if KPI_RUN_HISTORY:
+            with _pending_lock:
+                _pending.append(metrics)
+        _notify_listeners(metrics)
+
+
+def _notify_listeners(metrics: dict):
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(metrics)
+        except Exception as e:
+            print(f"[kpi_metrics] Error en listener: {e}")
+
+
+@contextmanager
+def metrics_listener(listener):
+    """
+    Mientras dura el bloque, listener(metrics) recibe las métricas de
+    cada KPI que termina, en cualquier thread (con o sin historial).
+    Lo usa benchmarks.run_benchmarks.
+    """
+    with _listeners_lock:
+        _listeners.append(listener)
+    try:
+        yield
+    finally:
+        with _listeners_lock:
+            _listeners.remove(listener)
+
+
+def log_json(event: str, **fields):
+    """Una línea JSON por evento (stdout y/o KPI_METRICS_FILE)."""
+    line = json.dumps({"event": event, **fields}, default=str, ensure_ascii=False)
+    if KPI_METRICS_LOG:
+        print(line)
+    if KPI_METRICS_FILE:
+        with _file_lock, open(KPI_METRICS_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# -------------------------------------------------------------------
+# 2) Historial en el DWH
+# -------------------------------------------------------------------
+
+def ensure_run_history_table():
+    """Crea KPI_RUN_HISTORY_TABLE si no existe (una vez por proceso)."""
+    from core.common_db import get_connection
+
+    global _table_ready
+    with _table_lock:
+        if _table_ready:
+            return
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {KPI_RUN_HISTORY_TABLE} (
+                        run_id         TEXT NOT NULL,
+                        host           TEXT,
+                        domain         TEXT,
+                        kpi_number     TEXT,
+                        label          TEXT NOT NULL,
+                        last_sunday    DATE NOT NULL,
+                        started_at     TIMESTAMPTZ NOT NULL,
+                        status         TEXT NOT NULL,
+                        error          TEXT,
+                        wall_ms        DOUBLE PRECISION NOT NULL,
+                        db_ms          DOUBLE PRECISION NOT NULL,
+                        db_round_trips INTEGER NOT NULL,
+                        rows           BIGINT NOT NULL,
+                        sheets_calls   INTEGER NOT NULL,
+                        sheets_bytes   BIGINT NOT NULL,
+                        cache_hits     INTEGER NOT NULL
+                    )
+                    """
+                )
+                index = KPI_RUN_HISTORY_TABLE.split(".")[-1] + "_kpi_idx"
+                cur.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index} "
+                    f"ON {KPI_RUN_HISTORY_TABLE} (domain, kpi_number, started_at)"
+                )
+            conn.commit()
+        _table_ready = True
+
+
+def flush_run_history():
+    """
+    Guarda en KPI_RUN_HISTORY_TABLE las métricas acumuladas (un INSERT
+    para todos los KPIs). Un error acá no hace fallar la corrida.
+    """
+    with _pending_lock:
+        pending = list(_pending)
+        _pending.clear()
+    if not pending or not KPI_RUN_HISTORY:
+        return
+
+    from psycopg2.extras import execute_values
+
+    from core.common_db import get_connection
+
+    columns = ("run_id", "host", "domain", "kpi_number", "label", "last_sunday",
+               "started_at", "status", "error") + METRIC_FIELDS
+    host = socket.gethostname()
+    rows = [tuple(host if c == "host" else m[c] for c in columns) for m in pending]
+    try:
+        ensure_run_history_table()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    f"INSERT INTO {KPI_RUN_HISTORY_TABLE} ({', '.join(columns)}) VALUES %s",
+                    rows,
+                )
+            conn.commit()
+    except Exception as e:
+        print(f"[flush_run_history] No se pudo guardar el historial: {e}")
+
+
+# -------------------------------------------------------------------
+# 3) Regresiones semana a semana
+# -------------------------------------------------------------------
+
+def fetch_weekly_history(domain: str | None = None, kpi_number: str | None = None, weeks: int = 8) -> list[tuple]:
+    """
+    Mediana de wall_ms / db_ms / rows por KPI y semana (corridas OK),
+    últimas `weeks` semanas. Filas (domain, kpi_number, last_sunday,
+    wall_ms, db_ms, rows, runs), ordenadas por KPI y semana.
+    """
+    from core.common_db import fetch_all_rows
+
+    query = f"""
+        SELECT
+            domain,
+            kpi_number,
+            last_sunday,
+            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY wall_ms) AS wall_ms,
+            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY db_ms)   AS db_ms,
+            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY rows)    AS rows,
+            COUNT(*)                                             AS runs
+        FROM {KPI_RUN_HISTORY_TABLE}
+        WHERE status = 'ok'
+          AND last_sunday >= CURRENT_DATE - (%(weeks)s * 7)
+          AND (%(domain)s::TEXT IS NULL OR domain = %(domain)s::TEXT)
+          AND (%(kpi)s::TEXT IS NULL OR kpi_number = %(kpi)s::TEXT)
+        GROUP BY domain, kpi_number, last_sunday
+        ORDER BY domain, kpi_number, last_sunday
+    """
+    return fetch_all_rows(query, {"weeks": weeks, "domain": domain, "kpi": kpi_number})
+
+
+def find_regressions(history: list[tuple], factor: float = 1.5) -> list[dict]:
+    """
+    Compara la última semana de cada KPI contra la mediana de las
+    semanas anteriores: regresión = wall_ms > factor × esa mediana.
+    """
+    by_kpi: dict[tuple, list[tuple]] = {}
+    for row in history:
+        by_kpi.setdefault((row[0], row[1]), []).append(row)
+
+    regressions = []
+    for (domain, kpi_number), rows in by_kpi.items():
+        if len(rows) < 2:
+            continue
+        previous = sorted(float(r[3]) for r in rows[:-1])
+        baseline = previous[len(previous) // 2]
+        latest = float(rows[-1][3])
+        if baseline > 0 and latest > factor * baseline:
+            regressions.append({
+                "domain": domain,
+                "kpi_number": kpi_number,
+                "last_sunday": str(rows[-1][2]),
+                "wall_ms": latest,
+                "baseline_ms": baseline,
+                "ratio": round(latest / baseline, 2),
+            })
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Historial de métricas por KPI y regresiones.")
+    parser.add_argument("--domain", help="domain, ej. success")
+    parser.add_argument("--kpi", help="número de KPI, ej. 32")
+    parser.add_argument("--weeks", type=int, default=8, help="semanas de historial")
+    parser.add_argument("--factor", type=float, default=1.5,
+                        help="regresión si la última semana supera factor × la mediana previa")
+    args = parser.parse_args(argv)
+
+    history = fetch_weekly_history(args.domain, args.kpi, args.weeks)
+    for domain, kpi_number, last_sunday, wall_ms, db_ms, rows, runs in history:
+        print(f"{domain or '-':<12} KPI {kpi_number or '-':<4} {last_sunday}  "
+              f"wall {float(wall_ms):9.1f} ms  db {float(db_ms):9.1f} ms  rows {float(rows):9.0f}  ({runs} corridas)")
+
+    regressions = find_regressions(history, args.factor)
+    print("---------------------------------------------")
+    if regressions:
+        print("REGRESIONES:")
+        for r in regressions:
+            print(f"  - {r['domain']} KPI {r['kpi_number']} ({r['last_sunday']}): "
+                  f"{r['wall_ms']:.0f} ms vs {r['baseline_ms']:.0f} ms (x{r['ratio']})")
+        return 1
+    print("Sin regresiones.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,276 @@
+# core/common_sheets.py
+
+"""
+Helpers de Google Sheets compartidos por KPIs y publishers.
+
+Clientes compartidos
+--------------------
+get_gspread_client() devuelve un cliente autorizado por proceso y por
+modo: las credenciales del Service Account se leen una sola vez, el
+token se refresca automáticamente cuando expira y todas las llamadas
+reutilizan la misma sesión HTTP (keep-alive).
+
+- get_gspread_client(): solo lectura (READ_SCOPES). Lo usan los KPIs,
+  los watermarks y la sesión DuckDB.
+- get_gspread_client(write=True): lectura y escritura (WRITE_SCOPES).
+  Solo para los publishers (run_to_sheet_*).
+
+Cache local de snapshots
+------------------------
+Bajar una pestaña completa con get_all_records() es lento y consume
+cuota del API. Por eso cada pestaña leída se guarda en disco como
+Parquet, con una clave que incluye el modifiedTime del archivo en Drive:
+
+    (spreadsheet_id, worksheet, modifiedTime) -> <SHEETS_CACHE_DIR>/<clave>.parquet
+
+Si el sheet no cambió desde la última lectura, se sirve desde disco
+sin volver a descargar las filas (solo se consulta el modifiedTime).
+Cuando el directorio supera SHEETS_CACHE_MAX_MB se borran los snapshots
+menos usados recientemente.
+
+gspread, google-auth y pandas se importan recién al usarse: importar
+este módulo (ej. desde core.watermarks o un runner) no los carga.
+"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from core.common_logging import record_metric
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+
+# Directorio y tamaño máximo del cache de snapshots
+SHEETS_CACHE_DIR = os.getenv(
+    "SHEETS_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "ev-kpi-factory", "sheets"),
+)
+SHEETS_CACHE_MAX_MB = int(os.getenv("SHEETS_CACHE_MAX_MB", "512"))
+
+# SHEETS_CACHE=0 desactiva el cache (siempre se descarga el sheet)
+SHEETS_CACHE_ENABLED = os.getenv("SHEETS_CACHE", "1") == "1"
+
+
+# Scopes de los clientes compartidos: KPIs (solo lectura) y publishers
+READ_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets.readonly",
+    "https://www.googleapis.com/auth/drive.readonly",
+]
+WRITE_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+_clients: dict[bool, object] = {}  # write -> cliente
+_client_lock = threading.Lock()
+
+
+# -------------------------------------------------------------------
+# 1) Clientes de gspread (uno por proceso y modo)
+# -------------------------------------------------------------------
+
+def get_gspread_client(write: bool = False):
+    """
+    Devuelve el cliente de gspread del proceso, creándolo la primera vez
+    con el Service Account de GOOGLE_APPLICATION_CREDENTIALS.
+
+    write: False = solo lectura (KPIs), True = escritura (publishers).
+
+    El cliente usa una AuthorizedSession: mantiene la conexión HTTP
+    abierta y refresca el token de acceso cuando vence.
+    """
+    if write not in _clients:
+        with _client_lock:
+            if write not in _clients:
+                import gspread
+                from google.oauth2.service_account import Credentials
+
+                creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+                if not creds_path:
+                    raise RuntimeError(
+                        "GOOGLE_APPLICATION_CREDENTIALS no está definida. "
+                        "Configura la variable de entorno con la ruta al JSON del Service Account."
+                    )
+
+                scopes = WRITE_SCOPES if write else READ_SCOPES
+                creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
+                client = gspread.authorize(creds)
+
+                # Métricas por KPI: cada respuesta del API cuenta como una
+                # llamada (y sus bytes), ver core.common_logging
+                session = getattr(getattr(client, "http_client", client), "session", None)
+                if session is not None:
+                    session.hooks["response"].append(_count_api_response)
+                _clients[write] = client
+    return _clients[write]
+
+
+def _count_api_response(response, *args, **kwargs):
+    record_metric("sheets_calls")
+    record_metric("sheets_bytes", len(response.content or b""))
+
+
+# -------------------------------------------------------------------
+# 2) Metadata del sheet
+# -------------------------------------------------------------------
+
+def get_sheet_modified_time(sh) -> str:
+    """
+    Devuelve el modifiedTime del spreadsheet según Drive
+    (una llamada liviana, sin bajar filas).
+    """
+    if hasattr(sh, "get_lastUpdateTime"):
+        return sh.get_lastUpdateTime()
+    # gspread < 6
+    return sh.lastUpdateTime
+
+
+# -------------------------------------------------------------------
+# 3) Cache en disco
+# -------------------------------------------------------------------
+
+def _sheet_prefix(spreadsheet_id: str, worksheet_name: str) -> str:
+    return hashlib.sha1(f"{spreadsheet_id}|{worksheet_name}".encode()).hexdigest()[:16]
+
+
+def _cache_path(spreadsheet_id: str, worksheet_name: str, modified_time: str) -> Path:
+    revision = hashlib.sha1(modified_time.encode()).hexdigest()[:16]
+    prefix = _sheet_prefix(spreadsheet_id, worksheet_name)
+    return Path(SHEETS_CACHE_DIR) / f"{prefix}_{revision}.parquet"
+
+
+def _evict_cache(keep: Path | None = None):
+    """Borra los snapshots menos usados hasta quedar bajo SHEETS_CACHE_MAX_MB."""
+    cache_dir = Path(SHEETS_CACHE_DIR)
+    if not cache_dir.is_dir():
+        return
+
+    files = sorted(cache_dir.glob("*.parquet"), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in files)
+    max_bytes = SHEETS_CACHE_MAX_MB * 1024 * 1024
+
+    for path in files:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        total -= path.stat().st_size
+        path.unlink(missing_ok=True)
+
+
+def _normalize_records_frame(df: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    get_all_records() mezcla tipos en una misma columna (ej. 3, 5, '').
+    Parquet necesita un tipo por columna, así que:
+    - columnas numéricas (con vacíos) -> float (vacío = NaN)
+    - el resto -> texto
+    Se aplica igual con o sin cache para que el resultado no dependa de él.
+    """
+    import pandas as pd
+
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        values = [v for v in df[col] if v != "" and v is not None]
+        numeric = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+        if values and numeric:
+            df[col] = pd.to_numeric(df[col].replace("", None), errors="coerce")
+        else:
+            df[col] = df[col].astype(str)
+    return df
+
+
+# -------------------------------------------------------------------
+# 4) Lectura de pestañas
+# -------------------------------------------------------------------
+
+def _load_worksheet(client, sheet_name: str, worksheet_name: str, use_cache: bool | None, read_snapshot):
+    """
+    Lectura común de load_worksheet_records / load_worksheet_table.
+    Si hay snapshot en disco devuelve read_snapshot(path); si no, baja
+    la pestaña, guarda el snapshot y devuelve el DataFrame.
+    """
+    import pandas as pd
+
+    if use_cache is None:
+        use_cache = SHEETS_CACHE_ENABLED
+
+    sh = client.open(sheet_name)
+
+    path = None
+    if use_cache:
+        path = _cache_path(sh.id, worksheet_name, get_sheet_modified_time(sh))
+        if path.exists():
+            try:
+                snapshot = read_snapshot(path)
+                os.utime(path)  # marca de uso para la evicción LRU
+                record_metric("cache_hits")
+                return snapshot
+            except Exception as e:
+                print(f"[load_worksheet_records] Cache ilegible, se descarga de nuevo: {e}")
+
+    ws = sh.worksheet(worksheet_name)
+    df = _normalize_records_frame(pd.DataFrame(ws.get_all_records()))
+
+    if path is not None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Las revisiones anteriores de esta pestaña ya no sirven
+            for old in path.parent.glob(f"{_sheet_prefix(sh.id, worksheet_name)}_*.parquet"):
+                old.unlink(missing_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            _evict_cache(keep=path)
+        except Exception as e:
+            print(f"[load_worksheet_records] No se pudo guardar el cache: {e}")
+
+    return df
+
+
+def load_worksheet_records(
+    client,
+    sheet_name: str,
+    worksheet_name: str,
+    use_cache: bool | None = None,
+) -> "pd.DataFrame":
+    """
+    Lee una pestaña de Google Sheets como DataFrame (get_all_records),
+    sirviéndola desde el cache local si el sheet no cambió en Drive.
+
+    - client: cliente de gspread ya autorizado
+    - sheet_name: nombre del archivo en Google Sheets
+    - worksheet_name: pestaña específica
+    - use_cache: None = usar SHEETS_CACHE_ENABLED
+    """
+    import pandas as pd
+
+    return _load_worksheet(client, sheet_name, worksheet_name, use_cache, pd.read_parquet)
+
+
+def load_worksheet_table(
+    client,
+    sheet_name: str,
+    worksheet_name: str,
+    use_cache: bool | None = None,
+) -> "pa.Table":
+    """
+    Igual que load_worksheet_records, pero devuelve un pyarrow.Table.
+    Si el snapshot está en disco se lee con memory map, sin pasar por
+    pandas (es lo que registra core.duckdb_session).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    snapshot = _load_worksheet(
+        client, sheet_name, worksheet_name, use_cache,
+        lambda path: pq.read_table(path, memory_map=True),
+    )
+    if isinstance(snapshot, pa.Table):
+        return snapshot
+    return pa.Table.from_pandas(snapshot, preserve_index=False)
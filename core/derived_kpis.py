@@ -0,0 +1,241 @@
+# core/derived_kpis.py
+
+"""
+Motor de KPIs derivados (ventanas sobre el histórico del scorecard).
+
+Un KPI derivado se declara por su KPI base, una ventana en semanas y
+un agregado:
+
+    derived_kpi("05", "4 Week Ave. Offboarding Forms Completed",
+                base_kpi="06", window_weeks=4, aggregate="avg")
+
+compute_derived_kpis() calcula TODOS los derivados de una semana con
+una sola lectura del histórico (un query para todos los KPIs base) y
+un pase en memoria, en lugar de un query por KPI derivado.
+
+Agregados soportados:
+- avg, sum, min, max: sobre las semanas con last_sunday entre
+  (semana - window_weeks) y la semana, ambos incluidos
+  (mismo rango que usaba el query original del KPI 5)
+- yoy_delta: valor de la semana menos el valor de 52 semanas antes
+"""
+
+from datetime import date, datetime, timedelta
+from functools import partial
+
+from core.common_dates import get_last_sunday, get_year_week
+from core.common_db import fetch_all_rows, insert_scorecard_record
+from core.scorecard_schema import latest_view_name
+from core.watermarks import check_sources, record_watermarks, table_source
+
+
+AGGREGATES = ("avg", "sum", "min", "max", "yoy_delta")
+
+# Semanas hacia atrás que usa yoy_delta
+YOY_WEEKS = 52
+
+
+def derived_kpi(
+    kpi_number: str,
+    field_name: str,
+    base_kpi: str,
+    window_weeks: int = 4,
+    aggregate: str = "avg",
+    sc_name: str = "Success",
+    base_sc_name: str | None = None,
+    field_details: str | None = None,
+) -> dict:
+    """
+    Declara un KPI derivado. Devuelve un dict con la configuración.
+    """
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"Agregado no soportado: {aggregate} (opciones: {', '.join(AGGREGATES)})")
+
+    if field_details is None:
+        if aggregate == "yoy_delta":
+            field_details = f"YoY delta of KPI {base_kpi}"
+        else:
+            field_details = f"{aggregate.upper()} of KPI {base_kpi} over last {window_weeks} weeks"
+
+    return {
+        "kpi_number": kpi_number,
+        "field_name": field_name,
+        "base_kpi": base_kpi,
+        "window_weeks": window_weeks,
+        "aggregate": aggregate,
+        "sc_name": sc_name,
+        "base_sc_name": base_sc_name or sc_name,
+        "field_details": field_details,
+    }
+
+
+def _lookback_weeks(derived: dict) -> int:
+    return YOY_WEEKS if derived["aggregate"] == "yoy_delta" else derived["window_weeks"]
+
+
+def fetch_base_history(
+    derived_list: list[dict],
+    last_sunday: date,
+    table_name: str,
+) -> dict[tuple[str, str], dict[date, float]]:
+    """
+    Lee en UN query el histórico semanal de todos los KPIs base.
+
+    Devuelve {(sc_name, kpi_number): {last_sunday: field_value}}.
+    Lee la vista <tabla>_latest (un valor por KPI por semana).
+    """
+    start = last_sunday - timedelta(weeks=max(_lookback_weeks(d) for d in derived_list))
+    sc_names = sorted({d["base_sc_name"] for d in derived_list})
+    base_kpis = sorted({d["base_kpi"] for d in derived_list})
+
+    query = f"""
+        SELECT sc_name, kpi_number, last_sunday, field_value
+        FROM {latest_view_name(table_name)}
+        WHERE sc_name = ANY(%s)
+          AND kpi_number = ANY(%s)
+          AND range_type = 'weekly'
+          AND last_sunday >= %s
+          AND last_sunday <= %s
+        ORDER BY last_sunday ASC;
+    """
+    rows = fetch_all_rows(
+        query,
+        (sc_names, base_kpis, start.strftime("%Y-%m-%d"), last_sunday.strftime("%Y-%m-%d")),
+    )
+
+    history = {}
+    for sc_name, kpi_number, row_sunday, field_value in rows:
+        if hasattr(row_sunday, "date"):
+            row_sunday = row_sunday.date()
+        elif isinstance(row_sunday, str):
+            row_sunday = date.fromisoformat(row_sunday[:10])
+        history.setdefault((sc_name, kpi_number), {})[row_sunday] = field_value
+
+    return history
+
+
+def _aggregate(derived: dict, series: dict[date, float], last_sunday: date):
+    """Aplica el agregado de un derivado sobre la serie de su KPI base."""
+    if derived["aggregate"] == "yoy_delta":
+        current = series.get(last_sunday)
+        previous = series.get(last_sunday - timedelta(weeks=YOY_WEEKS))
+        if current is None or previous is None:
+            return None
+        return float(current) - float(previous)
+
+    start = last_sunday - timedelta(weeks=derived["window_weeks"])
+    values = [
+        float(v) for d, v in series.items()
+        if start <= d <= last_sunday and v is not None
+    ]
+    if not values:
+        return 0.0
+
+    if derived["aggregate"] == "avg":
+        return sum(values) / len(values)
+    if derived["aggregate"] == "sum":
+        return sum(values)
+    if derived["aggregate"] == "min":
+        return min(values)
+    return max(values)
+
+
+def compute_derived_kpis(
+    derived_list: list[dict],
+    last_sunday: date,
+    table_name: str = "vl_analytics.scorecard_vl02",
+) -> dict[str, float | None]:
+    """
+    Calcula todos los KPIs derivados para la semana last_sunday con
+    una sola lectura del histórico.
+
+    Devuelve {kpi_number_derivado: valor}.
+    """
+    if not derived_list:
+        return {}
+
+    history = fetch_base_history(derived_list, last_sunday, table_name)
+
+    return {
+        d["kpi_number"]: _aggregate(d, history.get((d["base_sc_name"], d["base_kpi"]), {}), last_sunday)
+        for d in derived_list
+    }
+
+
+def base_kpi_source(derived: dict, table_name: str) -> dict:
+    """
+    Fuente de un derivado para core.watermarks: las filas de su KPI base
+    en la tabla de scorecard (cambian si el KPI base se reescribe).
+    """
+    return table_source(
+        table_name,
+        updated_column="print_date",
+        where=f"sc_name = '{derived['base_sc_name']}' AND kpi_number = '{derived['base_kpi']}'",
+    )
+
+
+def run_derived_kpis(
+    derived_list: list[dict],
+    table_name: str = "vl_analytics.scorecard_vl02",
+    last_sunday: date | None = None,
+    force: bool = False,
+) -> dict[str, float | None]:
+    """
+    Calcula los KPIs derivados del último domingo (o de last_sunday)
+    y los inserta en la tabla de scorecard.
+
+    Los derivados cuyo KPI base no cambió desde el último cálculo de
+    esa semana se omiten (force=True los recalcula igual).
+    """
+    if last_sunday is None:
+        last_sunday = get_last_sunday()
+    last_sunday_str = last_sunday.strftime("%Y-%m-%d")
+    year_week_num = get_year_week(last_sunday)[-2:]
+    timestamp_time = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    to_run = []
+    watermarks = {}
+    for d in derived_list:
+        skip, watermarks[d["kpi_number"]] = check_sources(
+            [base_kpi_source(d, table_name)], table_name,
+            d["sc_name"], d["kpi_number"], last_sunday_str, force=force,
+        )
+        if skip:
+            print(f"KPI {d['kpi_number']}: KPI base sin cambios, se omite ({last_sunday_str}).")
+        else:
+            to_run.append(d)
+
+    if not to_run:
+        return {}
+    derived_list = to_run
+
+    values = compute_derived_kpis(derived_list, last_sunday, table_name)
+
+    for d in derived_list:
+        value = values[d["kpi_number"]]
+        insert_scorecard_record(
+            table_name=table_name,
+            year=last_sunday.year,
+            print_date=timestamp_time,
+            sc_name=d["sc_name"],
+            last_sunday=last_sunday_str,
+            kpi_number=d["kpi_number"],
+            range_type="weekly",
+            week_month=year_week_num,
+            field_name=d["field_name"],
+            field_details=d["field_details"],
+            field_value=value,
+            # Sin valor (ej. base faltante) no se registran watermarks: se reintenta
+            on_commit=None if value is None else partial(
+                record_watermarks, d["sc_name"], d["kpi_number"], last_sunday_str, watermarks[d["kpi_number"]]
+            ),
+        )
+
+    # Log
+    print("---------------------------------------------")
+    print(f"KPIs derivados – Last Sunday: {last_sunday_str} (week {year_week_num})")
+    for d in derived_list:
+        print(f"KPI {d['kpi_number']} – {d['field_name']}: {values[d['kpi_number']]}")
+    print("---------------------------------------------")
+
+    return values
@@ -0,0 +1,214 @@
+# core/duckdb_session.py
+
+"""
+Sesión DuckDB compartida por los KPIs de una corrida.
+
+En lugar de que cada KPI abra su propio duckdb.connect(":memory:") y
+copie un DataFrame, el scorecard usa UNA sesión en memoria:
+
+    with duckdb_session():                 # en el runner
+        run_kpis(kpis)
+
+    # en un KPI
+    table = register_worksheet(SHEET_NAME, WORKSHEET_NAME)
+    value = duckdb_fetchone(f"SELECT SUM(x) FROM {table} WHERE week = ?", [week])
+
+- Los extracts (pestañas de Sheets, queries al DWH) se registran como
+  tablas Arrow: DuckDB las lee sin copiarlas. Los queries al DWH se
+  extraen con COPY (core.common_db); los extracts grandes se cargan
+  como tabla DuckDB batch a batch (load_dwh_table).
+- Cada extract se registra una sola vez por corrida; los KPIs que usan
+  la misma pestaña reutilizan la tabla.
+- Límites configurables: DUCKDB_MEMORY_LIMIT y DUCKDB_THREADS.
+- La sesión se cierra al salir del bloque duckdb_session() (o al salir
+  del proceso si un KPI se corre suelto).
+
+Una conexión DuckDB no se puede usar desde varios threads a la vez, así
+que las llamadas se serializan con un lock; el paralelismo lo pone
+DuckDB dentro de cada query (DUCKDB_THREADS).
+"""
+
+import atexit
+import hashlib
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+from core.common_db import copy_query_to_arrow, copy_query_to_duckdb
+
+
+# Límites de la sesión
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "1GB")
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", "4"))
+
+_session = None
+_registered: dict[str, object] = {}
+_scopes = 0
+_lock = threading.RLock()
+
+# Un lock por extract: dos KPIs que piden la misma pestaña la bajan una
+# sola vez, sin bloquear las queries de los demás mientras tanto
+_load_locks: dict[str, threading.Lock] = {}
+
+
+# -------------------------------------------------------------------
+# 1) Ciclo de vida
+# -------------------------------------------------------------------
+
+def get_duckdb_session():
+    """Devuelve la conexión DuckDB de la corrida, creándola la primera vez."""
+    global _session
+    with _lock:
+        if _session is None:
+            import duckdb
+
+            _session = duckdb.connect(":memory:")
+            _session.execute(f"SET memory_limit = '{DUCKDB_MEMORY_LIMIT}'")
+            _session.execute(f"SET threads = {DUCKDB_THREADS}")
+        return _session
+
+
+def close_duckdb_session():
+    """Cierra la sesión y suelta las tablas registradas."""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+        _registered.clear()
+        _load_locks.clear()
+
+
+atexit.register(close_duckdb_session)
+
+
+@contextmanager
+def duckdb_session():
+    """
+    Alcance de la sesión para una corrida del scorecard. La conexión se
+    crea recién cuando un KPI la usa (si ningún KPI usa DuckDB, no se
+    importa) y se cierra al salir del bloque más externo.
+    """
+    global _scopes
+    with _lock:
+        _scopes += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _scopes -= 1
+            if _scopes == 0:
+                close_duckdb_session()
+
+
+# -------------------------------------------------------------------
+# 2) Registro de extracts (Arrow, sin copia)
+# -------------------------------------------------------------------
+
+def relation_name(*parts: str) -> str:
+    """Nombre de tabla válido y estable para un extract: ('sheet', 'CS Weekly') -> 'sheet_cs_weekly_1a2b3c4d'."""
+    raw = "|".join(parts)
+    slug = re.sub(r"[^a-z0-9]+", "_", raw.lower()).strip("_")[:40]
+    return f"{slug}_{hashlib.sha1(raw.encode()).hexdigest()[:8]}"
+
+
+def register_arrow(name: str, table, replace: bool = False) -> str:
+    """
+    Registra un pyarrow.Table (o cualquier objeto que DuckDB pueda
+    escanear) con ese nombre. DuckDB lo lee in-place, sin copiarlo.
+    """
+    with _lock:
+        if name in _registered and not replace:
+            return name
+        session = get_duckdb_session()
+        if name in _registered:
+            session.unregister(name)
+        session.register(name, table)
+        _registered[name] = table
+    return name
+
+
+def _load_once(name: str, load: Callable[[], None]) -> str:
+    """Corre load() una sola vez por nombre y corrida (aunque lo pidan varios threads)."""
+    with _lock:
+        if name in _registered:
+            return name
+        load_lock = _load_locks.setdefault(name, threading.Lock())
+
+    with load_lock:
+        with _lock:
+            if name in _registered:
+                return name
+        load()
+    return name
+
+
+def register_once(name: str, loader: Callable[[], object]) -> str:
+    """
+    Registra el resultado de loader() solo si name todavía no está en la
+    sesión. Los demás KPIs de la corrida reutilizan la misma tabla.
+    """
+    return _load_once(name, lambda: register_arrow(name, loader()))
+
+
+def register_worksheet(sheet_name: str, worksheet_name: str, name: str | None = None) -> str:
+    """
+    Registra una pestaña de Google Sheets (vía el cache de snapshots de
+    core.common_sheets) y devuelve el nombre de la tabla en la sesión.
+    """
+    from core.common_sheets import get_gspread_client, load_worksheet_table
+
+    return register_once(
+        name or relation_name("sheet", sheet_name, worksheet_name),
+        lambda: load_worksheet_table(get_gspread_client(), sheet_name, worksheet_name),
+    )
+
+
+def register_dwh_query(
+    name: str,
+    query: str,
+    params: tuple | dict | None = None,
+    columns: list[str] | None = None,
+) -> str:
+    """
+    Registra (una vez por corrida) el resultado de un query al DWH como
+    tabla Arrow, extraído con COPY (ver core.common_db.copy_query_to_arrow).
+    """
+    return register_once(name, lambda: copy_query_to_arrow(query, params, columns))
+
+
+def load_dwh_table(
+    name: str,
+    query: str,
+    params: tuple | dict | None = None,
+    columns: list[str] | None = None,
+) -> str:
+    """
+    Para extracts grandes (ej. staging de HubSpot): carga el resultado en
+    una tabla DuckDB batch a batch, sin armar el resultado completo en
+    memoria de Python. DuckDB respeta DUCKDB_MEMORY_LIMIT (y puede usar
+    disco). Una vez por corrida; devuelve el nombre de la tabla.
+    """
+    def load():
+        rows = copy_query_to_duckdb(get_duckdb_session(), name, query, params, columns)
+        print(f"[load_dwh_table] {name}: {rows} filas cargadas en DuckDB.")
+        with _lock:
+            _registered[name] = None  # tabla propia de DuckDB, no un objeto registrado
+
+    return _load_once(name, load)
+
+
+# -------------------------------------------------------------------
+# 3) Queries sobre la sesión
+# -------------------------------------------------------------------
+
+def duckdb_fetchall(query: str, params: list | None = None) -> list[tuple]:
+    with _lock:
+        return get_duckdb_session().execute(query, params or []).fetchall()
+
+
+def duckdb_fetchone(query: str, params: list | None = None):
+    with _lock:
+        return get_duckdb_session().execute(query, params or []).fetchone()
@@ -0,0 +1,146 @@
+# core/import_profile.py
+
+"""
+Reporte de tiempo de import (arranque en frío) de los runners.
+
+Cada corrida de cron paga el import de todo lo que el runner carga a
+nivel de módulo. Este script importa cada runner en un proceso nuevo
+con `python -X importtime`, y reporta:
+- el tiempo total de import del runner (ms)
+- los módulos que más tiempo suman
+- las dependencias pesadas (pandas, duckdb, gspread, ...) cargadas
+  al importar, que deberían cargarse recién al ejecutar el KPI que las usa
+
+Con un tope (--max-ms o KPI_IMPORT_BUDGET_MS) sale con código 1 si algún
+runner se pasa o carga una dependencia pesada, para usarlo en CI:
+
+    python -m core.import_profile                       # todos los runners
+    python -m core.import_profile core.kpi_cli --top 20
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+from core.kpi_registry import PROJECT_ROOT, discover_domains
+
+
+# Tope de import por runner (ms); 0 = sin tope
+KPI_IMPORT_BUDGET_MS = float(os.getenv("KPI_IMPORT_BUDGET_MS", "0"))
+
+# Dependencias que no deberían cargarse al importar un runner
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "duckdb", "gspread", "google.auth", "google.oauth2")
+
+# 'import time:       321 |      26343 |     psycopg2'
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def default_targets() -> list[str]:
+    """Runners y publishers de cada domain, más la CLI genérica."""
+    targets = ["core.kpi_cli"]
+    for domain in discover_domains():
+        package = f"{domain}_scorecard"
+        for name in (f"run_{domain}_scorecard", f"run_to_sheet_{domain}"):
+            if (PROJECT_ROOT / package / f"{name}.py").exists():
+                targets.append(f"{package}.{name}")
+    return targets
+
+
+def profile_import(module_name: str) -> dict:
+    """
+    Importa module_name en un proceso nuevo con -X importtime.
+
+    Devuelve {"module", "total_ms", "imports": [{"name", "self_ms",
+    "cumulative_ms", "depth"}], "heavy": [...]}, donde imports son los
+    módulos cargados por el runner. Lanza RuntimeError si el import falla.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module_name}:\n{proc.stderr.strip().splitlines()[-1]}")
+
+    imports = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append({
+                "name": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": len(indent) // 2,
+            })
+
+    # importtime lista los hijos antes del padre: lo que carga el runner
+    # son las líneas anidadas justo antes de su propia línea (nivel 0)
+    # (así se excluye lo que carga el intérprete al arrancar, ej. site)
+    end = next(
+        (n for n, i in enumerate(imports) if i["name"] == module_name and i["depth"] == 0), None
+    )
+    if end is None:
+        total, imports = 0.0, []
+    else:
+        start = end
+        while start > 0 and imports[start - 1]["depth"] > 0:
+            start -= 1
+        total, imports = imports[end]["cumulative_ms"], imports[start:end]
+
+    loaded = {i["name"] for i in imports}
+    heavy = [m for m in HEAVY_MODULES if m in loaded]
+
+    return {"module": module_name, "total_ms": total, "imports": imports, "heavy": heavy}
+
+
+def print_report(profile: dict, top: int = 10):
+    print("---------------------------------------------")
+    print(f"{profile['module']}: {profile['total_ms']:.1f} ms")
+    if profile["heavy"]:
+        print(f"  Dependencias pesadas cargadas: {', '.join(profile['heavy'])}")
+    ranked = sorted(profile["imports"], key=lambda i: -i["cumulative_ms"])
+    for i in ranked[:top]:
+        print(f"  {i['cumulative_ms']:8.1f} ms  (self {i['self_ms']:6.1f})  {i['name']}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Reporte de tiempo de import de los runners.")
+    parser.add_argument("modules", nargs="*", help="módulos a medir (por defecto todos los runners)")
+    parser.add_argument("--top", type=int, default=10, help="módulos más lentos a mostrar")
+    parser.add_argument("--max-ms", type=float, default=KPI_IMPORT_BUDGET_MS,
+                        help="tope de import por runner en ms (0 = sin tope)")
+    parser.add_argument("--allow-heavy", action="store_true",
+                        help="no fallar si se cargan dependencias pesadas al importar")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module_name in args.modules or default_targets():
+        try:
+            profile = profile_import(module_name)
+        except RuntimeError as e:
+            print(e)
+            failures.append(module_name)
+            continue
+
+        print_report(profile, top=args.top)
+        if args.max_ms and profile["total_ms"] > args.max_ms:
+            failures.append(f"{module_name}: {profile['total_ms']:.1f} ms > {args.max_ms:.0f} ms")
+        if profile["heavy"] and not args.allow_heavy:
+            failures.append(f"{module_name}: carga {', '.join(profile['heavy'])} al importar")
+
+    print("---------------------------------------------")
+    if failures:
+        print("FUERA DE PRESUPUESTO:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("OK: todos los runners dentro del presupuesto.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
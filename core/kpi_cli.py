@@ -0,0 +1,67 @@
+# core/kpi_cli.py
+
+"""
+CLI para correr KPIs de cualquier domain usando core.kpi_registry.
+
+Uso:
+    python -m core.kpi_cli --domain success          # todos los KPIs de Success
+    python -m core.kpi_cli --kpi 5,32                 # solo KPI 5 y 32 (todos los domains)
+    python -m core.kpi_cli --domain success --list    # ver KPIs registrados sin correrlos
+
+Solo se importan los módulos de los KPIs seleccionados.
+"""
+
+import argparse
+from datetime import datetime
+
+from core.common_db import buffered_scorecard_writes
+from core.duckdb_session import duckdb_session
+from core.kpi_registry import discover_domains, kpi_run_list, load_kpis
+from core.kpi_runner import run_kpis
+
+
+def print_kpi_list(entries: list[dict]):
+    for entry in entries:
+        depends = f" | depende de: {', '.join(entry['depends_on'])}" if entry["depends_on"] else ""
+        print(f"[{entry['domain']}] {entry['label']} (cost {entry['cost']}, "
+              f"{len(entry['sources'])} fuentes){depends}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Ejecuta KPIs registrados.")
+    parser.add_argument("--domain", help=f"domains separados por coma ({', '.join(discover_domains())})")
+    parser.add_argument("--kpi", help="KPIs a ejecutar, ej. 5,32 (por defecto todos)")
+    parser.add_argument("--workers", type=int, help="KPIs en paralelo (por defecto KPI_MAX_WORKERS)")
+    parser.add_argument("--list", action="store_true", help="solo listar los KPIs seleccionados")
+    args = parser.parse_args(argv)
+
+    try:
+        entries = load_kpis(
+            args.domain.split(",") if args.domain else None,
+            args.kpi.split(",") if args.kpi else None,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.list:
+        print_kpi_list(entries)
+        return 0
+
+    print("=====================================================")
+    print(f"   RUNNING {len(entries)} KPIs")
+    print("   Timestamp:", datetime.now().strftime("%Y-%m-%d %H:%M"))
+    print("=====================================================")
+
+    with buffered_scorecard_writes(), duckdb_session():
+        results = run_kpis(kpi_run_list(entries), max_workers=args.workers)
+
+    failed = [label for label, error in results.items() if error is not None]
+    print(f"\nOK: {len(results) - len(failed)}  |  ERROR: {len(failed)}")
+    for label in failed:
+        print(f"   - {label}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
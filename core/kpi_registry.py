@@ -0,0 +1,171 @@
+# core/kpi_registry.py
+
+"""
+Registro declarativo de KPIs.
+
+Cada KPI se registra solo con @declare_kpi (core.kpi_runner):
+
+    @declare_kpi("32", label="KPI 32 – Overall Churn 52 weeks",
+                 cost=10, sources=SOURCES)
+    def run_kpi_32(): ...
+
+El domain sale del paquete del módulo (success_scorecard -> "success").
+
+Descubrimiento sin importar
+---------------------------
+Los KPIs viven en paquetes <domain>_scorecard/ con un archivo por KPI
+cuyo nombre empieza con el número: 32_overall_churn_rate.py.
+discover_kpi_modules() arma el mapa (domain, número) -> módulo mirando
+solo los nombres de archivo, así que seleccionar `--kpi 5,32` importa
+únicamente esos dos módulos (y sus dependencias: pandas, gspread, ...
+de los demás KPIs no se cargan).
+
+cost es una pista relativa de duración: los KPIs más caros se lanzan
+primero cuando corren en paralelo.
+"""
+
+import importlib
+import re
+import threading
+from pathlib import Path
+
+
+# Raíz del repo (donde viven los paquetes <domain>_scorecard)
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+DOMAIN_PACKAGE_SUFFIX = "_scorecard"
+
+# '32_overall_churn_rate.py' -> '32'
+_KPI_MODULE_RE = re.compile(r"^(\d+)_\w+\.py$")
+
+_registry: dict[tuple[str, str], dict] = {}
+_registry_lock = threading.Lock()
+
+
+def normalize_kpi_number(kpi_number) -> str:
+    """
+    '05', 5, ' 5' -> '5'. Criterio único para comparar números de KPI
+    (registry, runner, publishers y publicación en streaming).
+    """
+    return str(kpi_number).strip().lstrip("0") or "0"
+
+
+def domain_from_module(module_name: str) -> str | None:
+    """'success_scorecard.32_overall_churn_rate' -> 'success'"""
+    package = module_name.split(".")[0]
+    if package.endswith(DOMAIN_PACKAGE_SUFFIX):
+        return package[: -len(DOMAIN_PACKAGE_SUFFIX)]
+    return None
+
+
+# -------------------------------------------------------------------
+# 1) Registro
+# -------------------------------------------------------------------
+
+def register_kpi(
+    kpi_function,
+    kpi_number: str,
+    domain: str | None = None,
+    label: str | None = None,
+    cost: int = 1,
+    sources: list[dict] | None = None,
+    depends_on: list[str] | None = None,
+) -> dict:
+    """
+    Registra un KPI (lo llama @declare_kpi). Devuelve la entrada del registro.
+    """
+    domain = domain or domain_from_module(kpi_function.__module__) or "default"
+    entry = {
+        "kpi_number": kpi_number,
+        "domain": domain,
+        "label": label or f"KPI {kpi_number} – {kpi_function.__name__}",
+        "cost": cost,
+        "sources": list(sources or []),
+        "depends_on": list(depends_on or []),
+        "function": kpi_function,
+        "module": kpi_function.__module__,
+    }
+    with _registry_lock:
+        _registry[(domain, normalize_kpi_number(kpi_number))] = entry
+    return entry
+
+
+def registered_kpis() -> list[dict]:
+    """Entradas registradas hasta ahora (solo de los módulos ya importados)."""
+    with _registry_lock:
+        return list(_registry.values())
+
+
+# -------------------------------------------------------------------
+# 2) Descubrimiento (sin importar)
+# -------------------------------------------------------------------
+
+def discover_domains() -> list[str]:
+    """Domains disponibles: paquetes <domain>_scorecard en la raíz del repo."""
+    return sorted(
+        path.name[: -len(DOMAIN_PACKAGE_SUFFIX)]
+        for path in PROJECT_ROOT.iterdir()
+        if path.is_dir() and path.name.endswith(DOMAIN_PACKAGE_SUFFIX)
+    )
+
+
+def discover_kpi_modules(domains: list[str] | None = None) -> dict[tuple[str, str], str]:
+    """
+    Devuelve {(domain, número_normalizado): nombre_de_módulo} leyendo
+    solo los nombres de archivo de los paquetes de cada domain.
+    """
+    modules = {}
+    for domain in domains or discover_domains():
+        package_dir = PROJECT_ROOT / f"{domain}{DOMAIN_PACKAGE_SUFFIX}"
+        if not package_dir.is_dir():
+            raise ValueError(f"Domain desconocido: {domain} (opciones: {', '.join(discover_domains())})")
+        for path in sorted(package_dir.iterdir()):
+            match = _KPI_MODULE_RE.match(path.name)
+            if match:
+                modules[(domain, normalize_kpi_number(match.group(1)))] = f"{package_dir.name}.{path.stem}"
+    return modules
+
+
+# -------------------------------------------------------------------
+# 3) Carga selectiva
+# -------------------------------------------------------------------
+
+def load_kpis(
+    domains: list[str] | None = None,
+    kpi_numbers: list[str] | None = None,
+) -> list[dict]:
+    """
+    Importa solo los módulos de los KPIs pedidos y devuelve sus entradas
+    del registro, de mayor a menor cost.
+
+    - domains: None = todos los domains
+    - kpi_numbers: None = todos los KPIs de esos domains
+    """
+    wanted = {normalize_kpi_number(k) for k in kpi_numbers} if kpi_numbers else None
+    modules = {
+        key: module
+        for key, module in discover_kpi_modules(domains).items()
+        if wanted is None or key[1] in wanted
+    }
+
+    if wanted:
+        missing = wanted - {kpi for _, kpi in modules}
+        if missing:
+            raise ValueError(f"KPIs no encontrados: {', '.join(sorted(missing))}")
+
+    entries = []
+    for key, module in modules.items():
+        importlib.import_module(module)
+        with _registry_lock:
+            entry = _registry.get(key)
+        if entry is None:
+            print(f"[load_kpis] {module} no registra el KPI {key[1]} (falta @declare_kpi).")
+            continue
+        entries.append(entry)
+
+    return sorted(entries, key=lambda e: -e["cost"])
+
+
+def kpi_run_list(entries: list[dict]) -> list[tuple[str, object]]:
+    """Entradas del registro -> [(label, kpi_function)] para run_kpis."""
+    return [(entry["label"], entry["function"]) for entry in entries]
@@ -0,0 +1,202 @@
+# core/kpi_runner.py
+
+"""
+Ejecución de una lista de KPIs para un scorecard.
+
+Cada KPI se ejecuta dentro de su propio try/except: si uno falla,
+se registra el error y el resto sigue corriendo.
+
+Con max_workers > 1 los KPIs corren en paralelo en un ThreadPool.
+Se usan threads (no procesos) porque casi todo el tiempo es espera
+de DWH / Google Sheets, y así los KPIs comparten el pool de conexiones
+y el buffer de escritura de core.common_db.
+
+Dependencias entre KPIs
+-----------------------
+Un KPI derivado declara de qué KPIs depende con @declare_kpi:
+
+    @declare_kpi("05", depends_on=["06"])
+    def run_kpi_5(): ...
+
+run_kpis arma un DAG con esas declaraciones: los KPIs independientes
+corren en paralelo y cada derivado arranca apenas sus KPIs base
+terminaron y sus valores están escritos (se hace flush del buffer).
+Si un KPI base falla, sus derivados no se ejecutan.
+Las dependencias que no están en la lista (ej. KPIs calculados por otro
+proceso) se asumen ya escritas.
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable
+
+from core.common_db import flush_scorecard_buffer
+from core.common_logging import flush_run_history, kpi_metrics
+from core.kpi_registry import normalize_kpi_number, register_kpi
+
+
+# Número de KPIs en paralelo por defecto (1 = secuencial)
+KPI_MAX_WORKERS = int(os.getenv("KPI_MAX_WORKERS", "1"))
+
+
+def declare_kpi(
+    kpi_number: str,
+    depends_on: list[str] | None = None,
+    label: str | None = None,
+    cost: int = 1,
+    sources: list[dict] | None = None,
+    domain: str | None = None,
+):
+    """
+    Decorador para la función run_kpi_XX() de un KPI.
+    Declara su número y los KPIs base de los que depende, y lo registra
+    en core.kpi_registry (label, cost, sources; el domain sale del paquete).
+    """
+    def decorator(kpi_function):
+        kpi_function.kpi_number = kpi_number
+        kpi_function.depends_on = list(depends_on or [])
+        entry = register_kpi(
+            kpi_function,
+            kpi_number,
+            domain=domain,
+            label=label,
+            cost=cost,
+            sources=sources,
+            depends_on=depends_on,
+        )
+        kpi_function.domain = entry["domain"]
+        return kpi_function
+    return decorator
+
+
+def build_kpi_dag(kpis: list[tuple[str, Callable[[], None]]]) -> dict[str, set[str]]:
+    """
+    Devuelve {label: {labels de los que depende}} para los KPIs de la lista.
+
+    Lanza ValueError si hay un ciclo.
+    """
+    label_by_number = {}
+    for label, kpi_function in kpis:
+        kpi_number = getattr(kpi_function, "kpi_number", None)
+        if kpi_number is not None:
+            label_by_number[normalize_kpi_number(kpi_number)] = label
+
+    dag = {}
+    for label, kpi_function in kpis:
+        upstream = set()
+        for dep in getattr(kpi_function, "depends_on", []):
+            dep_label = label_by_number.get(normalize_kpi_number(dep))
+            if dep_label is None:
+                print(f"[run_kpis] {label}: KPI {dep} no está en esta corrida, se asume ya escrito.")
+            else:
+                upstream.add(dep_label)
+        dag[label] = upstream
+
+    # Detección de ciclos (Kahn)
+    remaining = {label: set(deps) for label, deps in dag.items()}
+    while remaining:
+        free = [label for label, deps in remaining.items() if not deps]
+        if not free:
+            raise ValueError(f"Ciclo de dependencias entre KPIs: {sorted(remaining)}")
+        for label in free:
+            del remaining[label]
+        for deps in remaining.values():
+            deps.difference_update(free)
+
+    return dag
+
+
+def run_single_kpi(label: str, kpi_function: Callable[[], None]) -> Exception | None:
+    """
+    Ejecuta un KPI y devuelve None si terminó bien, o la excepción si falló.
+    Las métricas del KPI (tiempo, DWH, Sheets, cache) se miden con
+    core.common_logging.kpi_metrics.
+    """
+    print(f"\n>>> Ejecutando {label}...")
+    try:
+        with kpi_metrics(
+            label,
+            kpi_number=getattr(kpi_function, "kpi_number", None),
+            domain=getattr(kpi_function, "domain", None),
+        ):
+            kpi_function()
+        print(f"OK – {label} finalizado.")
+        return None
+    except Exception as e:
+        print(f"ERROR en {label}: {e}")
+        return e
+
+
+def run_kpis(
+    kpis: list[tuple[str, Callable[[], None]]],
+    max_workers: int | None = None,
+) -> dict[str, Exception | None]:
+    """
+    Ejecuta una lista de KPIs [(label, kpi_function), ...] respetando
+    las dependencias declaradas con @declare_kpi.
+
+    max_workers: KPIs simultáneos (por defecto KPI_MAX_WORKERS).
+
+    Devuelve {label: None | excepción} en el mismo orden de la lista.
+    """
+    workers = max_workers or KPI_MAX_WORKERS
+    functions = dict(kpis)
+    dag = build_kpi_dag(kpis)
+
+    dependents = {label: [] for label in dag}
+    for label, upstream in dag.items():
+        for dep_label in upstream:
+            dependents[dep_label].append(label)
+
+    waiting = {label: set(upstream) for label, upstream in dag.items()}
+    results = {}
+
+    def release(label: str) -> list[str]:
+        """Marca un KPI como terminado y devuelve los derivados listos."""
+        ready = []
+        for child in dependents[label]:
+            if child in results:
+                continue
+            if results[label] is not None:
+                results[child] = RuntimeError(f"no se ejecutó: falló su dependencia {label}")
+                print(f"ERROR en {child}: {results[child]}")
+                ready.extend(release(child))
+                continue
+            waiting[child].discard(label)
+            if not waiting[child]:
+                ready.append(child)
+        return ready
+
+    def start(labels: list[str]) -> list[str]:
+        # Los derivados deben ver los valores de sus KPIs base en la DB
+        if any(dag[label] for label in labels):
+            flush_scorecard_buffer()
+        return labels
+
+    ready = start([label for label, upstream in dag.items() if not upstream])
+
+    if workers <= 1 or len(kpis) <= 1:
+        while ready:
+            label = ready.pop(0)
+            results[label] = run_single_kpi(label, functions[label])
+            ready.extend(start(release(label)))
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kpi") as executor:
+            running = {}
+            while ready or running:
+                for label in ready:
+                    running[executor.submit(run_single_kpi, label, functions[label])] = label
+                ready = []
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                finished = []
+                for future in done:
+                    label = running.pop(future)
+                    results[label] = future.result()
+                    finished.extend(release(label))
+                ready = start(finished)
+
+    flush_scorecard_buffer()
+    flush_run_history()
+
+    return {label: results[label] for label, _ in kpis}
@@ -1,10 +1,57 @@
 # core/kpi_template.py
 
-from datetime import datetime
+from datetime import date, datetime
+from functools import partial
 from typing import Callable
 
-from core.common_dates import get_last_sunday, get_year_week
-from core.common_db import fetch_single_value, insert_scorecard_record
+from core.common_dates import get_last_sunday, get_sundays_between, get_year_week
+from core.common_db import (
+    fetch_all_rows,
+    fetch_single_value,
+    insert_scorecard_record,
+    insert_scorecard_records,
+)
+from core.local_replica import KPI_ENGINE, fetch_single_value_local, is_replicable
+from core.watermarks import check_sources, record_watermarks
+
+
+def split_query(built) -> tuple[str, tuple | dict | None]:
+    """
+    Un build_query puede devolver el SQL solo (str) o (sql, params).
+    Con params, los valores van como parámetros (%s / %(nombre)s) y el
+    query corre como prepared statement: Postgres reutiliza el plan en
+    todas las semanas en lugar de planificar un query nuevo cada vez.
+    """
+    if isinstance(built, tuple):
+        query, params = built
+        return query, params
+    return built, None
+
+
+def fetch_kpi_value(
+    query: str,
+    params: tuple | dict | None = None,
+    sources: list[dict] | None = None,
+    engine: str | None = None,
+    use_cache: bool | None = None,
+    explain: bool | None = None,
+):
+    """
+    Valor de un query de KPI según el motor (engine, por defecto KPI_ENGINE):
+    - "dwh": fetch_single_value en el DWH
+    - "local": el mismo query sobre la réplica local (core.local_replica).
+      Si alguna fuente no es replicable o el sync falla, se usa el DWH.
+
+    explain: captura del plan (ver fetch_single_value). Solo aplica a
+    los queries que van al DWH.
+    """
+    if (engine or KPI_ENGINE) == "local":
+        if sources and all(is_replicable(s) for s in sources):
+            value = fetch_single_value_local(query, params, sources)
+            if value is not None:
+                return value
+        print("[fetch_kpi_value] Réplica local no disponible para este query, se usa el DWH.")
+    return fetch_single_value(query, params, use_cache=use_cache, explain=explain)
 
 
 def run_kpi(
@@ -13,8 +60,13 @@ def run_kpi(
     range_type: str,
     field_name: str,
     field_details: str | None,
-    build_query_func: Callable[[str, str], str],
+    build_query_func: Callable[[str, str], str | tuple[str, tuple | dict]],
     table_name: str = "vl_analytics.scorecard_vl02",
+    use_cache: bool | None = None,
+    sources: list[dict] | None = None,
+    force: bool = False,
+    engine: str | None = None,
+    explain: bool | None = None,
 ):
     """
     Ejecuta un KPI usando:
@@ -25,7 +77,21 @@ def run_kpi(
     - una función que construye el query (build_query_func)
     - el nombre de la tabla de destino en DWH
 
-    build_query_func(last_sunday_str, year_week_str) -> str
+    build_query_func(last_sunday_str, year_week_str) -> str | (str, params)
+    (ver split_query: con params el query se ejecuta como prepared statement)
+
+    use_cache: None = según el cache global de queries (core.query_cache),
+    False = recalcular siempre en el DWH.
+
+    sources: fuentes del KPI (core.watermarks.table_source / sheet_source).
+    Si ninguna cambió desde el último cálculo de esta semana, el KPI se
+    salta. force=True recalcula igual.
+
+    engine: "dwh" o "local" (ver fetch_kpi_value); None = KPI_ENGINE.
+
+    explain: True = guardar el EXPLAIN (ANALYZE, BUFFERS) del query con la
+    corrida y avisar si el plan cambió (ver core.query_plans);
+    None = KPI_EXPLAIN.
     """
     # 1) Fechas de referencia
     last_sunday = get_last_sunday()
@@ -37,11 +103,26 @@ def run_kpi(
     timestamp_time = now.strftime("%Y-%m-%d %H:%M")
     year = last_sunday.year
 
+    # 1b) Saltar si las fuentes no cambiaron desde el último cálculo
+    skip, watermarks = check_sources(
+        sources or [], table_name, sc_name, kpi_number, last_sunday_str, force=force
+    )
+    if skip:
+        print(f"KPI {kpi_number} – {field_name}: fuentes sin cambios, se omite ({last_sunday_str}).")
+        return
+
     # 2) Construir query específico del KPI
-    query = build_query_func(last_sunday_str, year_week)
+    query, params = split_query(build_query_func(last_sunday_str, year_week))
 
     # 3) Ejecutar query y obtener valor
-    result_value = fetch_single_value(query)
+    result_value = fetch_kpi_value(
+        query, params, sources, engine=engine, use_cache=use_cache, explain=explain
+    )
+    if result_value is None:
+        # Query fallido: no se pisa el valor guardado ni se registran
+        # watermarks (la próxima corrida lo vuelve a intentar)
+        print(f"KPI {kpi_number} – {field_name}: el query falló, no se escribe ({last_sunday_str}).")
+        return
 
     # 4) Insertar en DWH (scorecard)
     insert_scorecard_record(
@@ -56,6 +137,8 @@ def run_kpi(
         field_name=field_name,
         field_details=field_details,
         field_value=result_value,
+        # Los watermarks se guardan recién cuando el valor quedó confirmado
+        on_commit=partial(record_watermarks, sc_name, kpi_number, last_sunday_str, watermarks),
     )
 
     # 5) Log sencillo en stdout (para revisar en cron)
@@ -70,3 +153,103 @@ def run_kpi(
     print(f"Field details: {field_details}")
     print(f"Field value: {result_value}")
     print("---------------------------------------------")
+
+
+def run_kpi_backfill(
+    sc_name: str,
+    kpi_number: str,
+    range_type: str,
+    field_name: str,
+    field_details: str | None,
+    build_backfill_query_func: Callable[[str, str], str | tuple[str, tuple | dict]],
+    start_date: date,
+    end_date: date,
+    table_name: str = "vl_analytics.scorecard_vl02",
+):
+    """
+    Recalcula un KPI para todos los domingos entre start_date y end_date
+    con UN solo query set-based y un solo INSERT masivo.
+
+    build_backfill_query_func(first_sunday_str, last_sunday_str) -> str | (str, params)
+    debe devolver un query con filas (last_sunday, valor), una por semana
+    (normalmente haciendo JOIN contra generate_series de domingos).
+
+    Solo se escriben las semanas que devuelve el query (con valor no
+    nulo); las que faltan se informan y conservan lo que ya había. Si el
+    query falla o no devuelve filas no se escribe nada.
+
+    Devuelve la lista de filas insertadas ([] si el insert falló).
+    """
+    # 1) Domingos a recalcular
+    sundays = get_sundays_between(start_date, end_date)
+    if not sundays:
+        print(f"[run_kpi_backfill] KPI {kpi_number}: no hay domingos entre {start_date} y {end_date}.")
+        return []
+
+    first_sunday_str = sundays[0].strftime("%Y-%m-%d")
+    last_sunday_str = sundays[-1].strftime("%Y-%m-%d")
+    timestamp_time = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    # 2) Un solo query para todas las semanas. fetch_all_rows devuelve []
+    #    también si el query falla: sin filas no se escribe nada (no se
+    #    pisa el histórico con ceros)
+    query, params = split_query(build_backfill_query_func(first_sunday_str, last_sunday_str))
+    rows = fetch_all_rows(query, params)
+    if not rows:
+        print(
+            f"[run_kpi_backfill] KPI {kpi_number}: el query no devolvió filas "
+            f"({first_sunday_str} → {last_sunday_str}), no se escribe nada."
+        )
+        return []
+
+    values_by_sunday = {
+        (row[0].strftime("%Y-%m-%d") if hasattr(row[0], "strftime") else str(row[0])): row[1]
+        for row in rows
+        if row[1] is not None
+    }
+
+    # 3) Armar registros solo para las semanas que volvieron del query
+    records = []
+    missing = []
+    for sunday in sundays:
+        sunday_str = sunday.strftime("%Y-%m-%d")
+        if sunday_str not in values_by_sunday:
+            missing.append(sunday_str)
+            continue
+        records.append(
+            (
+                sunday.year,
+                timestamp_time,
+                sc_name,
+                sunday_str,
+                kpi_number,
+                range_type,
+                get_year_week(sunday)[-2:],
+                field_name,
+                field_details,
+                values_by_sunday[sunday_str],
+            )
+        )
+
+    if missing:
+        print(
+            f"[run_kpi_backfill] KPI {kpi_number}: {len(missing)} semana(s) sin valor, "
+            f"no se escriben: {', '.join(missing)}"
+        )
+    if not records:
+        return []
+
+    # 4) Insert masivo en una sola transacción
+    if not insert_scorecard_records({table_name: records}):
+        print(f"[run_kpi_backfill] KPI {kpi_number}: el insert falló, no se escribió ninguna semana.")
+        return []
+
+    # 5) Log
+    print("---------------------------------------------")
+    print(f"Scorecard: {sc_name}")
+    print(f"KPI: {kpi_number} – {field_name} (backfill)")
+    print(f"Print date: {timestamp_time}")
+    print(f"Semanas: {len(records)} ({first_sunday_str} → {last_sunday_str})")
+    print("---------------------------------------------")
+
+    return records
@@ -0,0 +1,333 @@
+# core/local_replica.py
+
+"""
+Réplica local (DuckDB) de las tablas fuente de los KPIs.
+
+Los KPIs pesados (ej. el churn del KPI 32) escanean tablas de staging
+completas en el DWH compartido, compitiendo con las cargas de Airbyte y
+los usuarios de BI. Con la réplica:
+
+1) Sync incremental: cada tabla declarada en SOURCES con
+   table_source(..., updated_column=..., key_column=...) se copia a un
+   archivo DuckDB local (KPI_REPLICA_PATH), con el mismo nombre
+   schema.tabla. La primera vez se copia completa (COPY, ver
+   core.common_db); después solo las filas con updated_column >= la
+   última vista, que reemplazan a las anteriores por key_column.
+   Los borrados no se ven por updated_column. Para no contar filas en
+   el DWH en cada corrida, se usa el contador de borrados de Postgres
+   (pg_stat_user_tables.n_tup_del, una lectura de catálogo): si cambió
+   desde el último sync, se copia completa. Además se copia completa
+   cada KPI_REPLICA_FULL_SYNC_HOURS (red de seguridad: TRUNCATE, reset
+   de estadísticas, tablas sin estadísticas) o si falla el incremental
+   (ej. cambió el esquema).
+
+   Se replica la tabla entera: table_source(where=...) se ignora (el
+   filtro sigue aplicando al watermark y al query del KPI).
+
+2) Motor local: run_kpi(..., engine="local") (o KPI_ENGINE=local)
+   sincroniza las fuentes y evalúa el query del KPI sobre la réplica,
+   en lugar del DWH. Los resultados se siguen escribiendo en la tabla
+   de scorecard del DWH.
+
+   El SQL de los KPIs es dialecto Postgres; DuckDB acepta casi todo,
+   pero algunos tipos cambian de precisión (FLOAT es float8 en Postgres
+   y float4 en DuckDB). to_duckdb_dialect() traduce esos casts antes de
+   ejecutar; preferir DOUBLE PRECISION / NUMERIC en los KPIs, que
+   significan lo mismo en los dos. Para verificar que ambos motores dan
+   el mismo valor: python -m benchmarks.run_benchmarks --check-engines
+
+   Con KPI_ENGINE=local también el watermark de las fuentes replicables
+   (core.watermarks) se calcula sobre la réplica ya sincronizada, así
+   el DWH solo recibe el sync incremental.
+
+Sync manual (ej. en un cron antes de los runners):
+
+    python -m core.local_replica --domain success
+    python -m core.local_replica --kpi 32 --full
+"""
+
+import argparse
+import os
+import re
+import threading
+
+from core.common_db import copy_query_to_duckdb, fetch_single_value, to_numbered_placeholders
+
+
+# "dwh" = queries en el DWH (default), "local" = sobre la réplica
+KPI_ENGINE = os.getenv("KPI_ENGINE", "dwh")
+
+KPI_REPLICA_PATH = os.getenv(
+    "KPI_REPLICA_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "ev-kpi-factory", "replica.duckdb"),
+)
+
+# Cada cuántas horas se vuelve a copiar completa una tabla aunque no se
+# hayan detectado borrados
+KPI_REPLICA_FULL_SYNC_HOURS = float(os.getenv("KPI_REPLICA_FULL_SYNC_HOURS", "168"))
+
+SYNC_TABLE = "_replica_sync"
+
+# Casts de Postgres con otra precisión en DuckDB: (patrón, reemplazo)
+_DIALECT_CASTS = [
+    # FLOAT / FLOAT8 sin precisión = double en Postgres, float4 en DuckDB
+    (re.compile(r"(::\s*|\bAS\s+)FLOAT8?\b(?!\s*\()", re.IGNORECASE), r"\1DOUBLE"),
+]
+
+_replica = None
+_lock = threading.RLock()
+_synced_tables: set[str] = set()  # tablas ya sincronizadas en este proceso
+
+
+# -------------------------------------------------------------------
+# 1) Conexión a la réplica
+# -------------------------------------------------------------------
+
+def get_replica():
+    """Conexión al archivo DuckDB de la réplica (una por proceso)."""
+    global _replica
+    with _lock:
+        if _replica is None:
+            import duckdb
+
+            os.makedirs(os.path.dirname(KPI_REPLICA_PATH) or ".", exist_ok=True)
+            _replica = duckdb.connect(KPI_REPLICA_PATH)
+            _replica.execute("SET TimeZone = 'UTC'")
+            _replica.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {SYNC_TABLE} (
+                    source_table   VARCHAR PRIMARY KEY,
+                    high_watermark VARCHAR,
+                    row_count      BIGINT,
+                    synced_at      TIMESTAMP
+                )
+                """
+            )
+            # Columnas agregadas después (réplicas creadas con la versión anterior)
+            _replica.execute(f"ALTER TABLE {SYNC_TABLE} ADD COLUMN IF NOT EXISTS deleted_tuples BIGINT")
+            _replica.execute(f"ALTER TABLE {SYNC_TABLE} ADD COLUMN IF NOT EXISTS full_synced_at TIMESTAMP")
+        return _replica
+
+
+def close_replica():
+    global _replica
+    with _lock:
+        if _replica is not None:
+            _replica.close()
+            _replica = None
+        _synced_tables.clear()
+
+
+def is_replicable(source: dict) -> bool:
+    """Solo se replican tablas con columna de actualización y clave."""
+    return source["type"] == "table" and bool(source.get("updated_column")) and bool(source.get("key_column"))
+
+
+# -------------------------------------------------------------------
+# 2) Sync
+# -------------------------------------------------------------------
+
+def _sync_state(con, table: str):
+    """(high_watermark, row_count, deleted_tuples, horas desde el último sync completo) o None."""
+    return con.execute(
+        f"""
+        SELECT high_watermark, row_count, deleted_tuples,
+               date_diff('second', full_synced_at, now()::TIMESTAMP) / 3600.0
+        FROM {SYNC_TABLE}
+        WHERE source_table = ?
+        """,
+        [table],
+    ).fetchone()
+
+
+def _save_state(con, table: str, updated_column: str, deleted_tuples: int | None, full: bool):
+    high_watermark, row_count = con.execute(
+        f"SELECT MAX({updated_column})::VARCHAR, COUNT(*) FROM {table}"
+    ).fetchone()
+    previous = con.execute(
+        f"SELECT full_synced_at FROM {SYNC_TABLE} WHERE source_table = ?", [table]
+    ).fetchone()
+    full_synced_at = None if full or previous is None else previous[0]
+    con.execute(
+        f"""
+        INSERT OR REPLACE INTO {SYNC_TABLE}
+            (source_table, high_watermark, row_count, synced_at, deleted_tuples, full_synced_at)
+        VALUES (?, ?, ?, now()::TIMESTAMP, ?, COALESCE(?, now()::TIMESTAMP))
+        """,
+        [table, high_watermark, row_count, deleted_tuples, full_synced_at],
+    )
+    return row_count
+
+
+def _dwh_deleted_tuples(table: str) -> int | None:
+    """
+    Filas borradas en la tabla (y sus particiones) según las estadísticas
+    de Postgres. Es un contador acumulado: si cambia, hubo borrados.
+    None si no hay estadísticas (ej. no es una tabla, otro motor).
+    """
+    value = fetch_single_value(
+        """
+        SELECT SUM(n_tup_del)::BIGINT
+        FROM pg_stat_user_tables
+        WHERE relid = to_regclass(%(table)s)
+           OR relid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%(table)s))
+        """,
+        {"table": table},
+        use_cache=False,
+    )
+    return None if value is None else int(value)
+
+
+def _full_sync(con, source: dict, deleted_tuples: int | None) -> int:
+    table = source["table"]
+    if "." in table:
+        con.execute(f"CREATE SCHEMA IF NOT EXISTS {table.split('.')[0]}")
+    copy_query_to_duckdb(con, table, f"SELECT * FROM {table}")
+    return _save_state(con, table, source["updated_column"], deleted_tuples, full=True)
+
+
+def _incremental_sync(con, source: dict, high_watermark: str, deleted_tuples: int | None) -> int:
+    table, key, updated = source["table"], source["key_column"], source["updated_column"]
+    delta = "_replica_delta"
+    changed = copy_query_to_duckdb(
+        con, delta, f"SELECT * FROM {table} WHERE {updated} >= %s", (high_watermark,)
+    )
+    try:
+        if changed:
+            con.execute("BEGIN TRANSACTION")
+            con.execute(f"DELETE FROM {table} WHERE {key} IN (SELECT {key} FROM {delta})")
+            con.execute(f"INSERT INTO {table} SELECT * FROM {delta}")
+            con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.execute(f"DROP TABLE IF EXISTS {delta}")
+    return _save_state(con, table, updated, deleted_tuples, full=False)
+
+
+def _full_sync_reason(state, deleted_tuples: int | None) -> str | None:
+    """Motivo para copiar completa una tabla ya replicada (None = incremental)."""
+    high_watermark, _, stored_deleted, hours_since_full = state
+    if high_watermark is None:
+        return "sin high watermark"
+    if hours_since_full is None or hours_since_full >= KPI_REPLICA_FULL_SYNC_HOURS:
+        return f"último sync completo hace más de {KPI_REPLICA_FULL_SYNC_HOURS:g} h"
+    if deleted_tuples is not None and deleted_tuples != stored_deleted:
+        return f"borrados en el DWH (n_tup_del {stored_deleted} -> {deleted_tuples})"
+    return None
+
+
+def sync_source(source: dict, full: bool = False) -> bool:
+    """
+    Sincroniza una fuente con la réplica (incremental salvo full=True,
+    primera vez, borrados detectados o sync completo vencido). Devuelve
+    False si la fuente no se puede replicar o el sync falló.
+    """
+    if not is_replicable(source):
+        return False
+    table = source["table"]
+
+    with _lock:
+        if table in _synced_tables and not full:
+            return True
+        con = get_replica()
+        try:
+            # Antes de copiar: un borrado durante el sync se ve la próxima vez
+            deleted_tuples = _dwh_deleted_tuples(table)
+            state = _sync_state(con, table)
+            reason = "pedido" if full else "primera vez" if state is None else _full_sync_reason(state, deleted_tuples)
+            if reason:
+                rows, mode = _full_sync(con, source, deleted_tuples), f"completo ({reason})"
+            else:
+                try:
+                    rows = _incremental_sync(con, source, state[0], deleted_tuples)
+                    mode = "incremental"
+                except Exception as e:
+                    print(f"[sync_source] {table}: sync incremental falló ({e}), se copia completa.")
+                    rows, mode = _full_sync(con, source, deleted_tuples), "completo"
+        except Exception as e:
+            print(f"[sync_source] Error ({table}): {e}")
+            return False
+
+        _synced_tables.add(table)
+    print(f"[sync_source] {table}: sync {mode}, {rows} filas en la réplica.")
+    return True
+
+
+def replica_watermark(source: dict) -> str | None:
+    """
+    Watermark de una fuente (mismo formato que core.watermarks:
+    'COUNT|MAX(updated_column)') calculado sobre la réplica después de
+    sincronizarla. None si no se pudo sincronizar.
+    """
+    if not sync_source(source):
+        return None
+    where = f"WHERE {to_duckdb_dialect(source['where'])}" if source.get("where") else ""
+    try:
+        with _lock:
+            count, updated = get_replica().execute(
+                f"SELECT COUNT(*), MAX({source['updated_column']})::VARCHAR FROM {source['table']} {where}"
+            ).fetchone()
+    except Exception as e:
+        print(f"[replica_watermark] Error ({source['table']}): {e}")
+        return None
+    return f"{count}|{updated or ''}"
+
+
+def sync_sources(sources: list[dict], full: bool = False) -> bool:
+    """Sincroniza todas las fuentes de tabla. True si todas quedaron al día."""
+    tables = [s for s in sources if s["type"] == "table"]
+    return bool(tables) and all([sync_source(s, full=full) for s in tables])
+
+
+# -------------------------------------------------------------------
+# 3) Motor local
+# -------------------------------------------------------------------
+
+def to_duckdb_dialect(query: str) -> str:
+    """Traduce los casts de Postgres que en DuckDB tienen otra precisión."""
+    for pattern, replacement in _DIALECT_CASTS:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+def fetch_single_value_local(query: str, params: tuple | dict | None, sources: list[dict]):
+    """
+    Evalúa un query de KPI (mismo SQL y parámetros que en el DWH, ver
+    to_duckdb_dialect) sobre la réplica. Devuelve el primer valor (0 si
+    no hay filas) o None si las fuentes no se pudieron sincronizar o el
+    query falló.
+    """
+    if not sync_sources(sources):
+        return None
+
+    query = to_duckdb_dialect(query)
+    sql, args = to_numbered_placeholders(query, params) if params else (query, [])
+    try:
+        with _lock:
+            result = get_replica().execute(sql, args).fetchone()
+    except Exception as e:
+        print(f"[fetch_single_value_local] Error: {e}")
+        return None
+    return result[0] if result else 0
+
+
+if __name__ == "__main__":
+    from core.kpi_registry import load_kpis
+
+    parser = argparse.ArgumentParser(description="Sincroniza la réplica local de las fuentes de los KPIs.")
+    parser.add_argument("--domain", help="domains separados por coma (por defecto todos)")
+    parser.add_argument("--kpi", help="KPIs cuyas fuentes se sincronizan, ej. 32")
+    parser.add_argument("--full", action="store_true", help="copiar las tablas completas")
+    args = parser.parse_args()
+
+    entries = load_kpis(
+        args.domain.split(",") if args.domain else None,
+        args.kpi.split(",") if args.kpi else None,
+    )
+    sources = {s["table"]: s for e in entries for s in e["sources"] if is_replicable(s)}
+    if not sources:
+        print("Ningún KPI seleccionado declara fuentes replicables (updated_column + key_column).")
+    for source in sources.values():
+        sync_source(source, full=args.full)
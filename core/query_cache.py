@@ -0,0 +1,137 @@
+# core/query_cache.py
+
+"""
+Cache local (opt-in) de resultados de queries al DWH.
+
+Pensado para re-correr un scorecard después de un fallo parcial o al
+depurar un KPI: los queries caros (ej. el churn del KPI 32) se
+devuelven desde disco si ya se ejecutaron hace menos de TTL segundos.
+
+- Clave: texto del query normalizado (espacios colapsados) + parámetros.
+- Almacenamiento: SQLite local (KPI_QUERY_CACHE_PATH).
+- Expiración: KPI_QUERY_CACHE_TTL segundos.
+- Evicción LRU: como máximo KPI_QUERY_CACHE_MAX_ENTRIES entradas.
+
+Está desactivado por defecto. Se activa con KPI_QUERY_CACHE=1 o con
+enable_query_cache(), y se puede saltar por llamada con use_cache=False.
+"""
+
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+
+
+KPI_QUERY_CACHE_PATH = os.getenv(
+    "KPI_QUERY_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "ev-kpi-factory", "query_cache.sqlite"),
+)
+KPI_QUERY_CACHE_TTL = int(os.getenv("KPI_QUERY_CACHE_TTL", "3600"))
+KPI_QUERY_CACHE_MAX_ENTRIES = int(os.getenv("KPI_QUERY_CACHE_MAX_ENTRIES", "1000"))
+
+_enabled = os.getenv("KPI_QUERY_CACHE", "0") == "1"
+_lock = threading.Lock()
+
+# Valor centinela para distinguir "no está en cache" de un resultado None
+MISS = object()
+
+
+def enable_query_cache(enabled: bool = True):
+    """Activa (o desactiva) el cache para todo el proceso."""
+    global _enabled
+    _enabled = enabled
+
+
+def is_query_cache_enabled() -> bool:
+    return _enabled
+
+
+def normalize_query(query: str) -> str:
+    """Colapsa espacios y quita el ';' final para que el formato no cambie la clave."""
+    return re.sub(r"\s+", " ", query).strip().rstrip(";").strip()
+
+
+def make_cache_key(query: str, params: tuple | None = None, namespace: str = "") -> str:
+    """Clave del cache: namespace (ej. host/db) + query normalizado + parámetros."""
+    raw = f"{namespace}\x00{normalize_query(query)}\x00{params!r}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(KPI_QUERY_CACHE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(KPI_QUERY_CACHE_PATH, timeout=30)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS query_cache (
+            cache_key  TEXT PRIMARY KEY,
+            value      BLOB NOT NULL,
+            created_at REAL NOT NULL,
+            last_used  REAL NOT NULL
+        )
+        """
+    )
+    return conn
+
+
+def cache_get(key: str):
+    """Devuelve el valor guardado o MISS si no existe o ya expiró."""
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT value, created_at FROM query_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return MISS
+            if now - row[1] > KPI_QUERY_CACHE_TTL:
+                conn.execute("DELETE FROM query_cache WHERE cache_key = ?", (key,))
+                conn.commit()
+                return MISS
+            conn.execute("UPDATE query_cache SET last_used = ? WHERE cache_key = ?", (now, key))
+            conn.commit()
+            return pickle.loads(row[0])
+        finally:
+            conn.close()
+
+
+def cache_set(key: str, value):
+    """Guarda un valor y aplica la evicción LRU."""
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO query_cache (cache_key, value, created_at, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, pickle.dumps(value), now, now),
+            )
+            conn.execute("DELETE FROM query_cache WHERE created_at < ?", (now - KPI_QUERY_CACHE_TTL,))
+            conn.execute(
+                """
+                DELETE FROM query_cache
+                WHERE cache_key IN (
+                    SELECT cache_key FROM query_cache
+                    ORDER BY last_used DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (KPI_QUERY_CACHE_MAX_ENTRIES,),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def clear_query_cache():
+    """Borra todas las entradas del cache."""
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute("DELETE FROM query_cache")
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,316 @@
+# core/query_plans.py
+
+"""
+Captura de planes (EXPLAIN ANALYZE) de los queries de KPIs y detección
+de regresiones.
+
+Modo profiling (opt-in): con KPI_EXPLAIN=1, enable_query_profiling() o
+explain=True en fetch_single_value / run_kpi, después de ejecutar el
+query del KPI se corre
+
+    EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) <mismo query / EXECUTE del prepared statement>
+
+y el plan se guarda en KPI_PLAN_TABLE junto al run_id y el KPI de la
+corrida (core.common_logging). OJO: EXPLAIN ANALYZE vuelve a ejecutar el
+query, así que el KPI pasa dos veces por el DWH; es para diagnosticar,
+no para el cron de todos los días.
+
+Cada plan nuevo se compara con el último capturado para el mismo query
+(texto normalizado):
+- forma: árbol de nodos (tipo, tabla, índice), sin costos ni filas.
+  Si cambia, se reporta qué scans cambiaron, ej.
+  "stg_hubspot.agreements: Index Scan using agreements_start_idx -> Seq Scan"
+- buffers: bloques leídos (shared hit + read). Si crecen más de
+  KPI_PLAN_BUFFER_FACTOR veces (y superan KPI_PLAN_MIN_BUFFERS), se avisa.
+
+Las alertas se imprimen, se emiten como JSON ("query_plan_alert") y
+quedan en la fila del plan. Para revisar el historial:
+
+    python -m core.query_plans --kpi 32
+    python -m core.query_plans --alerts
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+from core import query_cache
+from core.common_logging import RUN_ID, current_kpi, log_json
+
+
+KPI_PLAN_TABLE = os.getenv("KPI_PLAN_TABLE", "vl_analytics.kpi_query_plans")
+
+# Alerta de buffers: crecimiento relativo y mínimo absoluto (bloques de 8 KB)
+KPI_PLAN_BUFFER_FACTOR = float(os.getenv("KPI_PLAN_BUFFER_FACTOR", "2.0"))
+KPI_PLAN_MIN_BUFFERS = int(os.getenv("KPI_PLAN_MIN_BUFFERS", "1000"))
+
+_enabled = os.getenv("KPI_EXPLAIN", "0") == "1"
+
+_table_ready = False
+_table_lock = threading.Lock()
+
+
+def enable_query_profiling(enabled: bool = True):
+    """Activa (o desactiva) la captura de planes para todo el proceso."""
+    global _enabled
+    _enabled = enabled
+
+
+def is_query_profiling_enabled() -> bool:
+    return _enabled
+
+
+def query_hash(query: str) -> str:
+    """Identificador estable del query (texto normalizado, sin parámetros)."""
+    return hashlib.sha1(query_cache.normalize_query(query).encode()).hexdigest()[:16]
+
+
+# -------------------------------------------------------------------
+# 1) Análisis del plan (FORMAT JSON)
+# -------------------------------------------------------------------
+
+def _root(explain_output) -> dict:
+    """EXPLAIN (FORMAT JSON) devuelve [{"Plan": {...}, "Execution Time": ...}]."""
+    if isinstance(explain_output, str):
+        explain_output = json.loads(explain_output)
+    return explain_output[0] if isinstance(explain_output, list) else explain_output
+
+
+def _node_label(node: dict) -> str:
+    label = node["Node Type"]
+    if node.get("Relation Name"):
+        relation = node["Relation Name"]
+        if node.get("Schema"):
+            relation = f"{node['Schema']}.{relation}"
+        label += f" on {relation}"
+    if node.get("Index Name"):
+        label += f" using {node['Index Name']}"
+    return label
+
+
+def _walk(node: dict, depth: int = 0):
+    yield depth, node
+    for child in node.get("Plans", []):
+        yield from _walk(child, depth + 1)
+
+
+def plan_nodes(explain_output) -> list[str]:
+    """Árbol del plan en preorden: ['Aggregate', '  Seq Scan on stg.agreements', ...]."""
+    return ["  " * depth + _node_label(node) for depth, node in _walk(_root(explain_output)["Plan"])]
+
+
+def plan_shape_hash(nodes: list[str]) -> str:
+    return hashlib.sha1("\n".join(nodes).encode()).hexdigest()[:16]
+
+
+def plan_scans(nodes: list[str]) -> dict[str, list[str]]:
+    """{tabla: [tipo de scan (+ índice)]} a partir de plan_nodes."""
+    scans = {}
+    for label in (n.strip() for n in nodes):
+        if " on " in label:
+            node_type, rest = label.split(" on ", 1)
+            relation, _, index = rest.partition(" using ")
+            scans.setdefault(relation, []).append(f"{node_type} using {index}" if index else node_type)
+    return scans
+
+
+def plan_stats(explain_output) -> dict:
+    """Tiempo de ejecución y bloques leídos del plan (totales del nodo raíz)."""
+    root = _root(explain_output)
+    plan = root["Plan"]
+    return {
+        "execution_ms": root.get("Execution Time"),
+        "shared_hit": plan.get("Shared Hit Blocks", 0),
+        "shared_read": plan.get("Shared Read Blocks", 0),
+        "temp_blocks": plan.get("Temp Read Blocks", 0) + plan.get("Temp Written Blocks", 0),
+    }
+
+
+def compare_plans(previous: dict | None, current: dict) -> list[str]:
+    """
+    Alertas de current contra previous (dicts con "nodes", "shape_hash",
+    "shared_hit", "shared_read").
+    """
+    if previous is None:
+        return []
+
+    alerts = []
+    if previous["shape_hash"] != current["shape_hash"]:
+        old_scans, new_scans = plan_scans(previous["nodes"]), plan_scans(current["nodes"])
+        changed = [
+            f"{relation}: {', '.join(old_scans.get(relation, ['-']))} -> {', '.join(new_scans.get(relation, ['-']))}"
+            for relation in sorted(set(old_scans) | set(new_scans))
+            if sorted(old_scans.get(relation, [])) != sorted(new_scans.get(relation, []))
+        ]
+        alerts.append("cambio de plan" + (f" ({'; '.join(changed)})" if changed else " (misma forma de scans, otro árbol)"))
+
+    old_buffers = previous["shared_hit"] + previous["shared_read"]
+    new_buffers = current["shared_hit"] + current["shared_read"]
+    if (
+        old_buffers > 0
+        and new_buffers >= KPI_PLAN_MIN_BUFFERS
+        and new_buffers > KPI_PLAN_BUFFER_FACTOR * old_buffers
+    ):
+        alerts.append(f"buffers x{new_buffers / old_buffers:.1f} ({old_buffers} -> {new_buffers} bloques)")
+
+    return alerts
+
+
+# -------------------------------------------------------------------
+# 2) Persistencia
+# -------------------------------------------------------------------
+
+def ensure_plan_table():
+    """Crea KPI_PLAN_TABLE si no existe (una vez por proceso)."""
+    from core.common_db import get_connection
+
+    global _table_ready
+    with _table_lock:
+        if _table_ready:
+            return
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {KPI_PLAN_TABLE} (
+                        run_id       TEXT NOT NULL,
+                        domain       TEXT,
+                        kpi_number   TEXT,
+                        label        TEXT,
+                        query_hash   TEXT NOT NULL,
+                        captured_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                        shape_hash   TEXT NOT NULL,
+                        execution_ms DOUBLE PRECISION,
+                        shared_hit   BIGINT NOT NULL,
+                        shared_read  BIGINT NOT NULL,
+                        temp_blocks  BIGINT NOT NULL,
+                        nodes        JSONB NOT NULL,
+                        plan         JSONB NOT NULL,
+                        alerts       TEXT[]
+                    )
+                    """
+                )
+                index = KPI_PLAN_TABLE.split(".")[-1] + "_query_idx"
+                cur.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index} ON {KPI_PLAN_TABLE} (query_hash, captured_at DESC)"
+                )
+            conn.commit()
+        _table_ready = True
+
+
+def _previous_plan(cur, qhash: str) -> dict | None:
+    cur.execute(
+        f"""
+        SELECT shape_hash, nodes, shared_hit, shared_read
+        FROM {KPI_PLAN_TABLE}
+        WHERE query_hash = %s
+        ORDER BY captured_at DESC
+        LIMIT 1
+        """,
+        (qhash,),
+    )
+    row = cur.fetchone()
+    if row is None:
+        return None
+    nodes = row[1] if isinstance(row[1], list) else json.loads(row[1])
+    return {"shape_hash": row[0], "nodes": nodes, "shared_hit": row[2], "shared_read": row[3]}
+
+
+def record_plan(query: str, explain_output) -> list[str]:
+    """
+    Guarda el plan de un query del KPI en curso y lo compara con el
+    último plan del mismo query. Devuelve las alertas (lista vacía si no
+    hay). Un error acá no hace fallar al KPI.
+    """
+    from core.common_db import get_connection
+
+    kpi = current_kpi() or {}
+    nodes = plan_nodes(explain_output)
+    current = {"shape_hash": plan_shape_hash(nodes), "nodes": nodes, **plan_stats(explain_output)}
+    qhash = query_hash(query)
+
+    try:
+        ensure_plan_table()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                alerts = compare_plans(_previous_plan(cur, qhash), current)
+                cur.execute(
+                    f"""
+                    INSERT INTO {KPI_PLAN_TABLE}
+                        (run_id, domain, kpi_number, label, query_hash, shape_hash, execution_ms,
+                         shared_hit, shared_read, temp_blocks, nodes, plan, alerts)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (
+                        RUN_ID, kpi.get("domain"), kpi.get("kpi_number"), kpi.get("label"), qhash,
+                        current["shape_hash"], current["execution_ms"], current["shared_hit"],
+                        current["shared_read"], current["temp_blocks"], json.dumps(nodes),
+                        json.dumps(explain_output, default=str), alerts or None,
+                    ),
+                )
+            conn.commit()
+    except Exception as e:
+        print(f"[record_plan] No se pudo guardar el plan: {e}")
+        return []
+
+    label = kpi.get("label") or f"query {qhash}"
+    print(
+        f"[query_plans] {label}: {current['execution_ms']} ms, "
+        f"buffers hit={current['shared_hit']} read={current['shared_read']}"
+    )
+    for alert in alerts:
+        print(f"[query_plans] ALERTA {label}: {alert}")
+        log_json(
+            "query_plan_alert",
+            run_id=RUN_ID,
+            domain=kpi.get("domain"),
+            kpi_number=kpi.get("kpi_number"),
+            query_hash=qhash,
+            alert=alert,
+        )
+    return alerts
+
+
+# -------------------------------------------------------------------
+# 3) Historial
+# -------------------------------------------------------------------
+
+def main(argv: list[str] | None = None) -> int:
+    from core.common_db import fetch_all_rows
+
+    parser = argparse.ArgumentParser(description="Planes capturados de los queries de KPIs.")
+    parser.add_argument("--kpi", help="número de KPI, ej. 32")
+    parser.add_argument("--alerts", action="store_true", help="solo capturas con alertas")
+    parser.add_argument("--limit", type=int, default=20, help="capturas a mostrar")
+    parser.add_argument("--nodes", action="store_true", help="mostrar el árbol de cada plan")
+    args = parser.parse_args(argv)
+
+    rows = fetch_all_rows(
+        f"""
+        SELECT captured_at, kpi_number, query_hash, shape_hash, execution_ms,
+               shared_hit, shared_read, alerts, nodes
+        FROM {KPI_PLAN_TABLE}
+        WHERE (%(kpi)s::TEXT IS NULL OR kpi_number = %(kpi)s::TEXT)
+          AND (NOT %(alerts)s OR alerts IS NOT NULL)
+        ORDER BY captured_at DESC
+        LIMIT %(limit)s
+        """,
+        {"kpi": args.kpi, "alerts": args.alerts, "limit": args.limit},
+    )
+    for captured_at, kpi_number, qhash, shape, execution_ms, hit, read, alerts, nodes in rows:
+        print(f"{captured_at:%Y-%m-%d %H:%M}  KPI {kpi_number or '-':<4} query {qhash}  plan {shape}  "
+              f"{execution_ms or 0:9.1f} ms  hit {hit:>9}  read {read:>9}")
+        for alert in alerts or []:
+            print(f"    ALERTA: {alert}")
+        if args.nodes:
+            for node in nodes:
+                print(f"    {node}")
+    if not rows:
+        print("No hay planes capturados (activar con KPI_EXPLAIN=1).")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
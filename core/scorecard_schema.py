@@ -0,0 +1,476 @@
+# core/scorecard_schema.py
+
+"""
+Esquema de las tablas de scorecard (vl_analytics.scorecard_<domain>).
+
+Clave natural
+-------------
+Cada tabla guarda UN valor por KPI por semana:
+
+    (sc_name, kpi_number, last_sunday)
+
+El índice único sobre la clave se crea con una migración explícita
+(se corre una vez por tabla): borra los duplicados que hayan dejado
+reruns anteriores (se queda con el de print_date más reciente) y crea
+el índice.
+
+    python -m core.scorecard_schema --natural-key vl_analytics.scorecard_vl02
+
+Las escrituras NO migran solas: si el índice falta, check_scorecard_schema()
+falla con un error que indica el comando (el upsert lo necesita).
+
+Índices y vista de último valor
+-------------------------------
+La migración del esquema (idempotente, se corre a mano o en el deploy)
+crea:
+- índices compuestos para los accesos habituales (publisher por semana,
+  week_month -> last_sunday, histórico de un KPI para derivados)
+- la vista <tabla>_latest con el valor por KPI por semana, que leen
+  run_to_sheet_* y core.derived_kpis. Con la clave única la tabla ya
+  tiene un solo valor por KPI por semana, así que es una vista común
+  sobre la tabla (sin copia ni refresh): los lectores ven cualquier
+  escritura, venga de un runner, un backfill o un KPI suelto. Si existe
+  la vista materializada de versiones anteriores, se reemplaza.
+
+    python -m core.scorecard_schema vl_analytics.scorecard_vl02
+
+En runtime no se corre DDL: core.common_db y los publishers llaman a
+check_scorecard_schema() la primera vez que usan cada tabla, que solo
+verifica en los catálogos que la clave natural y la vista existan
+(RuntimeError con el comando si faltan; un índice faltante se avisa).
+
+Particionado por año
+--------------------
+partition_scorecard_by_year() migra una tabla existente a una tabla
+particionada por RANGE (last_sunday), una partición por año más una
+DEFAULT. Es una migración explícita (se corre una vez):
+
+    python -m core.scorecard_schema --partition vl_analytics.scorecard_vl02
+
+Las particiones de años nuevos también las crea la migración del
+esquema (por defecto el año actual y el siguiente, o --years):
+
+    python -m core.scorecard_schema vl_analytics.scorecard_vl02 --years 2027
+
+Si se escribe una semana de un año sin partición, las filas van a la
+DEFAULT (se avisa); la migración las mueve al crear la partición.
+"""
+
+import argparse
+import threading
+from datetime import date
+
+from core.common_db import get_connection
+
+
+SCORECARD_KEY = ("sc_name", "kpi_number", "last_sunday")
+
+# Índices compuestos por patrón de acceso: (sufijo, columnas)
+SCORECARD_INDEXES = [
+    # run_to_sheet_*: todos los KPIs de una semana / de un rango de semanas
+    ("sc_week_idx", ("sc_name", "last_sunday")),
+    # run_to_sheet_*: week_month -> last_sunday
+    ("sc_week_month_idx", ("sc_name", "week_month", "last_sunday")),
+    # KPIs derivados y watermarks: histórico semanal de un KPI
+    ("sc_kpi_range_idx", ("sc_name", "kpi_number", "range_type", "last_sunday")),
+]
+
+LATEST_VIEW_SUFFIX = "_latest"
+
+_ready_tables = set()
+_partitioned_years = set()
+_ready_lock = threading.Lock()
+
+
+def _short_name(table_name: str) -> str:
+    """'vl_analytics.scorecard_vl02' -> 'scorecard_vl02'"""
+    return table_name.split(".")[-1].strip('"')
+
+
+def _schema_name(table_name: str) -> str:
+    """'vl_analytics.scorecard_vl02' -> 'vl_analytics' ('' si no tiene schema)"""
+    return table_name.rpartition(".")[0].strip('"')
+
+
+def _qualified(table_name: str, name: str) -> str:
+    """Nombre de un objeto en el mismo schema que la tabla."""
+    schema = _schema_name(table_name)
+    return f"{schema}.{name}" if schema else name
+
+
+def natural_key_index_name(table_name: str) -> str:
+    return f"{_short_name(table_name)}_natural_key_uidx"
+
+
+def latest_view_name(table_name: str) -> str:
+    """'vl_analytics.scorecard_vl02' -> 'vl_analytics.scorecard_vl02_latest'"""
+    return f"{table_name}{LATEST_VIEW_SUFFIX}"
+
+
+def _index_exists(cur, table_name: str, index_name: str) -> bool:
+    cur.execute(
+        """
+        SELECT 1 FROM pg_indexes
+        WHERE schemaname = COALESCE(NULLIF(%s, ''), current_schema())
+          AND indexname = %s
+        """,
+        (_schema_name(table_name), index_name),
+    )
+    return cur.fetchone() is not None
+
+
+def _relation_exists(cur, name: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+    return cur.fetchone()[0]
+
+
+def _is_partitioned(cur, table_name: str) -> bool:
+    cur.execute(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+        (table_name,),
+    )
+    return cur.fetchone() is not None
+
+
+# -------------------------------------------------------------------
+# 1) Clave natural
+# -------------------------------------------------------------------
+
+def deduplicate_scorecard(cur, table_name: str) -> int:
+    """
+    Borra filas repetidas por clave natural, dejando la más reciente
+    (print_date mayor; a igualdad, la última insertada). Un solo sort
+    por clave (ROW_NUMBER), no un self-join.
+    Devuelve la cantidad de filas borradas.
+
+    Las filas se identifican por (tableoid, ctid): en una tabla
+    particionada el ctid solo es único dentro de cada partición.
+    """
+    cur.execute(
+        f"""
+        DELETE FROM {table_name}
+        WHERE (tableoid, ctid) IN (
+            SELECT tableoid, ctid
+            FROM (
+                SELECT
+                    tableoid,
+                    ctid,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY {", ".join(SCORECARD_KEY)}
+                        ORDER BY COALESCE(print_date::TEXT, '') DESC, ctid DESC
+                    ) AS rn
+                FROM {table_name}
+            ) ranked
+            WHERE rn > 1
+        )
+        """
+    )
+    return cur.rowcount
+
+
+def _create_natural_key(cur, table_name: str):
+    if _index_exists(cur, table_name, natural_key_index_name(table_name)):
+        return
+    deleted = deduplicate_scorecard(cur, table_name)
+    if deleted:
+        print(f"[migrate_natural_key] {table_name}: {deleted} filas duplicadas eliminadas.")
+    cur.execute(
+        f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS {natural_key_index_name(table_name)}
+        ON {table_name} ({", ".join(SCORECARD_KEY)})
+        """
+    )
+
+
+def _check_natural_key(cur, table_name: str):
+    if not _index_exists(cur, table_name, natural_key_index_name(table_name)):
+        raise RuntimeError(
+            f"{table_name} no tiene el índice único {natural_key_index_name(table_name)} "
+            f"(necesario para el upsert). Correr una vez: "
+            f"python -m core.scorecard_schema --natural-key {table_name}"
+        )
+
+
+def migrate_natural_key(table_name: str):
+    """
+    Migración explícita: deduplica la tabla por clave natural y crea el
+    índice único. Borra filas (irreversible): correr a mano, una vez.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            if _index_exists(cur, table_name, natural_key_index_name(table_name)):
+                print(f"{table_name} ya tiene la clave natural.")
+                return
+            _create_natural_key(cur, table_name)
+        conn.commit()
+    print(f"{table_name}: índice único {natural_key_index_name(table_name)} creado.")
+
+
+# -------------------------------------------------------------------
+# 2) Índices y vista <tabla>_latest
+# -------------------------------------------------------------------
+
+def _index_name(table_name: str, suffix: str) -> str:
+    return f"{_short_name(table_name)}_{suffix}"
+
+
+def _ensure_indexes(cur, table_name: str):
+    for suffix, columns in SCORECARD_INDEXES:
+        cur.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS {_index_name(table_name, suffix)}
+            ON {table_name} ({", ".join(columns)})
+            """
+        )
+
+
+def _drop_materialized_latest_view(cur, table_name: str):
+    """Borra la vista materializada <tabla>_latest de versiones anteriores, si existe."""
+    cur.execute(
+        """
+        SELECT 1 FROM pg_matviews
+        WHERE schemaname = COALESCE(NULLIF(%s, ''), current_schema())
+          AND matviewname = %s
+        """,
+        (_schema_name(table_name), _short_name(latest_view_name(table_name))),
+    )
+    if cur.fetchone() is not None:
+        cur.execute(f"DROP MATERIALIZED VIEW {latest_view_name(table_name)}")
+
+
+def _ensure_latest_view(cur, table_name: str):
+    # La clave natural es única: la vista no necesita DISTINCT ON, y los
+    # filtros de los lectores usan los índices de la tabla
+    _drop_materialized_latest_view(cur, table_name)
+    cur.execute(f"CREATE OR REPLACE VIEW {latest_view_name(table_name)} AS SELECT * FROM {table_name}")
+
+
+def _latest_view_exists(cur, table_name: str) -> bool:
+    # Solo cuenta la vista común: la materializada de versiones anteriores
+    # queda desactualizada y hay que reemplazarla con la migración
+    cur.execute(
+        """
+        SELECT 1 FROM pg_views
+        WHERE schemaname = COALESCE(NULLIF(%s, ''), current_schema())
+          AND viewname = %s
+        """,
+        (_schema_name(table_name), _short_name(latest_view_name(table_name))),
+    )
+    return cur.fetchone() is not None
+
+
+def check_scorecard_schema(table_name: str):
+    """
+    Verifica (una vez por tabla por proceso, sin DDL) que la tabla de
+    scorecard esté migrada: clave natural única y vista <tabla>_latest
+    (RuntimeError con el comando si faltan). Los índices de acceso que
+    falten solo se avisan: sin ellos los queries corren igual, más lentos.
+    """
+    with _ready_lock:
+        if table_name in _ready_tables:
+            return
+
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                _check_natural_key(cur, table_name)
+                if not _latest_view_exists(cur, table_name):
+                    raise RuntimeError(
+                        f"{table_name} no tiene la vista {latest_view_name(table_name)}. "
+                        f"Correr: python -m core.scorecard_schema {table_name}"
+                    )
+                missing = [
+                    _index_name(table_name, suffix)
+                    for suffix, _ in SCORECARD_INDEXES
+                    if not _index_exists(cur, table_name, _index_name(table_name, suffix))
+                ]
+            conn.rollback()
+
+        if missing:
+            print(
+                f"[check_scorecard_schema] {table_name}: faltan índices {', '.join(missing)}. "
+                f"Correr: python -m core.scorecard_schema {table_name}"
+            )
+        _ready_tables.add(table_name)
+
+
+# Compatibilidad: nombres anteriores (ahora solo verifican)
+ensure_scorecard_schema = check_scorecard_schema
+ensure_natural_key = check_scorecard_schema
+
+
+# -------------------------------------------------------------------
+# 3) Particionado por año
+# -------------------------------------------------------------------
+
+def _partition_name(table_name: str, year: int) -> str:
+    return _qualified(table_name, f"{_short_name(table_name)}_y{year}")
+
+
+def _default_partition_name(table_name: str) -> str:
+    return _qualified(table_name, f"{_short_name(table_name)}_default")
+
+
+def _create_year_partition(cur, table_name: str, year: int):
+    partition = _partition_name(table_name, year)
+    if _relation_exists(cur, partition):
+        return
+
+    # Filas del año que cayeron en la DEFAULT (se escribieron antes de
+    # crear la partición): Postgres no deja crearla con esas filas ahí,
+    # así que se sacan y se vuelven a insertar después
+    bounds = f"last_sunday >= '{year}-01-01' AND last_sunday < '{year + 1}-01-01'"
+    default = _default_partition_name(table_name)
+    moved = 0
+    if _relation_exists(cur, default):
+        cur.execute(f"CREATE TEMP TABLE scorecard_moved AS SELECT * FROM {default} WHERE {bounds}")
+        cur.execute(f"DELETE FROM {default} WHERE {bounds}")
+        moved = cur.rowcount
+
+    cur.execute(
+        f"""
+        CREATE TABLE {partition}
+        PARTITION OF {table_name}
+        FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')
+        """
+    )
+
+    if _relation_exists(cur, default):
+        if moved:
+            cur.execute(f"INSERT INTO {table_name} SELECT * FROM scorecard_moved")
+            print(f"[migrate_scorecard_schema] {partition}: {moved} filas movidas desde {default}.")
+        cur.execute("DROP TABLE scorecard_moved")
+
+
+def check_year_partitions(table_name: str, years: set[int]):
+    """
+    Verifica (una vez por tabla y año por proceso, sin DDL) que los años
+    indicados tengan partición si la tabla está particionada. Si falta,
+    se avisa: las filas van a la partición DEFAULT hasta que la
+    migración cree la del año.
+    """
+    pending = {y for y in years if (table_name, y) not in _partitioned_years}
+    if not pending:
+        return
+
+    with _ready_lock:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                missing = []
+                if _is_partitioned(cur, table_name):
+                    missing = [y for y in sorted(pending) if not _relation_exists(cur, _partition_name(table_name, y))]
+            conn.rollback()
+        _partitioned_years.update((table_name, y) for y in pending)
+
+    if missing:
+        years_arg = " ".join(str(y) for y in missing)
+        print(
+            f"[check_year_partitions] {table_name}: sin partición para {years_arg}, las filas van a "
+            f"la DEFAULT. Correr: python -m core.scorecard_schema {table_name} --years {years_arg}"
+        )
+
+
+def partition_scorecard_by_year(table_name: str):
+    """
+    Migra una tabla de scorecard a una tabla particionada por año
+    (RANGE sobre last_sunday). La tabla original queda renombrada como
+    <tabla>_legacy para poder verificar y borrarla a mano.
+    """
+    legacy_name = f"{_short_name(table_name)}_legacy"
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            if _is_partitioned(cur, table_name):
+                print(f"{table_name} ya está particionada.")
+                return
+
+            # La vista depende de la tabla original: se recrea al final
+            _drop_materialized_latest_view(cur, table_name)
+            cur.execute(f"DROP VIEW IF EXISTS {latest_view_name(table_name)}")
+            cur.execute(f"ALTER TABLE {table_name} RENAME TO {legacy_name}")
+            for suffix in ["natural_key_uidx"] + [s for s, _ in SCORECARD_INDEXES]:
+                old_index = _qualified(table_name, _index_name(table_name, suffix))
+                cur.execute(f"ALTER INDEX IF EXISTS {old_index} RENAME TO {legacy_name}_{suffix}")
+
+            legacy = _qualified(table_name, legacy_name)
+            cur.execute(
+                f"""
+                CREATE TABLE {table_name}
+                (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+                PARTITION BY RANGE (last_sunday)
+                """
+            )
+
+            cur.execute(
+                f"""
+                SELECT DISTINCT EXTRACT(YEAR FROM last_sunday)::INT
+                FROM {legacy}
+                WHERE last_sunday IS NOT NULL
+                """
+            )
+            years = sorted(row[0] for row in cur.fetchall())
+            for year in years:
+                _create_year_partition(cur, table_name, year)
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {_default_partition_name(table_name)} PARTITION OF {table_name} DEFAULT")
+
+            # Deduplicar antes de copiar: la tabla nueva recibe una fila por
+            # clave y el índice único se crea sin borrar nada sobre particiones
+            deleted = deduplicate_scorecard(cur, legacy)
+            if deleted:
+                print(f"[partition_scorecard_by_year] {legacy}: {deleted} filas duplicadas eliminadas.")
+            cur.execute(f"INSERT INTO {table_name} SELECT * FROM {legacy}")
+
+            _create_natural_key(cur, table_name)
+            _ensure_indexes(cur, table_name)
+            _ensure_latest_view(cur, table_name)
+        conn.commit()
+
+    print(f"{table_name} particionada por año ({len(years)} particiones). Original: {legacy_name}.")
+
+
+# -------------------------------------------------------------------
+# 4) Migración del esquema
+# -------------------------------------------------------------------
+
+def migrate_scorecard_schema(table_name: str, years: list[int] | None = None):
+    """
+    Migración explícita e idempotente (DDL): índices de acceso, vista
+    <tabla>_latest y, si la tabla está particionada, las particiones de
+    `years` (por defecto el año actual y el siguiente). Requiere la
+    clave natural (ver migrate_natural_key).
+    """
+    if years is None:
+        this_year = date.today().year
+        years = [this_year, this_year + 1]
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            _check_natural_key(cur, table_name)
+            _ensure_indexes(cur, table_name)
+            _ensure_latest_view(cur, table_name)
+            if _is_partitioned(cur, table_name):
+                for year in sorted(set(years)):
+                    _create_year_partition(cur, table_name, year)
+        conn.commit()
+
+    print(f"{table_name}: índices y vista {latest_view_name(table_name)} listos.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migración del esquema de tablas de scorecard.")
+    parser.add_argument("table", help="tabla de scorecard, ej. vl_analytics.scorecard_vl02")
+    parser.add_argument(
+        "--natural-key", action="store_true",
+        help="deduplicar y crear el índice único (sc_name, kpi_number, last_sunday)",
+    )
+    parser.add_argument("--partition", action="store_true", help="migrar a tabla particionada por año")
+    parser.add_argument(
+        "--years", type=int, nargs="+",
+        help="años con partición a crear (tabla particionada; por defecto el actual y el siguiente)",
+    )
+    args = parser.parse_args()
+
+    if args.natural_key:
+        migrate_natural_key(args.table)
+    if args.partition:
+        partition_scorecard_by_year(args.table)
+    migrate_scorecard_schema(args.table, args.years)
@@ -0,0 +1,126 @@
+# core/streaming_publish.py
+
+"""
+Publicación en streaming: runner -> Google Sheets sin pasar por el DWH.
+
+Flujo clásico (dos pasos de cron):
+    run_success_scorecard  ->  DWH  ->  run_to_sheet_success (relee el DWH)
+
+Modo integrado:
+
+    with streaming_publish(publish_week, sc_name="Success"):
+        run_kpis(kpis)
+
+- Cada valor que un KPI escribe (insert_scorecard_record) llega a la
+  etapa de publicación cuando queda confirmado en el DWH, vía
+  core.common_db.scorecard_listener: en Sheets nunca aparece un valor
+  cuyo write falló.
+- Cada SHEETS_PUBLISH_INTERVAL_S segundos un thread publica los valores
+  confirmados desde el ciclo anterior, un batch por semana, mientras
+  los KPIs lentos siguen corriendo. Si en el intervalo un KPI escribe
+  dos veces, se publica solo el último valor.
+- Con el buffer de escritura activo, los valores se confirman en los
+  flush normales (cada SCORECARD_FLUSH_SIZE registros, antes de cada
+  derivado y al final de run_kpis): la publicación no fuerza commits y
+  la corrida sigue escribiendo en pocas transacciones grandes.
+  Con SHEETS_PUBLISH_FLUSH=1 (o flush=True) cada ciclo además hace
+  flush del buffer: los valores llegan antes a Sheets, a cambio de una
+  transacción por ciclo.
+- Al salir del bloque se publica lo que quede pendiente.
+
+publish_week(last_sunday_str, {kpi_number_normalizado: valor}) es la
+escritura propia de cada domain (ej. open_week_publisher() en
+success_scorecard/run_to_sheet_success.py). Si una escritura falla, sus
+valores se reintentan en el próximo ciclo; si sigue fallando al final,
+el publisher clásico (run_to_sheet_*) los recupera desde el DWH.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+from core.common_db import SCORECARD_COLUMNS, flush_scorecard_buffer, scorecard_listener
+from core.kpi_registry import normalize_kpi_number
+
+
+# Segundos entre escrituras a Sheets durante la corrida
+SHEETS_PUBLISH_INTERVAL_S = float(os.getenv("SHEETS_PUBLISH_INTERVAL_S", "15"))
+
+# Flush del buffer de escritura en cada ciclo (opt-in: parte la transacción de la corrida)
+SHEETS_PUBLISH_FLUSH = os.getenv("SHEETS_PUBLISH_FLUSH", "0") == "1"
+
+_COL = {name: i for i, name in enumerate(SCORECARD_COLUMNS)}
+
+
+@contextmanager
+def streaming_publish(
+    publish_week: Callable[[str, dict], None],
+    sc_name: str,
+    interval: float | None = None,
+    flush: bool | None = None,
+):
+    """
+    Publica en streaming los registros de sc_name que se calculen dentro
+    del bloque. Devuelve (yield) un dict de estadísticas que se completa
+    al salir: {"values", "writes", "errors"}.
+
+    flush: hacer flush del buffer de escritura en cada ciclo (por
+    defecto SHEETS_PUBLISH_FLUSH).
+    """
+    interval = SHEETS_PUBLISH_INTERVAL_S if interval is None else interval
+    flush = SHEETS_PUBLISH_FLUSH if flush is None else flush
+    pending: dict[str, dict[str, object]] = {}
+    lock = threading.Lock()
+    publish_lock = threading.Lock()  # las escrituras no se solapan
+    stop = threading.Event()
+    stats = {"values": 0, "writes": 0, "errors": 0}
+
+    def on_record(table_name: str, row: tuple):
+        if row[_COL["sc_name"]] != sc_name:
+            return
+        last_sunday = row[_COL["last_sunday"]]
+        last_sunday = last_sunday.strftime("%Y-%m-%d") if hasattr(last_sunday, "strftime") else str(last_sunday)
+        with lock:
+            pending.setdefault(last_sunday, {})[normalize_kpi_number(row[_COL["kpi_number"]])] = row[_COL["field_value"]]
+            stats["values"] += 1
+
+    def publish_pending(force_flush: bool = False):
+        nonlocal pending
+        if force_flush:
+            # Los registros en el buffer se confirman acá y llegan a on_record
+            flush_scorecard_buffer()
+        with publish_lock:
+            with lock:
+                batch, pending = pending, {}
+            for last_sunday, kpi_values in sorted(batch.items()):
+                try:
+                    publish_week(last_sunday, kpi_values)
+                    stats["writes"] += 1
+                except Exception as e:
+                    stats["errors"] += 1
+                    print(f"[streaming_publish] Error publicando {last_sunday}: {e}")
+                    with lock:
+                        # Reintentar en el próximo ciclo, sin pisar valores más nuevos
+                        week = pending.setdefault(last_sunday, {})
+                        for kpi, value in kpi_values.items():
+                            week.setdefault(kpi, value)
+
+    def loop():
+        while not stop.wait(interval):
+            publish_pending(force_flush=flush)
+
+    worker = threading.Thread(target=loop, name="streaming-publish", daemon=True)
+    with scorecard_listener(on_record):
+        worker.start()
+        try:
+            yield stats
+        finally:
+            stop.set()
+            worker.join()
+            publish_pending()
+
+    if pending:
+        print(f"[streaming_publish] Quedaron semanas sin publicar: {', '.join(sorted(pending))} "
+              "(se publicarán con el publisher desde el DWH).")
+    print(f"[streaming_publish] {stats['values']} valores, {stats['writes']} escrituras, {stats['errors']} errores.")
@@ -0,0 +1,229 @@
+# core/watermarks.py
+
+"""
+Watermarks de fuentes: recalcular un KPI solo si sus datos cambiaron.
+
+Cada KPI puede declarar sus fuentes:
+
+    SOURCES = [
+        table_source("stg_hubspot.agreements", updated_column="updated_at"),
+        sheet_source("CS_WEEKLY_SHEET_NAME"),
+    ]
+
+Por cada fuente se calcula un watermark barato:
+- tabla: COUNT(*) + MAX(updated_column). Con KPI_ENGINE=local, las
+  tablas replicables se miden sobre la réplica sincronizada (ver
+  core.local_replica), sin escanear la tabla en el DWH.
+- sheet: modifiedTime del archivo en Drive
+
+Al terminar un KPI se guardan los watermarks en WATERMARK_TABLE, junto a
+(sc_name, kpi_number, last_sunday) del valor escrito. En la siguiente
+corrida de esa misma semana, si todas las fuentes tienen el mismo
+watermark y el valor sigue en la tabla de scorecard, el KPI se salta.
+
+KPI_FORCE_RECOMPUTE=1 (o force=True) ignora los watermarks.
+"""
+
+import os
+import threading
+
+from core.common_db import fetch_single_value, get_connection
+
+
+WATERMARK_TABLE = os.getenv("KPI_WATERMARK_TABLE", "vl_analytics.scorecard_watermarks")
+
+KPI_FORCE_RECOMPUTE = os.getenv("KPI_FORCE_RECOMPUTE", "0") == "1"
+
+_table_ready = False
+_table_lock = threading.Lock()
+
+
+# -------------------------------------------------------------------
+# 1) Declaración de fuentes
+# -------------------------------------------------------------------
+
+def table_source(
+    table: str,
+    updated_column: str | None = None,
+    where: str | None = None,
+    key_column: str | None = None,
+) -> dict:
+    """
+    Fuente = tabla del DWH.
+    - updated_column: columna de última actualización (ej. _airbyte_extracted_at)
+    - where: filtro opcional para mirar solo las filas relevantes
+    - key_column: clave única de la tabla; permite replicarla en forma
+      incremental (ver core.local_replica)
+    """
+    return {
+        "type": "table",
+        "table": table,
+        "updated_column": updated_column,
+        "where": where,
+        "key_column": key_column,
+    }
+
+
+def sheet_source(sheet_name: str) -> dict:
+    """Fuente = Google Sheet (se usa su modifiedTime de Drive)."""
+    return {"type": "sheet", "sheet_name": sheet_name}
+
+
+def source_key(source: dict) -> str:
+    if source["type"] == "sheet":
+        return f"sheet:{source['sheet_name']}"
+    key = f"table:{source['table']}"
+    if source.get("where"):
+        key += f"[{source['where']}]"
+    return key
+
+
+# -------------------------------------------------------------------
+# 2) Cálculo de watermarks
+# -------------------------------------------------------------------
+
+def compute_watermark(source: dict) -> str | None:
+    """Devuelve el watermark actual de una fuente, o None si no se pudo calcular."""
+    try:
+        if source["type"] == "sheet":
+            from core.common_sheets import get_gspread_client, get_sheet_modified_time
+
+            sh = get_gspread_client().open(source["sheet_name"])
+            return get_sheet_modified_time(sh)
+
+        from core.local_replica import KPI_ENGINE, is_replicable, replica_watermark
+
+        if KPI_ENGINE == "local" and is_replicable(source):
+            return replica_watermark(source)
+
+        updated = f"MAX({source['updated_column']})::TEXT" if source.get("updated_column") else "''"
+        where = f"WHERE {source['where']}" if source.get("where") else ""
+        value = fetch_single_value(
+            f"SELECT COUNT(*)::TEXT || '|' || COALESCE({updated}, '') FROM {source['table']} {where}",
+            use_cache=False,
+        )
+        return None if value is None else str(value)
+    except Exception as e:
+        print(f"[compute_watermark] Error ({source_key(source)}): {e}")
+        return None
+
+
+# -------------------------------------------------------------------
+# 3) Persistencia
+# -------------------------------------------------------------------
+
+def ensure_watermark_table():
+    """Crea WATERMARK_TABLE si no existe (una vez por proceso)."""
+    global _table_ready
+    with _table_lock:
+        if _table_ready:
+            return
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+                        sc_name     TEXT NOT NULL,
+                        kpi_number  TEXT NOT NULL,
+                        last_sunday DATE NOT NULL,
+                        source_key  TEXT NOT NULL,
+                        watermark   TEXT NOT NULL,
+                        recorded_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                        PRIMARY KEY (sc_name, kpi_number, last_sunday, source_key)
+                    )
+                    """
+                )
+            conn.commit()
+        _table_ready = True
+
+
+def get_stored_watermarks(sc_name: str, kpi_number: str, last_sunday_str: str) -> dict[str, str]:
+    """Watermarks guardados en la última corrida exitosa de esa semana."""
+    ensure_watermark_table()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT source_key, watermark
+                FROM {WATERMARK_TABLE}
+                WHERE sc_name = %s AND kpi_number = %s AND last_sunday = %s
+                """,
+                (sc_name, kpi_number, last_sunday_str),
+            )
+            return dict(cur.fetchall())
+
+
+def record_watermarks(sc_name: str, kpi_number: str, last_sunday_str: str, watermarks: dict[str, str]):
+    """Guarda (upsert) los watermarks con los que se calculó el valor."""
+    watermarks = {k: v for k, v in watermarks.items() if v is not None}
+    if not watermarks:
+        return
+    try:
+        ensure_watermark_table()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                for key, watermark in watermarks.items():
+                    cur.execute(
+                        f"""
+                        INSERT INTO {WATERMARK_TABLE}
+                            (sc_name, kpi_number, last_sunday, source_key, watermark, recorded_at)
+                        VALUES (%s, %s, %s, %s, %s, NOW())
+                        ON CONFLICT (sc_name, kpi_number, last_sunday, source_key)
+                        DO UPDATE SET watermark = EXCLUDED.watermark,
+                                      recorded_at = EXCLUDED.recorded_at
+                        """,
+                        (sc_name, kpi_number, last_sunday_str, key, watermark),
+                    )
+            conn.commit()
+    except Exception as e:
+        print(f"[record_watermarks] Error: {e}")
+
+
+def _value_exists(table_name: str, sc_name: str, kpi_number: str, last_sunday_str: str) -> bool:
+    count = fetch_single_value(
+        f"""
+        SELECT COUNT(*) FROM {table_name}
+        WHERE sc_name = %s AND kpi_number = %s AND last_sunday = %s
+          AND field_value IS NOT NULL
+        """,
+        (sc_name, kpi_number, last_sunday_str),
+        use_cache=False,
+    )
+    return bool(count)
+
+
+# -------------------------------------------------------------------
+# 4) Decisión de skip
+# -------------------------------------------------------------------
+
+def check_sources(
+    sources: list[dict],
+    table_name: str,
+    sc_name: str,
+    kpi_number: str,
+    last_sunday_str: str,
+    force: bool = False,
+) -> tuple[bool, dict[str, str]]:
+    """
+    Calcula los watermarks actuales y decide si el KPI se puede saltar.
+
+    Devuelve (skip, watermarks_actuales). Si el KPI se recalcula, los
+    watermarks actuales se guardan con record_watermarks() una vez que
+    el valor quedó confirmado (on_commit de insert_scorecard_record).
+    """
+    current = {source_key(s): compute_watermark(s) for s in sources}
+
+    if force or KPI_FORCE_RECOMPUTE or not sources or None in current.values():
+        return False, current
+
+    try:
+        stored = get_stored_watermarks(sc_name, kpi_number, last_sunday_str)
+    except Exception as e:
+        print(f"[check_sources] Error leyendo watermarks: {e}")
+        return False, current
+
+    if any(stored.get(key) != watermark for key, watermark in current.items()):
+        return False, current
+
+    # Las fuentes no cambiaron; solo se salta si el valor sigue escrito
+    return _value_exists(table_name, sc_name, kpi_number, last_sunday_str), current
@@ -5,66 +5,25 @@ KPI 16 – New Replacement Processes for Existing Clients (weekly)
 
 Ejemplo de KPI basado en:
 - Google Sheets (CS Weekly Report)
-- Limpieza / normalización con DuckDB
+- Limpieza / normalización con DuckDB (sesión compartida de core.duckdb_session)
 - Inserción en tabla de scorecard vía core.common_db
+
+La pestaña se lee con el cache de snapshots de core.common_sheets y
+se registra como tabla Arrow en la sesión DuckDB compartida: duckdb y
+pyarrow se cargan recién al ejecutar el KPI.
 """
 
-import os
-import duckdb
-import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+from functools import partial
 
 from core.common_dates import get_last_sunday, get_year_week
 from core.common_db import insert_scorecard_record
+from core.duckdb_session import duckdb_fetchone, register_worksheet
+from core.kpi_runner import declare_kpi
+from core.watermarks import check_sources, record_watermarks, sheet_source
 
 
 # -------------------------------------------------------------------
-# 1) Helpers para leer el Google Sheet
-# -------------------------------------------------------------------
-
-def get_gspread_client():
-    """
-    Crea un cliente de gspread usando un Service Account.
-    Supone que la ruta al JSON está en la variable de entorno
-    GOOGLE_APPLICATION_CREDENTIALS.
-    """
-    creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-
-    if not creds_path:
-        raise RuntimeError(
-            "GOOGLE_APPLICATION_CREDENTIALS no está definida. "
-            "Configura la variable de entorno con la ruta al JSON del Service Account."
-        )
-
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets.readonly",
-        "https://www.googleapis.com/auth/drive.readonly",
-    ]
-
-    creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
-    client = gspread.authorize(creds)
-    return client
-
-
-def load_weekly_report(sheet_name: str, worksheet_name: str) -> pd.DataFrame:
-    """
-    Lee un Google Sheet y lo regresa como DataFrame.
-    - sheet_name: nombre del archivo en Google Sheets
-    - worksheet_name: pestaña específica
-    """
-    client = get_gspread_client()
-    sh = client.open(sheet_name)
-    ws = sh.worksheet(worksheet_name)
-
-    data = ws.get_all_records()
-    df = pd.DataFrame(data)
-
-    return df
-
-
-# -------------------------------------------------------------------
-# 2) Cálculo del KPI con DuckDB
+# 1) Cálculo del KPI con DuckDB
 # -------------------------------------------------------------------
 
 # CUSTOMIZAR ESTOS NOMBRES SEGÚN TU ENTORNO
@@ -73,45 +32,54 @@ WORKSHEET_NAME = "CS_WEEKLY_WORKSHEET"           # nombre de la pestaña
 COLUMN_WEEK = "WEEK_REPORTED_COL"                # columna semana (ej. 'week_reported')
 COLUMN_REPLACEMENTS = "REPLACEMENTS_COUNT_COL"   # columna con el número de replacements
 
+# Fuentes del KPI: si el sheet no cambió, no se recalcula (ver core.watermarks)
+SOURCES = [sheet_source(SHEET_NAME)]
+
+# CUSTOMIZAR NOMBRE DE TABLA SI ES DIFERENTE
+TABLE_NAME = "vl_analytics.scorecard_vl02"
 
-def calculate_kpi_value(last_sunday_str: str, year_week_str: str) -> int:
+
+def calculate_kpi_value(last_sunday_str: str, year_week_str: str) -> int | None:
     """
     Carga el sheet, limpia datos y calcula el KPI usando DuckDB.
     Este valor es el que finalmente se insertará en el scorecard.
+    Devuelve None si no se pudo leer el sheet o falló el query.
     """
 
-    # 1) Cargar datos desde Google Sheets
-    df = load_weekly_report(SHEET_NAME, WORKSHEET_NAME)
-
-    # 2) Normalizar columnas mínimas necesarias
-    # Asegúrate de que COLUMN_WEEK y COLUMN_REPLACEMENTS existan en df
-    df[COLUMN_WEEK] = df[COLUMN_WEEK].astype(str)
-
-    # 3) Conectar DuckDB en memoria y registrar el DataFrame
-    con = duckdb.connect(":memory:")
-    con.register("weekly_report", df)
+    # 1) Registrar la pestaña en la sesión DuckDB de la corrida
+    #    (tabla Arrow, sin copia; si otro KPI ya la registró, se reutiliza)
+    try:
+        weekly_report = register_worksheet(SHEET_NAME, WORKSHEET_NAME)
+    except Exception as e:
+        print(f"[calculate_kpi_value] KPI 16: no se pudo leer el sheet: {e}")
+        return None
 
-    # 4) Query en DuckDB:
+    # 2) Query en DuckDB:
+    #    - Normalizar la semana a texto (el sheet puede traerla como número)
     #    - Filtrar por la semana deseada (year_week_str)
     #    - Sumar el número de replacements de esa semana
     query_duck = f"""
         SELECT
             COALESCE(SUM("{COLUMN_REPLACEMENTS}"), 0) AS total_replacements
-        FROM weekly_report
-        WHERE {COLUMN_WEEK} = '{year_week_str}'
+        FROM {weekly_report}
+        WHERE CAST("{COLUMN_WEEK}" AS VARCHAR) = ?
     """
 
-    result = con.execute(query_duck).fetchone()
-    con.close()
+    try:
+        result = duckdb_fetchone(query_duck, [year_week_str])
+    except Exception as e:
+        print(f"[calculate_kpi_value] KPI 16: error en DuckDB: {e}")
+        return None
 
     total_replacements = result[0] if result else 0
     return int(total_replacements or 0)
 
 
 # -------------------------------------------------------------------
-# 3) Wrapper para integrarlo al scorecard
+# 2) Wrapper para integrarlo al scorecard
 # -------------------------------------------------------------------
 
+@declare_kpi("16", label="KPI 16 – Replacement Processes", cost=3, sources=SOURCES)
 def run_kpi_16():
     ### Ejecuta el KPI 16 y lo inserta en la tabla del scorecard.
     
@@ -126,11 +94,18 @@ def run_kpi_16():
     timestamp_time = now.strftime("%Y-%m-%d %H:%M")
     year = last_sunday.year
 
+    # Saltar si el sheet no cambió desde el último cálculo
+    skip, watermarks = check_sources(SOURCES, TABLE_NAME, "Success", "16", last_sunday_str)
+    if skip:
+        print(f"KPI 16: fuentes sin cambios, se omite ({last_sunday_str}).")
+        return
+
     # Calcular el valor real del KPI
     value = calculate_kpi_value(last_sunday_str, year_week_str)
-
-    # CUSTOMIZAR NOMBRE DE TABLA SI ES DIFERENTE
-    TABLE_NAME = "vl_analytics.scorecard_vl02"
+    if value is None:
+        # No se pisa el valor guardado ni se registran watermarks
+        print(f"KPI 16: no se pudo calcular, no se escribe ({last_sunday_str}).")
+        return
 
     # Insertar en la tabla de scorecard
     insert_scorecard_record(
@@ -145,6 +120,7 @@ def run_kpi_16():
         field_name="New Replacement Processes for existing clients",  # texto visible
         field_details=None,
         field_value=value,
+        on_commit=partial(record_watermarks, "Success", "16", last_sunday_str, watermarks),
     )
 
     # Log
@@ -0,0 +1,310 @@
+# success_scorecard/32_overall_churn_rate.py
+
+"""
+KPI 32 – Overall Churn Rate (52 weeks, weekly)
+
+Ejemplo de KPI:
+- Tabla de acuerdos / contratos en DWH
+- Cálculo de churn real en últimas 52 semanas
+- Inserción en tabla de scorecard vía core.common_db
+- Backfill histórico de muchas semanas con un solo query
+
+Uso:
+    python -m success_scorecard.32_overall_churn_rate                         # último domingo
+    python -m success_scorecard.32_overall_churn_rate 2024-01-01 2025-12-31   # backfill
+"""
+
+import sys
+from datetime import date, datetime, timedelta
+from functools import partial
+
+from core.common_dates import get_last_sunday, get_year_week
+from core.common_db import insert_scorecard_record
+from core.kpi_runner import declare_kpi
+from core.kpi_template import fetch_kpi_value, run_kpi_backfill
+from core.watermarks import check_sources, record_watermarks, table_source
+
+
+# -------------------------------------------------------------------
+# 1) Parámetros genéricos para el modelo de churn
+# -------------------------------------------------------------------
+
+# CUSTOMIZAR NOMBRES Y VALORES SEGÚN TU ESQUEMA EN DWH
+
+# Tabla de acuerdos / contratos
+AGREEMENTS_TABLE = "SCHEMA_NAME.AGREEMENTS_TABLE"  # ej. "stg_hubspot.agreements"
+
+# Columnas mínimas necesarias
+COL_AGREEMENT_ID = "agreement_id"          # identificador único de acuerdo
+COL_CLIENT_TYPE = "client_type"           # para filtrar internos/test
+COL_STATUS = "agreement_status"           # estado del acuerdo
+COL_START_DATE = "start_date"             # cuándo inicia
+COL_END_DATE = "end_date"                 # cuándo termina (si aplica)
+COL_UPDATED_AT = "updated_at"             # última actualización (watermark)
+
+# Valores que identifican tipo de cliente
+INTERNAL_CLIENT_VALUE = "INTERNAL" 
+TEST_CLIENT_VALUE = "TEST" 
+
+# Valores de estado de acuerdo
+STATUS_ACTIVE = "ACTIVE"                 
+STATUS_TERMINATED_BY_CLIENT = "TERM_CLIENT"
+STATUS_TERMINATED_OTHER = "TERM_OTHER"     
+
+# Ventana de análisis (en semanas)
+WINDOW_WEEKS = 52
+
+# Fuentes del KPI: si no cambiaron, no se recalcula (ver core.watermarks)
+SOURCES = [table_source(AGREEMENTS_TABLE, updated_column=COL_UPDATED_AT, key_column=COL_AGREEMENT_ID)]
+
+# CUSTOMIZAR NOMBRE DE TABLA DE SCORECARD SI ES NECESARIO
+TABLE_NAME = "vl_analytics.scorecard_vl02"
+
+
+# -------------------------------------------------------------------
+# 2) Construcción del query para churn
+# -------------------------------------------------------------------
+
+def filter_params() -> dict:
+    """Valores fijos de los filtros (tipos de cliente y estados), como parámetros."""
+    return {
+        "internal_client": INTERNAL_CLIENT_VALUE,
+        "test_client": TEST_CLIENT_VALUE,
+        "term_client": STATUS_TERMINATED_BY_CLIENT,
+        "term_other": STATUS_TERMINATED_OTHER,
+    }
+
+
+def build_query(last_sunday_str: str) -> tuple[str, dict]:
+    """
+    Construye un query SQL genérico para calcular churn real
+    en una ventana de 52 semanas a partir del último domingo.
+
+    churn = acuerdos terminados por cliente en ventana /
+            acuerdos expuestos en ventana
+
+    Devuelve (query, params): las fechas y valores van como parámetros,
+    así el texto del query es el mismo todas las semanas y se ejecuta
+    como prepared statement (un solo plan).
+    """
+
+    # Punto final = último domingo
+    end_date = last_sunday_str
+
+    # Punto inicial = 52 semanas antes
+    start_date = (
+        datetime.strptime(last_sunday_str, "%Y-%m-%d") - timedelta(weeks=WINDOW_WEEKS)
+    ).strftime("%Y-%m-%d")
+
+    query = f"""
+    WITH base_agreements AS (
+        SELECT
+            {COL_AGREEMENT_ID} AS agreement_id,
+            {COL_CLIENT_TYPE}  AS client_type,
+            {COL_STATUS}       AS status,
+            {COL_START_DATE}   AS start_date,
+            {COL_END_DATE}     AS end_date
+        FROM {AGREEMENTS_TABLE}
+        WHERE {COL_START_DATE} IS NOT NULL
+          AND {COL_START_DATE} <= %(end_date)s::DATE
+          -- Opcional: excluir acuerdos muy viejos si quieres acotar más
+    ),
+
+    filtered_agreements AS (
+        SELECT *
+        FROM base_agreements
+        WHERE client_type NOT IN (%(internal_client)s, %(test_client)s)
+    ),
+
+    churned_in_window AS (
+        SELECT COUNT(DISTINCT agreement_id) AS churned_count
+        FROM filtered_agreements
+        WHERE status IN (%(term_client)s, %(term_other)s)
+          AND end_date IS NOT NULL
+          AND end_date >= %(start_date)s::DATE
+          AND end_date <= %(end_date)s::DATE
+    ),
+
+    exposed_in_window AS (
+        -- acuerdos que estuvieron "vivos" en algún momento de la ventana
+        SELECT COUNT(DISTINCT agreement_id) AS exposed_count
+        FROM filtered_agreements
+        WHERE start_date <= %(end_date)s::DATE
+          AND (
+                end_date IS NULL
+             OR end_date >= %(start_date)s::DATE
+          )
+    )
+
+    SELECT
+        CASE
+            WHEN exposed_count = 0 THEN 0::DOUBLE PRECISION
+            ELSE churned_count::DOUBLE PRECISION / exposed_count::DOUBLE PRECISION
+        END AS churn_rate
+    FROM churned_in_window, exposed_in_window;
+    """
+
+    return query, {"start_date": start_date, "end_date": end_date, **filter_params()}
+
+
+def build_backfill_query(first_sunday_str: str, last_sunday_str: str) -> tuple[str, dict]:
+    """
+    Versión set-based de build_query: calcula el churn de TODAS las
+    semanas entre first_sunday_str y last_sunday_str en un solo query.
+
+    Se genera la serie de domingos y se hace JOIN contra los acuerdos
+    que estuvieron expuestos en la ventana de 52 semanas de cada domingo.
+    Devuelve (query, params); el query devuelve filas (last_sunday, churn_rate).
+    """
+
+    query = f"""
+    WITH sundays AS (
+        SELECT
+            g.d::DATE                                     AS last_sunday,
+            (g.d - INTERVAL '{WINDOW_WEEKS} weeks')::DATE AS window_start
+        FROM generate_series(
+            %(first_sunday)s::DATE,
+            %(last_sunday)s::DATE,
+            INTERVAL '7 days'
+        ) AS g(d)
+    ),
+
+    filtered_agreements AS (
+        SELECT
+            {COL_AGREEMENT_ID} AS agreement_id,
+            {COL_STATUS}       AS status,
+            {COL_START_DATE}   AS start_date,
+            {COL_END_DATE}     AS end_date
+        FROM {AGREEMENTS_TABLE}
+        WHERE {COL_START_DATE} IS NOT NULL
+          AND {COL_START_DATE} <= %(last_sunday)s::DATE
+          AND {COL_CLIENT_TYPE} NOT IN (%(internal_client)s, %(test_client)s)
+    ),
+
+    weekly_counts AS (
+        -- acuerdos expuestos en la ventana de cada domingo
+        -- (los churned son un subconjunto de los expuestos)
+        SELECT
+            s.last_sunday,
+            COUNT(DISTINCT a.agreement_id) FILTER (
+                WHERE a.status IN (%(term_client)s, %(term_other)s)
+                  AND a.end_date IS NOT NULL
+                  AND a.end_date <= s.last_sunday
+            ) AS churned_count,
+            COUNT(DISTINCT a.agreement_id) AS exposed_count
+        FROM sundays s
+        LEFT JOIN filtered_agreements a
+          ON a.start_date <= s.last_sunday
+         AND (a.end_date IS NULL OR a.end_date >= s.window_start)
+        GROUP BY s.last_sunday
+    )
+
+    SELECT
+        last_sunday,
+        CASE
+            WHEN exposed_count = 0 THEN 0::DOUBLE PRECISION
+            ELSE churned_count::DOUBLE PRECISION / exposed_count::DOUBLE PRECISION
+        END AS churn_rate
+    FROM weekly_counts
+    ORDER BY last_sunday;
+    """
+
+    return query, {"first_sunday": first_sunday_str, "last_sunday": last_sunday_str, **filter_params()}
+
+
+def calculate_kpi_value(last_sunday_str: str) -> float | None:
+    """
+    Calcula el churn rate ejecutando el query en DWH (o en la réplica
+    local con KPI_ENGINE=local, ver core.local_replica) y devolviendo
+    un valor numérico (float). Devuelve None si el query falló.
+    """
+    query, params = build_query(last_sunday_str)
+    result = fetch_kpi_value(query, params, SOURCES)
+    return None if result is None else float(result)
+
+
+# -------------------------------------------------------------------
+# 3) Wrapper para integrarlo al scorecard
+# -------------------------------------------------------------------
+
+@declare_kpi("32", label="KPI 32 – Overall Churn 52 weeks", cost=10, sources=SOURCES)
+def run_kpi_32():
+    """
+    Ejecuta el KPI 32 y lo inserta en la tabla de scorecard.
+    """
+
+    # Fechas base
+    last_sunday = get_last_sunday()
+    last_sunday_str = last_sunday.strftime("%Y-%m-%d")
+    year_week_str = get_year_week(last_sunday)
+    year_week_num = year_week_str[-2:]
+    now = datetime.now()
+    timestamp_time = now.strftime("%Y-%m-%d %H:%M")
+    year = last_sunday.year
+
+    # Saltar si la tabla de acuerdos no cambió desde el último cálculo
+    skip, watermarks = check_sources(SOURCES, TABLE_NAME, "Success", "32", last_sunday_str)
+    if skip:
+        print(f"KPI 32: fuentes sin cambios, se omite ({last_sunday_str}).")
+        return
+
+    # Calcular valor de churn en la ventana definida
+    churn_value = calculate_kpi_value(last_sunday_str)
+    if churn_value is None:
+        # No se pisa el valor guardado ni se registran watermarks
+        print(f"KPI 32: el query falló, no se escribe ({last_sunday_str}).")
+        return
+
+    # Insertar en la tabla de scorecard
+    insert_scorecard_record(
+        table_name=TABLE_NAME,
+        year=year,
+        print_date=timestamp_time,
+        sc_name="Success",   # TODO: cambiar si este KPI va a otro scorecard
+        last_sunday=last_sunday_str,
+        kpi_number="32",
+        range_type="weekly",
+        week_month=year_week_num,
+        field_name="Overall churn [real churn] - (52 weeks)",
+        field_details=f"Window start: {WINDOW_WEEKS} weeks before last Sunday",
+        field_value=churn_value,
+        on_commit=partial(record_watermarks, "Success", "32", last_sunday_str, watermarks),
+    )
+
+    # Log
+    print("---------------------------------------------")
+    print("Scorecard: Success")
+    print("KPI 32 – Overall churn [real churn] - (52 weeks)")
+    print(f"Year: {year}")
+    print(f"Week: {year_week_num}")
+    print(f"Last Sunday: {last_sunday_str}")
+    print(f"Churn value: {churn_value}")
+    print("---------------------------------------------")
+
+
+def backfill_kpi_32(start_date: date, end_date: date):
+    """
+    Recalcula el KPI 32 para todos los domingos entre start_date y
+    end_date con un solo query y un solo insert masivo.
+    """
+    return run_kpi_backfill(
+        sc_name="Success",
+        kpi_number="32",
+        range_type="weekly",
+        field_name="Overall churn [real churn] - (52 weeks)",
+        field_details=f"Window start: {WINDOW_WEEKS} weeks before last Sunday",
+        build_backfill_query_func=build_backfill_query,
+        start_date=start_date,
+        end_date=end_date,
+        table_name=TABLE_NAME,
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        backfill_kpi_32(
+            date.fromisoformat(sys.argv[1]),
+            date.fromisoformat(sys.argv[2]),
+        )
+    else:
+        run_kpi_32()
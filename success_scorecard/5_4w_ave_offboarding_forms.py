@@ -8,13 +8,16 @@ Ejemplo de KPI derivado basado en:
 - Cálculo del promedio de las últimas 4 semanas
 - Inserción del resultado en la misma tabla de scorecard
 
-Este patrón sirve para smoothing / trailing averages.
+Este patrón sirve para smoothing / trailing averages. El cálculo lo hace
+core.derived_kpis: aquí solo se declara el KPI base, la ventana y el
+agregado (avg, sum, min, max, yoy_delta).
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from core.common_dates import get_last_sunday, get_year_week
-from core.common_db import fetch_single_value, insert_scorecard_record
+from core.common_dates import get_last_sunday
+from core.derived_kpis import base_kpi_source, compute_derived_kpis, derived_kpi, run_derived_kpis
+from core.kpi_runner import declare_kpi
 
 
 # -------------------------------------------------------------------
@@ -36,92 +39,47 @@ DERIVED_FIELD_NAME = "4 Week Ave. Offboarding Forms Completed"
 
 
 # -------------------------------------------------------------------
-# 2) Cálculo del KPI derivado (promedio 4 semanas)
+# 2) Declaración del KPI derivado (promedio 4 semanas)
 # -------------------------------------------------------------------
 
-def build_query(last_sunday_str: str) -> str:
-    """
-    Construye un query que calcula el promedio de field_value
-    del KPI base en las últimas 4 semanas (incluyendo la semana
-    del último domingo).
-    """
-
-    # Último domingo como fecha final del rango
-    end_date = datetime.strptime(last_sunday_str, "%Y-%m-%d")
-
-    # Fecha inicial = 4 semanas antes (28 días)
-    start_date = (end_date - timedelta(weeks=4)).strftime("%Y-%m-%d")
-    end_date_str = end_date.strftime("%Y-%m-%d")
-
-    query = f"""
-        SELECT
-            COALESCE(AVG(field_value), 0) AS avg_last_4_weeks
-        FROM {SCORECARD_TABLE}
-        WHERE sc_name = '{BASE_SC_NAME}'
-          AND kpi_number = '{BASE_KPI_NUMBER}'
-          AND range_type = 'weekly'
-          AND last_sunday >= '{start_date}'
-          AND last_sunday <= '{end_date_str}';
-    """
-
-    return query
+DERIVED_KPIS = [
+    derived_kpi(
+        DERIVED_KPI_NUMBER,
+        DERIVED_FIELD_NAME,
+        base_kpi=BASE_KPI_NUMBER,
+        window_weeks=4,
+        aggregate="avg",
+        sc_name=BASE_SC_NAME,  # normalmente mismo scorecard que el KPI base
+        field_details=f"Average of KPI {BASE_KPI_NUMBER} over last 4 weeks",
+    ),
+]
 
 
 def calculate_kpi_value(last_sunday_str: str) -> float:
     """
-    Ejecuta el query de promedio y regresa el valor numérico.
+    Calcula el promedio de 4 semanas y regresa el valor numérico.
     """
-    query = build_query(last_sunday_str)
-    result = fetch_single_value(query)
-    return float(result or 0.0)
+    last_sunday = datetime.strptime(last_sunday_str, "%Y-%m-%d").date()
+    values = compute_derived_kpis(DERIVED_KPIS, last_sunday, SCORECARD_TABLE)
+    return float(values[DERIVED_KPI_NUMBER] or 0.0)
 
 
 # -------------------------------------------------------------------
 # 3) Wrapper para integrarlo al scorecard
 # -------------------------------------------------------------------
 
+@declare_kpi(
+    DERIVED_KPI_NUMBER,
+    depends_on=[BASE_KPI_NUMBER],
+    label="KPI 05 – 4W Ave Offboarding Forms",
+    sources=[base_kpi_source(d, SCORECARD_TABLE) for d in DERIVED_KPIS],
+)
 def run_kpi_5():
     """
     Ejecuta el KPI 5 (promedio 4 semanas) y lo inserta en la tabla
     de scorecard como un KPI derivado.
     """
-
-    # Fechas base
-    last_sunday = get_last_sunday()
-    last_sunday_str = last_sunday.strftime("%Y-%m-%d")
-    year_week_str = get_year_week(last_sunday)
-    year_week_num = year_week_str[-2:]
-    now = datetime.now()
-    timestamp_time = now.strftime("%Y-%m-%d %H:%M")
-    year = last_sunday.year
-
-    # Calcular valor del promedio 4 semanas
-    avg_value = calculate_kpi_value(last_sunday_str)
-
-    # Insertar en la tabla de scorecard
-    insert_scorecard_record(
-        table_name=SCORECARD_TABLE,
-        year=year,
-        print_date=timestamp_time,
-        sc_name=BASE_SC_NAME,  # normalmente mismo scorecard que el KPI base
-        last_sunday=last_sunday_str,
-        kpi_number=DERIVED_KPI_NUMBER,
-        range_type="weekly",
-        week_month=year_week_num,
-        field_name=DERIVED_FIELD_NAME,
-        field_details=f"Average of KPI {BASE_KPI_NUMBER} over last 4 weeks",
-        field_value=avg_value,
-    )
-
-    # Log
-    print("---------------------------------------------")
-    print(f"Scorecard: {BASE_SC_NAME}")
-    print(f"KPI {DERIVED_KPI_NUMBER} – {DERIVED_FIELD_NAME}")
-    print(f"Year: {year}")
-    print(f"Week: {year_week_num}")
-    print(f"Last Sunday: {last_sunday_str}")
-    print(f"4-week average value: {avg_value}")
-    print("---------------------------------------------")
+    run_derived_kpis(DERIVED_KPIS, SCORECARD_TABLE, get_last_sunday())
 
 
 if __name__ == "__main__":
@@ -4,29 +4,46 @@
 SUCCESS SCORECARD – RUNNER
 
 Este script ejecuta todos los KPIs del scorecard "Success".
-Actúa como orquestador: importa cada KPI, los ejecuta uno por uno
-y deja el resultado en la tabla del scorecard definida en cada KPI.
+Actúa como orquestador: importa cada KPI, los ejecuta (uno por uno o
+en paralelo, ver KPI_MAX_WORKERS) y deja el resultado en la tabla del
+scorecard definida en cada KPI.
 
 Este archivo se usa típicamente con un CRON que corre una vez por semana.
 """
 
+import argparse
+from contextlib import ExitStack
 from datetime import datetime
 
-# Importar KPIs individuales
-# ------------------------------------------------------------
-# Cada KPI tiene su propio archivo y un método run_kpi_XX()
-
-from success_scorecard.5_4w_ave_offboarding_forms import run_kpi_5
-from success_scorecard.16_replacement_processes_existing_clients import run_kpi_16
-from success_scorecard.32_overall_churn_rate import run_kpi_32
+from core.common_db import buffered_scorecard_writes
+from core.duckdb_session import duckdb_session
+from core.kpi_registry import kpi_run_list, load_kpis
+from core.kpi_runner import run_kpis
 
-# aqui se agregan mas KPIS
+# KPIs del scorecard
+# ------------------------------------------------------------
+# Cada KPI tiene su propio archivo (<número>_<nombre>.py) con un método
+# run_kpi_XX() decorado con @declare_kpi, que lo registra en
+# core.kpi_registry. Para agregar un KPI basta con crear el archivo:
+# el registro lo descubre por nombre, sin tocar este runner.
 
+DOMAIN = "success"
 
 
-def run_success_scorecard():
+def run_success_scorecard(
+    max_workers: int | None = None,
+    kpi_numbers: list[str] | None = None,
+    publish: bool = False,
+):
     """
-    Ejecuta todos los KPIs del domain Success.
+    Ejecuta todos los KPIs del domain Success (o solo kpi_numbers).
+
+    max_workers: KPIs en paralelo (por defecto KPI_MAX_WORKERS, 1 = secuencial).
+    kpi_numbers: ej. ["5", "32"]; solo se importan los módulos de esos KPIs.
+    publish: publicar en Google Sheets a medida que los KPIs terminan
+    (ver core.streaming_publish), en lugar de correr run_to_sheet_success
+    como paso aparte.
+    Devuelve {label: None | excepción} por KPI.
     """
 
     print("=====================================================")
@@ -35,32 +52,50 @@ def run_success_scorecard():
     print("=====================================================")
 
     # ------------------------
-    # Lista de KPIs a ejecutar
+    # Lista de KPIs a ejecutar (registro, los más caros primero)
     # ------------------------
+    kpis = kpi_run_list(load_kpis([DOMAIN], kpi_numbers))
 
-    kpis = [
-        ("KPI 05 – 4W Ave Offboarding Forms", run_kpi_5),
-        ("KPI 16 – Replacement Processes", run_kpi_16),
-        ("KPI 32 – Overall Churn 52 weeks", run_kpi_32),
-    ]
-    """
-    Aqui es donde se pueden agregar todos los KPIs a calcular
-    """
     # ------------------------
-    # Ejecución secuencial
+    # Ejecución (secuencial o concurrente)
     # ------------------------
-    for label, kpi_function in kpis:
-        print(f"\n>>> Ejecutando {label}...")
-        try:
-            kpi_function()
-            print(f"OK – {label} finalizado.")
-        except Exception as e:
-            print(f"ERROR en {label}: {e}")
+    # El orden lo define el DAG de dependencias (@declare_kpi en cada KPI):
+    # los derivados, como el KPI 05, esperan a sus KPIs base.
+    # Los inserts de todos los KPIs se acumulan y se escriben en bloque
+    # (una transacción) al terminar la corrida.
+    # Los KPIs con DuckDB comparten una sesión que se cierra al terminar.
+    # Con publish, cada valor calculado va también al sheet (en batches
+    # periódicos), sin esperar al resto de los KPIs ni releer el DWH.
+    with buffered_scorecard_writes(), duckdb_session(), ExitStack() as stack:
+        if publish:
+            from core.streaming_publish import streaming_publish
+            from success_scorecard.run_to_sheet_success import SC_NAME, open_week_publisher
+
+            stack.enter_context(streaming_publish(open_week_publisher(), SC_NAME))
+        results = run_kpis(kpis, max_workers=max_workers)
+
+    failed = [label for label, error in results.items() if error is not None]
 
     print("\n=====================================================")
     print("   SUCCESS SCORECARD – FINALIZADO")
+    print(f"   OK: {len(results) - len(failed)}  |  ERROR: {len(failed)}")
+    for label in failed:
+        print(f"   - {label}")
     print("=====================================================")
 
+    return results
+
 
 if __name__ == "__main__":
-    run_success_scorecard()
+    parser = argparse.ArgumentParser(description="Ejecuta los KPIs del scorecard Success.")
+    parser.add_argument("--kpi", help="KPIs a ejecutar, ej. 5,32 (por defecto todos)")
+    parser.add_argument("--workers", type=int, help="KPIs en paralelo (por defecto KPI_MAX_WORKERS)")
+    parser.add_argument("--publish", action="store_true",
+                        help="publicar en Google Sheets a medida que terminan los KPIs")
+    args = parser.parse_args()
+
+    run_success_scorecard(
+        max_workers=args.workers,
+        kpi_numbers=args.kpi.split(",") if args.kpi else None,
+        publish=args.publish,
+    )
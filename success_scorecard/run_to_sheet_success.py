@@ -8,19 +8,29 @@ Flujo:
 2. Consulta en DWH cuál es el last_sunday registrado para esa week_month.
 3. Trae TODOS los KPIs del scorecard 'SC_NAME' para ese last_sunday.
 4. En el Google Sheet:
+   - Lee la pestaña en una sola llamada (layout + valores publicados).
    - Busca (o crea) una columna en la fila 1 con ese last_sunday.
    - Recorre las filas de KPIs (columna A = número de KPI).
-   - Escribe el valor de cada KPI en la columna de la semana.
+   - Escribe solo los valores de KPI que cambiaron en la columna de la semana.
+
+Modo catch-up (--catch-up):
+   Compara las semanas del DWH contra las columnas de las pestañas
+   sc<year> y escribe todas las columnas faltantes o desactualizadas
+   en un solo values.batchUpdate.
+
+Modo streaming (run_success_scorecard --publish):
+   El runner pasa cada valor calculado directo a open_week_publisher()
+   (ver core.streaming_publish), sin releer el DWH.
 """
 
+import argparse
 from datetime import datetime
-import os
-
-import gspread
-from google.oauth2.service_account import Credentials
 
 from core.common_dates import get_last_sunday, get_year_week
 from core.common_db import get_connection
+from core.common_sheets import get_gspread_client
+from core.kpi_registry import normalize_kpi_number
+from core.scorecard_schema import check_scorecard_schema, latest_view_name
 
 
 # -------------------------------------------------------------------
@@ -30,6 +40,9 @@ from core.common_db import get_connection
 # Tabla del scorecard en DWH
 SCORECARD_TABLE = "vl_analytics.scorecard_vl"  
 
+# Vista con el último valor por KPI por semana (ver core.scorecard_schema)
+SCORECARD_VIEW = latest_view_name(SCORECARD_TABLE)
+
 # Nombre del scorecard (sc_name en la tabla)
 SC_NAME = "Success" 
 
@@ -37,11 +50,6 @@ SC_NAME = "Success"
 # https://docs.google.com/spreadsheets/d/SPREADSHEET_ID/edit#gid=0
 SPREADSHEET_ID = "YOUR_SPREADSHEET_ID_HERE" 
 
-# Nombre de la pestaña donde vive el scorecard (ej. "sc2025")
-WORKSHEET_NAME = "sc2025"    
- anho = date.today().year
-datetime.now()
-
 # Índice de columna base donde empiezan las semanas (1 = A, 2 = B, 3 = C, ...)
 # En tu ejemplo: semanas empiezan en la columna C => 3
 BASE_WEEK_COL_INDEX = 3      
@@ -54,27 +62,6 @@ KPI_ROWS_START = 2
 # 2) Helpers Google Sheets
 # -------------------------------------------------------------------
 
-def get_gspread_client():
-    """
-    Devuelve un cliente de gspread usando Service Account.
-    Requiere GOOGLE_APPLICATION_CREDENTIALS con la ruta al JSON.
-    """
-    creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-    if not creds_path:
-        raise RuntimeError(
-            "GOOGLE_APPLICATION_CREDENTIALS no está definida. "
-            "Configura la variable de entorno con la ruta al JSON del Service Account."
-        )
-
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-
-    creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
-    return gspread.authorize(creds)
-
-
 def col_index_to_letter(col_index: int) -> str:
     """
     Convierte índice 1-based a letra de columna: 1->A, 2->B, 27->AA...
@@ -86,6 +73,16 @@ def col_index_to_letter(col_index: int) -> str:
     return "".join(reversed(result))
 
 
+def worksheet_name_for_year(year: int) -> str:
+    """Una pestaña por año: 2025 -> 'sc2025'."""
+    return f"sc{year}"
+
+
+def worksheet_name_for_week(last_sunday_str: str) -> str:
+    """Pestaña de una semana (todos los publishers usan este criterio): '2026-01-04' -> 'sc2026'."""
+    return worksheet_name_for_year(int(str(last_sunday_str)[:4]))
+
+
 # -------------------------------------------------------------------
 # 3) Lecturas desde DWH
 # -------------------------------------------------------------------
@@ -94,7 +91,7 @@ def get_last_sunday_from_db(week_month: str) -> str | None:
 
     query = f"""
         SELECT DISTINCT last_sunday
-        FROM {SCORECARD_TABLE}
+        FROM {SCORECARD_VIEW}
         WHERE week_month = %s
           AND sc_name = %s
         ORDER BY last_sunday DESC
@@ -117,7 +114,7 @@ def fetch_kpis_for_last_sunday(last_sunday_str: str):
         SELECT
             kpi_number,
             field_value
-        FROM {SCORECARD_TABLE}
+        FROM {SCORECARD_VIEW}
         WHERE sc_name = %s
           AND last_sunday = %s
         ORDER BY kpi_number::INT ASC;
@@ -142,43 +139,195 @@ def fetch_kpis_for_last_sunday(last_sunday_str: str):
     return kpi_values
 
 
+def fetch_scorecard_history(years: list[int]) -> dict[int, dict[str, dict]]:
+    """
+    Trae todos los valores del scorecard 'SC_NAME' para los años indicados
+    en una sola consulta.
+
+    Devuelve {year: {last_sunday_str: {kpi_number_normalizado: field_value}}}.
+    """
+    query = f"""
+        SELECT
+            last_sunday,
+            kpi_number,
+            field_value
+        FROM {SCORECARD_VIEW}
+        WHERE sc_name = %s
+          AND last_sunday >= %s
+          AND last_sunday <= %s
+        ORDER BY last_sunday ASC;
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, (SC_NAME, f"{min(years)}-01-01", f"{max(years)}-12-31"))
+            rows = cur.fetchall()
+
+    history = {year: {} for year in years}
+    for last_sunday, kpi_number, field_value in rows:
+        if kpi_number is None:
+            continue
+        last_sunday_str = (
+            last_sunday.strftime("%Y-%m-%d") if hasattr(last_sunday, "strftime") else str(last_sunday)
+        )
+        year = int(last_sunday_str[:4])
+        if year not in history:
+            continue
+        week = history[year].setdefault(last_sunday_str, {})
+        week[normalize_kpi_number(kpi_number)] = field_value
+
+    return history
+
+
 # -------------------------------------------------------------------
 # 4) Lógica de escritura en el Sheet (volcado masivo)
 # -------------------------------------------------------------------
 
-def find_or_create_week_column(ws, last_sunday_str: str) -> int:
+def build_sheet_layout(header: list, kpi_column: list) -> dict:
     """
-    Busca en la fila 1 una columna cuyo valor sea igual a last_sunday_str
-    (o equivalente de fecha). Si no existe, crea una nueva columna al final.
+    Arma los índices en memoria a partir de la fila 1 (header) y la
+    columna A (kpi_column, una lista por fila como la devuelve el API):
 
-    Devuelve el índice de columna (1-based).
+    - week_cols: {last_sunday_str: índice de columna}  (desde BASE_WEEK_COL_INDEX)
+    - kpi_rows:  {kpi_number normalizado: fila}        (desde KPI_ROWS_START)
+    - kpi_row_ids: [kpi_id por fila, desde KPI_ROWS_START]
+    - next_col:  primera columna libre a la derecha de los encabezados
     """
-    max_col = ws.max_col if hasattr(ws, "max_col") else ws.col_count
-    # Row 1: encabezados de semanas a partir de BASE_WEEK_COL_INDEX
-    target_col = None
+    week_cols = {}
+    for col in range(BASE_WEEK_COL_INDEX, len(header) + 1):
+        v_norm = str(header[col - 1]).strip()
+        if v_norm and v_norm not in week_cols:
+            week_cols[v_norm] = col
+
+    kpi_rows = {}
+    kpi_row_ids = []
+    for row in range(KPI_ROWS_START, len(kpi_column) + 1):
+        cells = kpi_column[row - 1]
+        kpi_id_cell = str(cells[0]).strip() if cells else ""
+        if not kpi_id_cell:
+            # Si encontramos una fila vacía, asumimos que no hay más KPIs.
+            # Cortamos para no mandar un rango gigantesco innecesario.
+            break
 
-    for col in range(BASE_WEEK_COL_INDEX, max_col + 1):
-        val = ws.cell(row=1, column=col).value
-        if val is None:
-            continue
+        kpi_id_norm = normalize_kpi_number(kpi_id_cell)
+        kpi_rows.setdefault(kpi_id_norm, row)
+        kpi_row_ids.append(kpi_id_norm)
 
-        # Normalizamos valor: si es fecha, la pasamos a YYYY-MM-DD
-        if hasattr(val, "strftime"):
-            v_norm = val.strftime("%Y-%m-%d")
-        else:
-            v_norm = str(val).strip()
+    return {
+        "week_cols": week_cols,
+        "kpi_rows": kpi_rows,
+        "kpi_row_ids": kpi_row_ids,
+        "next_col": max(len(header), BASE_WEEK_COL_INDEX - 1) + 1,
+    }
 
-        if v_norm == last_sunday_str:
-            target_col = col
-            break
 
+def read_sheet_grid(ws) -> list[list]:
+    """
+    Lee la pestaña completa en UNA sola llamada (valores sin formato).
+    De ese grid salen el layout (fila 1 + columna A) y los valores ya
+    publicados, que se usan para mandar solo las celdas que cambiaron.
+    """
+    return list(ws.get(value_render_option="UNFORMATTED_VALUE", date_time_render_option="FORMATTED_STRING"))
+
+
+def layout_from_grid(grid: list[list]) -> dict:
+    """Layout (ver build_sheet_layout) a partir de un grid completo."""
+    header = grid[0] if grid else []
+    return build_sheet_layout(header, [row[:1] for row in grid])
+
+
+def find_or_create_week_column(layout: dict, last_sunday_str: str) -> tuple[int, bool]:
+    """
+    Busca en el layout (fila 1) la columna cuyo encabezado sea last_sunday_str.
+    Si no existe, reserva una nueva columna a la derecha (sin llamar al API:
+    el encabezado se escribe junto con los valores).
+
+    Devuelve (índice de columna 1-based, es_nueva).
+    """
+    target_col = layout["week_cols"].get(last_sunday_str)
     if target_col is not None:
-        return target_col
+        return target_col, False
+
+    target_col = layout["next_col"]
+    layout["week_cols"][last_sunday_str] = target_col
+    layout["next_col"] += 1
+    return target_col, True
+
+
+def to_cell_value(value):
+    """Convierte valores del DWH (Decimal, date, ...) a algo serializable en JSON."""
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d")
+    return float(value)
+
 
-    # Si no se encontró, creamos una nueva columna a la derecha
-    target_col = max_col + 1
-    ws.update_cell(1, target_col, last_sunday_str)
-    return target_col
+def grid_value(grid: list[list], row: int, col: int):
+    """Valor de la celda (row, col) 1-based en un grid leído del API, o None."""
+    if row - 1 >= len(grid) or col - 1 >= len(grid[row - 1]):
+        return None
+    return grid[row - 1][col - 1]
+
+
+def cell_differs(sheet_value, db_value) -> bool:
+    """
+    Compara el valor publicado en el sheet con el del DWH.
+    Un valor nulo en DWH no se considera diferencia (no se borra nada).
+    """
+    if db_value is None:
+        return False
+    if sheet_value is None or sheet_value == "":
+        return True
+    try:
+        return abs(float(sheet_value) - float(db_value)) > 1e-9
+    except (TypeError, ValueError):
+        return str(sheet_value).strip() != str(to_cell_value(db_value)).strip()
+
+
+def diff_week_column(
+    grid: list[list],
+    layout: dict,
+    col: int,
+    is_new_col: bool,
+    last_sunday_str: str,
+    kpi_values: dict,
+    tab: str | None = None,
+) -> list[dict]:
+    """
+    Compara la columna de la semana ya publicada (grid) contra kpi_values
+    y devuelve solo los rangos que cambiaron, listos para batch_update.
+    Las filas consecutivas que cambian se agrupan en un mismo rango.
+
+    tab: si se indica, los rangos llevan el prefijo 'tab'! (para
+    values.batchUpdate a nivel spreadsheet).
+    """
+    prefix = f"'{tab}'!" if tab else ""
+    col_letter = col_index_to_letter(col)
+
+    data = []
+    if is_new_col:
+        data.append({"range": f"{prefix}{col_letter}1", "values": [[last_sunday_str]]})
+
+    run_start, run_values = None, []
+    rows = list(enumerate(layout["kpi_row_ids"], start=KPI_ROWS_START))
+    for row, kpi_id_norm in rows + [(None, None)]:
+        changed = row is not None and cell_differs(
+            grid_value(grid, row, col), kpi_values.get(kpi_id_norm)
+        )
+        if changed:
+            if run_start is None:
+                run_start = row
+            run_values.append([to_cell_value(kpi_values[kpi_id_norm])])
+        elif run_start is not None:
+            run_end = run_start + len(run_values) - 1
+            cell_range = f"{col_letter}{run_start}"
+            if run_end > run_start:
+                cell_range += f":{col_letter}{run_end}"
+            data.append({"range": f"{prefix}{cell_range}", "values": run_values})
+            run_start, run_values = None, []
+
+    return data
 
 
 def write_mass_dump_to_sheet(last_sunday_str: str, year_week_str: str, kpi_values: dict):
@@ -186,54 +335,193 @@ def write_mass_dump_to_sheet(last_sunday_str: str, year_week_str: str, kpi_value
     Escribe el volcado masivo:
     - Usa la columna A de la hoja (fila 2..N) como lista de KPI numbers.
     - Para cada fila, busca su kpi_number en kpi_values.
-    - Escribe todos los valores en la columna de la semana correspondiente.
+    - Escribe en la columna de la semana solo los valores que cambiaron
+      respecto a lo ya publicado.
+
+    Llamadas al API: abrir sheet + pestaña, una lectura de la pestaña
+    y como mucho una escritura, sin importar cuántas semanas o KPIs tenga.
     """
-    client = get_gspread_client()
+    client = get_gspread_client(write=True)
     sh = client.open_by_key(SPREADSHEET_ID)
-    ws = sh.worksheet(WORKSHEET_NAME)
+    ws = sh.worksheet(worksheet_name_for_week(last_sunday_str))
+
+    # 1) Pestaña completa (layout + valores publicados) en una sola lectura
+    grid = read_sheet_grid(ws)
+    layout = layout_from_grid(grid)
+
+    if not layout["kpi_row_ids"]:
+        print("No se encontraron filas de KPI para actualizar.")
+        return
 
-    # 1) Encontrar (o crear) columna para esta semana
+    # 2) Encontrar (o reservar) columna para esta semana
     #    basada en el last_sunday que viene del DWH.
-    target_col_index = find_or_create_week_column(ws, last_sunday_str)
+    target_col_index, is_new_col = find_or_create_week_column(layout, last_sunday_str)
     col_letter = col_index_to_letter(target_col_index)
 
     print(f"Publicando en columna {col_letter} (last_sunday = {last_sunday_str})")
 
-    # 2) Leer KPIs definidos en la hoja (columna A, filas KPI_ROWS_START..N)
-    #    y armar el vector de valores en el mismo orden de filas.
+    # 3) Solo las celdas que cambiaron (+ encabezado si la columna es nueva)
     #    kpi_values: dict con clave kpi_number_normalizado -> field_value
-    max_row = ws.row_count
-    values_matrix = []
-    last_row_with_kpi = KPI_ROWS_START
-
-    for row in range(KPI_ROWS_START, max_row + 1):
-        kpi_id_cell = ws.cell(row=row, column=1).value  # Col A = KPI number
-        if kpi_id_cell is None:
-            # Si encontramos una fila completamente vacía, asumimos que no hay más KPIs.
-            # Rompemos para no mandar un rango gigantesco innecesario.
-            break
+    data = diff_week_column(grid, layout, target_col_index, is_new_col, last_sunday_str, kpi_values)
 
-        kpi_id_norm = str(kpi_id_cell).strip()
-        kpi_id_norm = kpi_id_norm.lstrip("0") or "0"
+    if not data:
+        print("Sin cambios: la columna ya tiene los valores del DWH.")
+        return
 
-        value = kpi_values.get(kpi_id_norm)
-        values_matrix.append([value])
-        last_row_with_kpi = row
+    # 4) Escribir todo en una sola llamada
+    if target_col_index > ws.col_count:
+        ws.add_cols(target_col_index - ws.col_count)
 
-    # 3) Escribir los valores en la columna objetivo, de forma masiva
-    start_row = KPI_ROWS_START
-    end_row = last_row_with_kpi
-    value_range = f"{col_letter}{start_row}:{col_letter}{end_row}"
+    ws.batch_update(data)
+    print(f"Rangos escritos: {', '.join(d['range'] for d in data)}")
 
-    if values_matrix:
-        ws.update(value_range, values_matrix)
-        print(f"Valores escritos en rango {value_range}")
-    else:
-        print("No se encontraron filas de KPI para actualizar.")
+
+def set_grid_value(grid: list[list], row: int, col: int, value):
+    """Escribe (row, col) 1-based en un grid en memoria, agrandándolo si hace falta."""
+    while len(grid) < row:
+        grid.append([])
+    cells = grid[row - 1]
+    if len(cells) < col:
+        cells.extend([""] * (col - len(cells)))
+    cells[col - 1] = value
+
+
+def open_week_publisher():
+    """
+    Escritura incremental para la publicación en streaming
+    (core.streaming_publish): devuelve publish_week(last_sunday_str,
+    kpi_values) que escribe en la columna de la semana solo los valores
+    recibidos que cambiaron.
+
+    Cada semana va a la pestaña de su año (worksheet_name_for_week).
+    Cada pestaña se abre y se lee UNA vez; después de cada escritura el
+    grid en memoria se actualiza, así cada batch cuesta una sola llamada
+    (batch_update). Si una escritura falla, la próxima vuelve a leer la
+    pestaña.
+    """
+    tabs = {}
+
+    def publish_week(last_sunday_str: str, kpi_values: dict):
+        tab = worksheet_name_for_week(last_sunday_str)
+        if tab not in tabs:
+            client = get_gspread_client(write=True)
+            ws = client.open_by_key(SPREADSHEET_ID).worksheet(tab)
+            grid = read_sheet_grid(ws)
+            tabs[tab] = {"ws": ws, "grid": grid, "layout": layout_from_grid(grid)}
+        state = tabs[tab]
+        ws, grid, layout = state["ws"], state["grid"], state["layout"]
+
+        if not layout["kpi_row_ids"]:
+            print("No se encontraron filas de KPI para actualizar.")
+            return
+
+        col, is_new_col = find_or_create_week_column(layout, last_sunday_str)
+        data = diff_week_column(grid, layout, col, is_new_col, last_sunday_str, kpi_values)
+        if not data:
+            return
+
+        try:
+            if col > ws.col_count:
+                ws.add_cols(col - ws.col_count)
+            ws.batch_update(data)
+        except Exception:
+            del tabs[tab]  # layout/grid ya no son confiables: releer en el próximo batch
+            raise
+
+        if is_new_col:
+            set_grid_value(grid, 1, col, last_sunday_str)
+        for row, kpi_id_norm in enumerate(layout["kpi_row_ids"], start=KPI_ROWS_START):
+            if kpi_values.get(kpi_id_norm) is not None:
+                set_grid_value(grid, row, col, to_cell_value(kpi_values[kpi_id_norm]))
+        print(f"[{last_sunday_str}] Rangos escritos: {', '.join(d['range'] for d in data)}")
+
+    return publish_week
 
 
 # -------------------------------------------------------------------
-# 5) Runner principal
+# 5) Catch-up: publicar todas las semanas faltantes o desactualizadas
+# -------------------------------------------------------------------
+
+def plan_week_columns(grid: list[list], weeks: dict[str, dict], tab: str) -> tuple[list[dict], int]:
+    """
+    Compara una pestaña (grid completo, leído una vez) contra las semanas
+    del DWH y arma los rangos a escribir:
+    - semanas sin columna en la fila 1 -> columna nueva (encabezado + valores)
+    - semanas ya publicadas -> solo las celdas cuyo valor cambió
+
+    Devuelve (data para values.batchUpdate, columnas que necesita la pestaña).
+    """
+    layout = layout_from_grid(grid)
+
+    data = []
+    if not layout["kpi_row_ids"]:
+        return data, 0
+
+    for last_sunday_str in sorted(weeks):
+        col, is_new_col = find_or_create_week_column(layout, last_sunday_str)
+        week_data = diff_week_column(grid, layout, col, is_new_col, last_sunday_str, weeks[last_sunday_str], tab)
+        if not week_data:
+            continue
+
+        data.extend(week_data)
+        status = "nueva" if is_new_col else f"{len(week_data)} rangos con cambios"
+        print(f"[{tab}] {last_sunday_str} -> columna {col_index_to_letter(col)} ({status})")
+
+    return data, layout["next_col"] - 1
+
+
+def run_catch_up(years: list[int]):
+    """
+    Publica TODAS las semanas que están en SCORECARD_TABLE pero faltan
+    (o quedaron desactualizadas) en las pestañas sc<year> indicadas.
+
+    Llamadas al API: una lectura de todas las pestañas (values.batchGet),
+    una lectura de metadata, y UNA escritura (values.batchUpdate) para
+    todas las semanas y pestañas.
+    """
+    check_scorecard_schema(SCORECARD_TABLE)
+    history = fetch_scorecard_history(years)
+
+    client = get_gspread_client(write=True)
+    sh = client.open_by_key(SPREADSHEET_ID)
+    worksheets = {ws.title: ws for ws in sh.worksheets()}
+
+    tabs = {}
+    for year in years:
+        tab = worksheet_name_for_year(year)
+        if tab not in worksheets:
+            print(f"La pestaña {tab} no existe; se omiten las semanas de {year}.")
+            continue
+        if history.get(year):
+            tabs[tab] = year
+
+    if not tabs:
+        print("No hay semanas para publicar.")
+        return
+
+    response = sh.values_batch_get(
+        [f"'{tab}'" for tab in tabs],
+        params={"valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "FORMATTED_STRING"},
+    )
+    grids = [value_range.get("values", []) for value_range in response.get("valueRanges", [])]
+
+    data = []
+    for (tab, year), grid in zip(tabs.items(), grids):
+        tab_data, needed_cols = plan_week_columns(grid, history[year], tab)
+        if needed_cols > worksheets[tab].col_count:
+            worksheets[tab].add_cols(needed_cols - worksheets[tab].col_count)
+        data.extend(tab_data)
+
+    if not data:
+        print("El sheet ya está al día. Nada que publicar.")
+        return
+
+    sh.values_batch_update(body={"valueInputOption": "RAW", "data": data})
+    print(f"Catch-up: {len(data)} rangos escritos en una sola llamada.")
+
+
+# -------------------------------------------------------------------
+# 6) Runner principal
 # -------------------------------------------------------------------
 
 def run_to_sheet_success():
@@ -254,6 +542,9 @@ def run_to_sheet_success():
 
     print(f"Semana local (year-week): {year_week_str}  |  week_month: {week_month}")
 
+    # La vista <tabla>_latest tiene que existir antes de leer (solo se verifica)
+    check_scorecard_schema(SCORECARD_TABLE)
+
     # 2) Preguntar al DWH cuál es el last_sunday para esa week_month y sc_name
     db_last_sunday_str = get_last_sunday_from_db(week_month)
 
@@ -278,4 +569,25 @@ def run_to_sheet_success():
 
 
 if __name__ == "__main__":
-    run_to_sheet_success()
+    parser = argparse.ArgumentParser(description="Publica el scorecard Success en Google Sheets.")
+    parser.add_argument(
+        "--catch-up",
+        action="store_true",
+        help="publicar todas las semanas faltantes o desactualizadas",
+    )
+    parser.add_argument(
+        "--years",
+        help="años (pestañas sc<year>) para el catch-up, ej. 2025,2026 "
+             "(por defecto el año del último domingo y el anterior)",
+    )
+    args = parser.parse_args()
+
+    if args.catch_up:
+        if args.years:
+            catch_up_years = [int(y) for y in args.years.split(",")]
+        else:
+            year = get_last_sunday().year
+            catch_up_years = [year - 1, year]
+        run_catch_up(catch_up_years)
+    else:
+        run_to_sheet_success()